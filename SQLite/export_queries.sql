@@ -0,0 +1,172 @@
+-- ============================================================================
+-- EXPORTS CSV DES REQUÊTES DE RAPPORT
+-- ============================================================================
+-- Chaque requête est précédée du nom de son fichier CSV (sans extension) ;
+-- `python async_queries.py` les exécute en parallèle et écrit les fichiers.
+
+-- total_transactions
+SELECT COUNT(*) AS total_transactions
+FROM transactions;
+
+-- total_customers
+SELECT COUNT(DISTINCT customer) AS total_customers
+FROM transactions;
+
+-- total_merchants
+SELECT COUNT(DISTINCT merchant) AS total_merchants
+FROM transactions;
+
+-- fraud_statistics
+SELECT
+    COUNT(*) AS total_transactions,
+    SUM(fraud) AS fraudulent_transactions,
+    ROUND(AVG(fraud) * 100, 2) AS fraud_rate
+FROM transactions;
+
+-- amount_statistics
+SELECT
+    ROUND(AVG(amount), 2) AS montant_moyen,
+    MIN(amount) AS montant_min,
+    MAX(amount) AS montant_max,
+    ROUND(SUM(amount), 2) AS montant_total
+FROM transactions;
+
+-- amount_by_category
+SELECT
+    category,
+    COUNT(*) AS nombre_transactions,
+    ROUND(AVG(amount), 2) AS montant_moyen,
+    MIN(amount) AS montant_min,
+    MAX(amount) AS montant_max,
+    ROUND(SUM(amount), 2) AS volume_total
+FROM transactions
+GROUP BY category
+ORDER BY volume_total DESC;
+
+-- fraud_by_category
+SELECT
+    category,
+    COUNT(*) AS total_transactions,
+    SUM(fraud) AS fraudulent_transactions,
+    ROUND(AVG(fraud) * 100, 2) AS fraud_rate,
+    ROUND(SUM(CASE WHEN fraud = 1 THEN amount ELSE 0 END), 2) AS fraudulent_amount
+FROM transactions
+GROUP BY category
+ORDER BY fraud_rate DESC;
+
+-- top_fraud_merchants
+SELECT
+    merchant,
+    COUNT(*) AS total_transactions,
+    SUM(fraud) AS fraudulent_transactions,
+    ROUND(AVG(fraud) * 100, 2) AS fraud_rate,
+    ROUND(SUM(amount), 2) AS volume_total
+FROM transactions
+GROUP BY merchant
+HAVING COUNT(*) >= 100
+ORDER BY fraud_rate DESC
+LIMIT 10;
+
+-- gender_distribution
+SELECT
+    gender,
+    COUNT(*) AS total_transactions,
+    ROUND(AVG(amount), 2) AS montant_moyen,
+    ROUND(AVG(fraud) * 100, 2) AS fraud_rate
+FROM transactions
+GROUP BY gender
+ORDER BY gender;
+
+-- age_distribution
+SELECT
+    CASE
+        WHEN age IN ('0', '1', '2') THEN '< 20'
+        WHEN age = '3' THEN '20-30'
+        WHEN age = '4' THEN '31-40'
+        WHEN age = '5' THEN '41-50'
+        WHEN age = '6' THEN '51-60'
+        ELSE '> 60'
+    END AS tranche_age,
+    COUNT(*) AS total_transactions,
+    ROUND(AVG(amount), 2) AS montant_moyen,
+    ROUND(AVG(fraud) * 100, 2) AS fraud_rate
+FROM transactions
+GROUP BY tranche_age
+ORDER BY tranche_age;
+
+-- daily_transactions
+SELECT
+    step AS jour,
+    COUNT(*) AS nombre_transactions,
+    SUM(fraud) AS transactions_frauduleuses,
+    ROUND(AVG(fraud) * 100, 2) AS taux_fraude,
+    ROUND(SUM(amount), 2) AS volume_total
+FROM transactions
+GROUP BY step
+ORDER BY step;
+
+-- top_customers
+SELECT
+    customer,
+    COUNT(*) AS nombre_transactions,
+    ROUND(SUM(amount), 2) AS volume_total,
+    COUNT(DISTINCT merchant) AS nombre_commercants,
+    COUNT(DISTINCT category) AS nombre_categories,
+    SUM(fraud) AS transactions_frauduleuses
+FROM transactions
+GROUP BY customer
+ORDER BY volume_total DESC
+LIMIT 10;
+
+-- category_merchant_correlation
+SELECT
+    category,
+    merchant,
+    COUNT(*) AS nombre_transactions,
+    ROUND(SUM(amount), 2) AS volume_total,
+    ROUND(AVG(fraud) * 100, 2) AS taux_fraude
+FROM transactions
+GROUP BY category, merchant
+HAVING COUNT(*) >= 50
+ORDER BY nombre_transactions DESC;
+
+-- anomalous_transactions
+WITH category_stats AS (
+    SELECT
+        category,
+        AVG(amount) AS montant_moyen,
+        SQRT(AVG(amount * amount) - AVG(amount) * AVG(amount)) AS ecart_type
+    FROM transactions
+    GROUP BY category
+)
+SELECT
+    t.*,
+    ROUND((t.amount - s.montant_moyen) / s.ecart_type, 2) AS zscore
+FROM transactions t
+JOIN category_stats s ON s.category = t.category
+WHERE s.ecart_type > 0
+  AND (t.amount - s.montant_moyen) / s.ecart_type > 3
+ORDER BY zscore DESC;
+
+-- fraud_by_time
+SELECT
+    step,
+    COUNT(*) AS total_transactions,
+    SUM(fraud) AS fraudulent_transactions,
+    ROUND(AVG(fraud) * 100, 2) AS fraud_rate
+FROM transactions
+GROUP BY step
+ORDER BY step;
+
+-- high_risk_combinations
+SELECT
+    category,
+    merchant,
+    COUNT(*) AS total_transactions,
+    SUM(fraud) AS fraudulent_transactions,
+    ROUND(AVG(fraud) * 100, 2) AS fraud_rate
+FROM transactions
+GROUP BY category, merchant
+HAVING COUNT(*) >= 50
+ORDER BY fraud_rate DESC
+LIMIT 10;
@@ -14,8 +14,16 @@ CREATE TABLE IF NOT EXISTS transactions (
 );
 
 -- Indexation pour améliorer les performances
-CREATE INDEX idx_transactions_step ON transactions(step);
 CREATE INDEX idx_transactions_customer ON transactions(customer);
 CREATE INDEX idx_transactions_merchant ON transactions(merchant);
 CREATE INDEX idx_transactions_fraud ON transactions(fraud);
-CREATE INDEX idx_transactions_category ON transactions(category);
\ No newline at end of file
+
+-- Index couvrants des requêtes de rapport (GROUP BY sur la première colonne,
+-- lecture de fraud et amount) : SQLite les parcourt sans lire la table.
+-- Ils remplacent les anciens index simples sur step et category
+-- (voir Scripts/db_indexes.py)
+CREATE INDEX idx_transactions_step_covering ON transactions(step, fraud, amount);
+CREATE INDEX idx_transactions_category_covering ON transactions(category, fraud, amount);
+CREATE INDEX idx_transactions_gender_covering ON transactions(gender, fraud, amount);
+CREATE INDEX idx_transactions_age_gender_covering ON transactions(age, gender, fraud, amount);
+CREATE INDEX idx_transactions_amount_covering ON transactions(amount, fraud);
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Agrégats persistés, rafraîchis de manière incrémentale
+
+Les transactions ne sont jamais modifiées : les nouvelles données arrivent
+sous forme de nouvelles lignes (nouveaux steps). Le cube de données
+(data_cube.DataCube) est donc enregistré dans le cache colonnaire avec le
+dernier id traité. Un rafraîchissement ne lit que les lignes d'id supérieur,
+construit leur cube partiel et le fusionne avec celui déjà enregistré ; les
+analyses descriptive, temporelle, de fraude et les KPIs sont ensuite
+calculées par roll-up du cube fusionné.
+"""
+
+import logging
+from typing import Optional
+import pandas as pd
+
+from config import AMOUNT_BINS, STREAMING_CHUNK_SIZE
+from data_cube import DataCube
+from data_loader import get_db_connection, iter_rows_after
+from frame_cache import load_frame, read_fingerprint, save_frame
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+CELLS_NAME = 'aggregates_cells'
+CUSTOMERS_NAME = 'aggregates_customers'
+
+class AggregateStore:
+    """
+    Cube de données persisté et marque de progression (dernier id et dernier
+    step traités)
+    """
+
+    def __init__(self, cube: DataCube, state: dict):
+        self.cube = cube
+        self.state = state
+
+    @classmethod
+    def empty(cls) -> 'AggregateStore':
+        state = {'version': STORE_VERSION, 'amount_bins': str(AMOUNT_BINS),
+                 'max_id': 0, 'max_step': None, 'rows': 0}
+        return cls(DataCube.empty(), state)
+
+    @classmethod
+    def load(cls) -> Optional['AggregateStore']:
+        """
+        Relit les agrégats enregistrés, ou None s'ils sont absents ou incompatibles
+        """
+        state = read_fingerprint(CELLS_NAME)
+        if state is None or state.get('version') != STORE_VERSION or state.get('amount_bins') != str(AMOUNT_BINS):
+            return None
+        cells = load_frame(state, CELLS_NAME)
+        customers = load_frame(state, CUSTOMERS_NAME)
+        if cells is None or customers is None:
+            return None
+        # Les dimensions textuelles sont relues en catégories (encodage du cache)
+        return cls(DataCube(cells, customers['customer'].to_numpy(dtype=object)), state)
+
+    def save(self) -> None:
+        save_frame(self.cube.cells, self.state, CELLS_NAME)
+        save_frame(pd.DataFrame({'customer': self.cube.customers}), self.state, CUSTOMERS_NAME)
+
+    @classmethod
+    def refresh(cls, chunk_size: int = STREAMING_CHUNK_SIZE) -> 'AggregateStore':
+        """
+        Met à jour les agrégats avec les lignes ajoutées depuis le dernier
+        rafraîchissement (reconstruction complète si aucun agrégat n'existe
+        ou si des lignes déjà traitées ont changé)
+        """
+        store = cls.load()
+        conn = get_db_connection()
+
+        if store is not None:
+            rows, max_step = conn.execute(
+                "SELECT COUNT(*), MAX(step) FROM transactions WHERE id <= ?",
+                (store.state['max_id'],)
+            ).fetchone()
+            if rows != store.state['rows'] or max_step != store.state['max_step']:
+                logger.warning("Des lignes déjà agrégées ont changé : reconstruction complète des agrégats")
+                store = None
+        if store is None:
+            logger.info("Construction complète des agrégats")
+            store = cls.empty()
+
+        last_id = store.state['max_id']
+        new_cubes = []
+        state = dict(store.state)
+        for chunk in iter_rows_after(last_id, chunk_size):
+            if chunk.empty:
+                continue
+            new_cubes.append(DataCube.from_frame(chunk))
+            state['max_id'] = int(chunk['id'].max())
+            chunk_max_step = int(chunk['step'].max())
+            state['max_step'] = chunk_max_step if state['max_step'] is None else max(state['max_step'], chunk_max_step)
+            state['rows'] += len(chunk)
+
+        new_rows = state['rows'] - store.state['rows']
+        if new_rows == 0:
+            logger.info(f"Agrégats à jour (id <= {last_id}, {store.state['rows']} lignes)")
+            return store
+
+        store = cls(DataCube.merge([store.cube] + new_cubes), state)
+        store.save()
+        logger.info(f"Agrégats rafraîchis: {new_rows} nouvelles lignes (id > {last_id}), "
+                    f"{len(store.cube.cells)} cellules, dernier step {state['max_step']}")
+        return store
+
+if __name__ == '__main__':
+    from descriptive_analysis import perform_descriptive_analysis
+    from fraud_analysis import perform_fraud_analysis
+    from temporal_analysis import perform_temporal_analysis
+    from utils import setup_logging
+
+    setup_logging()
+    cube = AggregateStore.refresh().cube
+    perform_descriptive_analysis(cube)
+    perform_temporal_analysis(cube)
+    perform_fraud_analysis(cube)
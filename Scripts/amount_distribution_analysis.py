@@ -2,36 +2,126 @@
 Analyse de la distribution des montants des transactions
 """
 
-import sqlite3
-from pathlib import Path
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from typing import List
+from amount_sketch import SketchStore
+from config import AMOUNT_SKETCHES_ENABLED, FIGURES_DIR
+from context import AnalysisContext, ensure_context
+from figures import FigureJob, render_figures
+from instrumentation import traced
+from utils import setup_logging, with_amount
 
-# Configuration
-DB_PATH = Path(__file__).parent.parent / 'SQLite' / 'bankdata.db'
-RESULTS_DIR = Path(__file__).parent.parent / 'Results'
-FIGURES_DIR = RESULTS_DIR / 'Figures'
-FIGURES_DIR.mkdir(parents=True, exist_ok=True)
-
-def get_amount_data():
+@traced
+def get_amount_data(ctx: AnalysisContext = None):
     """Récupère les données des montants"""
-    query = """
-    SELECT 
-        amount,
-        category,
-        fraud
-    FROM transactions
-    ORDER BY amount;
+    # Aucune statistique calculée ici ne nécessite un tri préalable des montants
+    return with_amount(ensure_context(ctx).df)[['amount', 'category', 'fraud']].copy()
+
+# Tranches de montant du taux de fraude
+FRAUD_BINS = [0, 50, 100, 500, 1000, float('inf')]
+FRAUD_LABELS = ['0-50€', '50-100€', '100-500€', '500-1000€', '>1000€']
+
+def analyze_amount_distribution(ctx: AnalysisContext = None, figures: List[FigureJob] = None,
+                                use_sketches: bool = AMOUNT_SKETCHES_ENABLED):
+    """
+    Analyse et visualise la distribution des montants
+    
+    Avec use_sketches, les statistiques et la figure sont calculées depuis
+    les esquisses de montants persistées (amount_sketch.py) : médiane,
+    histogrammes et boîtes à moustaches approchés, sans relire les montants.
+    
+    Si une liste `figures` est fournie, la figure y est ajoutée pour être
+    rendue plus tard avec les autres ; sinon elle est rendue immédiatement.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query(query, conn)
+    if use_sketches:
+        stats, inputs = sketch_distribution_inputs(SketchStore.refresh())
+    else:
+        stats, inputs = frame_distribution_inputs(get_amount_data(ctx))
+    
+    # Figure (rendue dans un processus dédié)
+    job = FigureJob('amount_distribution_analysis', plot_amount_distribution_analysis, inputs,
+                    FIGURES_DIR / 'amount_distribution_analysis.png', dpi=300, bbox_inches='tight')
+    if figures is not None:
+        figures.append(job)
+    else:
+        render_figures([job])
+    
+    return stats
 
-def analyze_amount_distribution():
-    """Analyse et visualise la distribution des montants"""
-    # Récupération des données
-    data = get_amount_data()
+@traced
+def frame_distribution_inputs(data: pd.DataFrame):
+    """
+    Statistiques et données de la figure calculées sur les montants chargés
+    """
+    # Calculer le taux de fraude par tranche de montant
+    bins = FRAUD_BINS
+    labels = FRAUD_LABELS
+    amount_range = pd.cut(data['amount'], bins=bins, labels=labels)
+    fraud_by_amount = data.groupby(amount_range, observed=False)['fraud'].agg(['count', 'sum'])
+    fraud_by_amount['rate'] = fraud_by_amount['sum'] / fraud_by_amount['count'] * 100
+    
+    # Statistiques descriptives
+    stats = {
+        'minimum': data['amount'].min(),
+        'maximum': data['amount'].max(),
+        'mediane': data['amount'].median(),
+        'moyenne': data['amount'].mean(),
+        'ecart_type': data['amount'].std(),
+        'skewness': data['amount'].skew(),
+        'max_categorie': data.loc[data['amount'].idxmax(), 'category'],
+        'pct_inf_100': (data['amount'] <= 100).mean() * 100
+    }
+    
+    return stats, {'amounts': data[['amount', 'category']].reset_index(drop=True),
+                   'fraud_by_amount': fraud_by_amount, 'stats': stats}
+
+@traced
+def sketch_distribution_inputs(store: SketchStore):
+    """
+    Statistiques et données de la figure calculées sur les esquisses :
+    extrêmes, moyenne, écart-type et asymétrie exacts, médiane, parts et
+    histogrammes à la précision des esquisses
+    """
+    overall = store.overall()
+    categories = store.sketches['category']
+    fraud_sketch = store.sketches['fraud'].get(1, SketchStore.empty().overall())
+    
+    counts = overall.histogram(FRAUD_BINS)
+    frauds = fraud_sketch.histogram(FRAUD_BINS)
+    fraud_by_amount = pd.DataFrame({'count': counts, 'sum': frauds},
+                                   index=pd.CategoricalIndex(FRAUD_LABELS, categories=FRAUD_LABELS,
+                                                             ordered=True, name='amount'))
+    fraud_by_amount['rate'] = fraud_by_amount['sum'] / fraud_by_amount['count'] * 100
+    
+    stats = {
+        'minimum': overall.minimum,
+        'maximum': overall.maximum,
+        'mediane': overall.quantile(0.5),
+        'moyenne': overall.mean,
+        'ecart_type': overall.std(),
+        'skewness': overall.skew(),
+        'max_categorie': max(categories, key=lambda category: categories[category].maximum),
+        'pct_inf_100': overall.fraction_at_most(100) * 100
+    }
+    
+    low_edges = np.linspace(0, 100, 51)
+    high_edges = np.linspace(100, max(overall.maximum, 100), 51)
+    return stats, {
+        'histograms': {'low': (overall.histogram(low_edges), low_edges),
+                       'high': (overall.histogram(high_edges), high_edges)},
+        'boxes': [categories[category].box_stats(str(category)) for category in sorted(categories)],
+        'fraud_by_amount': fraud_by_amount, 'stats': stats
+    }
+
+def plot_amount_distribution_analysis(inputs: dict):
+    """Trace les distributions des montants et le taux de fraude par tranche"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    data = inputs.get('amounts')
+    fraud_by_amount = inputs['fraud_by_amount']
+    stats = inputs['stats']
     
     # Configuration de la figure
     plt.style.use('default')
@@ -41,16 +131,20 @@ def analyze_amount_distribution():
     
     # 1. Distribution générale des montants (avec zoom sur les valeurs < 100€)
     ax1 = fig.add_subplot(gs[0, 0])
-    sns.histplot(data=data[data['amount'] <= 100], 
-                x='amount', bins=50, ax=ax1,
-                color='lightcoral')
+    if data is not None:
+        sns.histplot(data=data[data['amount'] <= 100], 
+                    x='amount', bins=50, ax=ax1,
+                    color='lightcoral')
+    else:
+        counts, edges = inputs['histograms']['low']
+        ax1.stairs(counts, edges, fill=True, color='lightcoral')
     ax1.set_title('Distribution des Montants (≤ 100€)\n'
-                 f'{(data["amount"] <= 100).mean()*100:.1f}% des transactions')
+                 f'{stats["pct_inf_100"]:.1f}% des transactions')
     ax1.set_xlabel('Montant (€)')
     ax1.set_ylabel('Nombre de Transactions')
     
     # Ajouter la médiane
-    median = data['amount'].median()
+    median = stats['mediane']
     if median <= 100:
         ax1.axvline(median, color='green', linestyle='--',
                    label=f'Médiane: {median:.2f}€')
@@ -58,33 +152,33 @@ def analyze_amount_distribution():
     
     # 2. Box plot par catégorie
     ax2 = fig.add_subplot(gs[0, 1])
-    sns.boxplot(data=data, x='category', y='amount',
-               ax=ax2, showfliers=False)
-    ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
+    if data is not None:
+        sns.boxplot(data=data, x='category', y='amount',
+                   ax=ax2, showfliers=False)
+        ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
+    else:
+        ax2.bxp(inputs['boxes'], showfliers=False)
+        ax2.tick_params(axis='x', labelrotation=45)
     ax2.set_title('Distribution des Montants par Catégorie\n(sans valeurs extrêmes)')
     ax2.set_xlabel('Catégorie')
     ax2.set_ylabel('Montant (€)')
     
     # 3. Distribution des montants élevés (> 100€)
     ax3 = fig.add_subplot(gs[1, 0])
-    sns.histplot(data=data[data['amount'] > 100], 
-                x='amount', bins=50, ax=ax3,
-                color='lightblue')
+    if data is not None:
+        sns.histplot(data=data[data['amount'] > 100], 
+                    x='amount', bins=50, ax=ax3,
+                    color='lightblue')
+    else:
+        counts, edges = inputs['histograms']['high']
+        ax3.stairs(counts, edges, fill=True, color='lightblue')
     ax3.set_title('Distribution des Montants (> 100€)\n'
-                 f'{(data["amount"] > 100).mean()*100:.1f}% des transactions')
+                 f'{100 - stats["pct_inf_100"]:.1f}% des transactions')
     ax3.set_xlabel('Montant (€)')
     ax3.set_ylabel('Nombre de Transactions')
     
     # 4. Relation montant/fraude
     ax4 = fig.add_subplot(gs[1, 1])
-    
-    # Calculer le taux de fraude par tranche de montant
-    bins = [0, 50, 100, 500, 1000, float('inf')]
-    labels = ['0-50€', '50-100€', '100-500€', '500-1000€', '>1000€']
-    data['amount_range'] = pd.cut(data['amount'], bins=bins, labels=labels)
-    fraud_by_amount = data.groupby('amount_range')['fraud'].agg(['count', 'sum'])
-    fraud_by_amount['rate'] = fraud_by_amount['sum'] / fraud_by_amount['count'] * 100
-    
     sns.barplot(x=fraud_by_amount.index, y='rate', data=fraud_by_amount,
                ax=ax4, color='salmon')
     ax4.set_title('Taux de Fraude par Tranche de Montant')
@@ -95,18 +189,6 @@ def analyze_amount_distribution():
     for i, v in enumerate(fraud_by_amount['count']):
         ax4.text(i, 0.1, f'n={v:,}', ha='center', va='bottom')
     
-    # Statistiques descriptives
-    stats = {
-        'minimum': data['amount'].min(),
-        'maximum': data['amount'].max(),
-        'mediane': data['amount'].median(),
-        'moyenne': data['amount'].mean(),
-        'ecart_type': data['amount'].std(),
-        'skewness': data['amount'].skew(),
-        'max_categorie': data.loc[data['amount'].idxmax(), 'category'],
-        'pct_inf_100': (data['amount'] <= 100).mean() * 100
-    }
-    
     # Ajouter un texte avec les statistiques principales
     fig.text(0.02, 0.02,
              f"Statistiques des Montants:\n"
@@ -124,15 +206,13 @@ def analyze_amount_distribution():
     plt.suptitle('Analyse de la Distribution des Montants', fontsize=16, y=0.95)
     plt.tight_layout()
     
-    # Sauvegarde
-    plt.savefig(FIGURES_DIR / 'amount_distribution_analysis.png',
-                dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    return stats
+    return fig
 
 if __name__ == '__main__':
-    stats = analyze_amount_distribution()
+    import sys
+
+    setup_logging()
+    stats = analyze_amount_distribution(use_sketches='--sketches' in sys.argv or AMOUNT_SKETCHES_ENABLED)
     print("\nStatistiques des montants :")
     for key, value in stats.items():
         if isinstance(value, float):
@@ -0,0 +1,411 @@
+"""
+Esquisses de quantiles des montants, fusionnables et persistées
+
+Une esquisse (AmountSketch) résume des montants sans les conserver :
+- un histogramme à pas logarithmique (principe de DDSketch) : le montant x
+  est compté dans le seuil i = ceil(log(x) / log(gamma)), avec
+  gamma = (1 + a) / (1 - a) ; tout quantile est alors restitué avec une
+  erreur relative d'au plus a = AMOUNT_SKETCH_ACCURACY, quel que soit le
+  nombre de montants ;
+- le nombre, la moyenne et les moments centrés d'ordre 2 et 3 (écart-type
+  et asymétrie exacts), le minimum et le maximum exacts.
+
+Deux esquisses se fusionnent en additionnant leurs histogrammes et en
+combinant leurs moments : les esquisses de blocs, de jours ou de dimensions
+différents donnent celle de leur union sans relire les transactions.
+
+SketchStore tient une esquisse par catégorie, commerçant, étiquette de
+fraude et step, construites en une passe sur les blocs de lignes et
+enregistrées dans le cache colonnaire avec le dernier id traité ; un
+rafraîchissement ne lit que les nouvelles lignes (comme aggregate_store).
+
+Usage :
+    python amount_sketch.py  (rafraîchit les esquisses et écrit les quantiles
+                              par dimension dans Results/amount_quantiles_*.csv)
+"""
+
+import logging
+from typing import Dict, Hashable, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+
+from config import (
+    AMOUNT_SKETCH_ACCURACY, AMOUNT_SKETCH_MAX, AMOUNT_SKETCH_MIN, STREAMING_CHUNK_SIZE
+)
+from data_loader import get_db_connection, iter_rows_after
+from frame_cache import load_frame, read_fingerprint, save_frame
+from utils import setup_logging, with_amount
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+MOMENTS_NAME = 'amount_sketches'
+BUCKETS_NAME = 'amount_sketches_buckets'
+SKETCH_DIMENSIONS = ['category', 'merchant', 'fraud', 'step']
+# Dimensions dont les valeurs sont entières (relues en texte depuis le cache)
+INTEGER_DIMENSIONS = {'fraud', 'step'}
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+class SketchMapping:
+    """
+    Correspondance montant <-> seuil de l'histogramme logarithmique
+
+    Le seuil 0 compte les montants nuls (ou négatifs) ; les seuils suivants
+    couvrent [AMOUNT_SKETCH_MIN, AMOUNT_SKETCH_MAX], les montants hors de
+    cet intervalle étant comptés dans le premier ou le dernier seuil.
+    """
+
+    def __init__(self, accuracy: float = AMOUNT_SKETCH_ACCURACY,
+                 min_value: float = AMOUNT_SKETCH_MIN, max_value: float = AMOUNT_SKETCH_MAX):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.offset = int(np.ceil(np.log(min_value) / self.log_gamma))
+        self.n_slots = int(np.ceil(np.log(max_value) / self.log_gamma)) - self.offset + 2
+
+    def slots(self, amounts: np.ndarray) -> np.ndarray:
+        amounts = np.asarray(amounts, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            index = np.ceil(np.log(amounts) / self.log_gamma) - self.offset + 1
+        index = np.clip(np.nan_to_num(index, nan=1, neginf=1), 1, self.n_slots - 1)
+        return np.where(amounts > 0, index, 0).astype(np.int64)
+
+    def values(self) -> np.ndarray:
+        """
+        Valeur représentative de chaque seuil (erreur relative <= accuracy)
+        """
+        index = np.arange(self.n_slots - 1) + self.offset
+        return np.r_[0.0, 2 * self.gamma ** index / (self.gamma + 1)]
+
+    def key(self) -> str:
+        return f"{self.accuracy}:{self.offset}:{self.n_slots}"
+
+class AmountSketch:
+    """
+    Esquisse fusionnable d'un ensemble de montants
+    """
+
+    def __init__(self, mapping: SketchMapping, counts: np.ndarray = None, count: int = 0,
+                 mean: float = 0.0, m2: float = 0.0, m3: float = 0.0,
+                 minimum: float = np.inf, maximum: float = -np.inf):
+        self.mapping = mapping
+        self.counts = np.zeros(mapping.n_slots, dtype=np.int64) if counts is None else counts
+        self.count = int(count)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+        self.m3 = float(m3)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+
+    @classmethod
+    def from_values(cls, amounts: np.ndarray, mapping: SketchMapping = None) -> 'AmountSketch':
+        amounts = np.asarray(amounts, dtype=float)
+        return group_sketches(amounts, np.zeros(len(amounts), dtype=np.int64), 1,
+                              mapping or SketchMapping())[0]
+
+    def merge(self, other: 'AmountSketch') -> 'AmountSketch':
+        """
+        Esquisse de l'union des deux ensembles de montants (formules de
+        fusion des moments de Pébay)
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        na, nb = self.count, other.count
+        n = na + nb
+        delta = other.mean - self.mean
+        m2 = self.m2 + other.m2 + delta ** 2 * na * nb / n
+        m3 = (self.m3 + other.m3 + delta ** 3 * na * nb * (na - nb) / n ** 2
+              + 3 * delta * (na * other.m2 - nb * self.m2) / n)
+        return AmountSketch(self.mapping, self.counts + other.counts, n,
+                            self.mean + delta * nb / n, m2, m3,
+                            min(self.minimum, other.minimum), max(self.maximum, other.maximum))
+
+    @classmethod
+    def merge_all(cls, sketches: Iterable['AmountSketch'], mapping: SketchMapping = None) -> 'AmountSketch':
+        result = AmountSketch(mapping or SketchMapping())
+        for sketch in sketches:
+            result = result.merge(sketch)
+        return result
+
+    @property
+    def total(self) -> float:
+        return self.mean * self.count
+
+    def std(self) -> float:
+        """
+        Écart-type (ddof=1, comme pandas)
+        """
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def skew(self) -> float:
+        """
+        Asymétrie corrigée du biais (même estimateur que pandas.Series.skew)
+        """
+        n = self.count
+        if n < 3 or self.m2 == 0:
+            return np.nan
+        return n * np.sqrt(n - 1) / (n - 2) * self.m3 / self.m2 ** 1.5
+
+    def quantile(self, q):
+        """
+        Quantile(s) approché(s), erreur relative <= AMOUNT_SKETCH_ACCURACY
+        (rang q * (n - 1), comme l'interpolation par défaut de pandas)
+        """
+        q = np.asarray(q, dtype=float)
+        if self.count == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        rank = q * (self.count - 1)
+        slot = np.searchsorted(np.cumsum(self.counts), rank, side='right')
+        values = np.clip(self.mapping.values()[np.minimum(slot, self.mapping.n_slots - 1)],
+                         self.minimum, self.maximum)
+        return values if q.ndim else float(values)
+
+    def histogram(self, edges) -> np.ndarray:
+        """
+        Nombre de montants par intervalle ]edges[i], edges[i+1]] comme
+        pandas.cut (chaque seuil compté à sa valeur représentative)
+        """
+        edges = np.asarray(edges, dtype=float)
+        values = np.clip(self.mapping.values(), self.minimum, self.maximum)
+        index = np.searchsorted(edges, values, side='left') - 1
+        inside = (index >= 0) & (index < len(edges) - 1)
+        return np.bincount(index[inside], weights=self.counts[inside],
+                           minlength=len(edges) - 1).astype(np.int64)
+
+    def fraction_at_most(self, threshold: float) -> float:
+        """
+        Part des montants inférieurs ou égaux au seuil
+        """
+        if self.count == 0:
+            return np.nan
+        values = np.clip(self.mapping.values(), self.minimum, self.maximum)
+        return self.counts[values <= threshold].sum() / self.count
+
+    def box_stats(self, label: str = '') -> dict:
+        """
+        Statistiques d'une boîte à moustaches (format de Axes.bxp) : quartiles,
+        médiane et moustaches à 1,5 écart interquartile
+        """
+        q1, median, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        values = np.clip(self.mapping.values(), self.minimum, self.maximum)[self.counts > 0]
+        low = values[values >= q1 - 1.5 * iqr]
+        high = values[values <= q3 + 1.5 * iqr]
+        return {
+            'label': label, 'q1': q1, 'med': median, 'q3': q3, 'mean': self.mean,
+            'whislo': low.min() if len(low) else q1, 'whishi': high.max() if len(high) else q3,
+            'fliers': []
+        }
+
+def group_sketches(amounts: np.ndarray, codes: np.ndarray, n_groups: int,
+                   mapping: SketchMapping) -> List[AmountSketch]:
+    """
+    Esquisses de plusieurs groupes en une passe vectorisée (codes 0..n_groups-1)
+    """
+    slots = mapping.slots(amounts)
+    counts = np.bincount(codes * mapping.n_slots + slots,
+                         minlength=n_groups * mapping.n_slots).reshape(n_groups, mapping.n_slots)
+    sizes = np.bincount(codes, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.bincount(codes, weights=amounts, minlength=n_groups) / sizes
+    deviations = amounts - means[codes]
+    m2 = np.bincount(codes, weights=deviations ** 2, minlength=n_groups)
+    m3 = np.bincount(codes, weights=deviations ** 3, minlength=n_groups)
+    minimum = np.full(n_groups, np.inf)
+    maximum = np.full(n_groups, -np.inf)
+    np.minimum.at(minimum, codes, amounts)
+    np.maximum.at(maximum, codes, amounts)
+    return [
+        AmountSketch(mapping, counts[g], sizes[g], means[g] if sizes[g] else 0.0, m2[g], m3[g],
+                     minimum[g], maximum[g])
+        for g in range(n_groups)
+    ]
+
+def frame_sketches(df: pd.DataFrame, dimension: str,
+                   mapping: SketchMapping = None) -> Dict[Hashable, AmountSketch]:
+    """
+    Esquisse des montants de chaque valeur d'une dimension
+    """
+    mapping = mapping or SketchMapping()
+    df = with_amount(df)
+    codes, uniques = pd.factorize(df[dimension].to_numpy(), sort=True)
+    valid = codes >= 0
+    sketches = group_sketches(df['amount'].to_numpy(dtype=float)[valid], codes[valid],
+                              len(uniques), mapping)
+    keys = [int(value) if dimension in INTEGER_DIMENSIONS else value for value in uniques]
+    return dict(zip(keys, sketches))
+
+def merge_sketch_maps(left: Dict[Hashable, AmountSketch],
+                      right: Dict[Hashable, AmountSketch]) -> Dict[Hashable, AmountSketch]:
+    merged = dict(left)
+    for key, sketch in right.items():
+        merged[key] = merged[key].merge(sketch) if key in merged else sketch
+    return merged
+
+class SketchStore:
+    """
+    Esquisses persistées par dimension et marque de progression (dernier id
+    et dernier step traités)
+    """
+
+    def __init__(self, sketches: Dict[str, Dict[Hashable, AmountSketch]], state: dict,
+                 mapping: SketchMapping = None):
+        self.sketches = sketches
+        self.state = state
+        self.mapping = mapping or SketchMapping()
+
+    @classmethod
+    def empty(cls) -> 'SketchStore':
+        mapping = SketchMapping()
+        state = {'version': STORE_VERSION, 'mapping': mapping.key(),
+                 'max_id': 0, 'max_step': None, 'rows': 0}
+        return cls({dimension: {} for dimension in SKETCH_DIMENSIONS}, state, mapping)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'SketchStore':
+        """
+        Esquisses d'un DataFrame chargé (sans persistance)
+        """
+        store = cls.empty()
+        for dimension in SKETCH_DIMENSIONS:
+            store.sketches[dimension] = frame_sketches(df, dimension, store.mapping)
+        store.state['rows'] = len(df)
+        return store
+
+    def overall(self) -> AmountSketch:
+        """
+        Esquisse de tous les montants (fusion des esquisses par étiquette de fraude)
+        """
+        return AmountSketch.merge_all(self.sketches['fraud'].values(), self.mapping)
+
+    def combined(self, dimension: str, keys: Optional[Iterable[Hashable]] = None) -> AmountSketch:
+        """
+        Fusion des esquisses d'une dimension (toutes, ou celles de `keys`,
+        par exemple une plage de steps)
+        """
+        sketches = self.sketches[dimension]
+        selected = sketches.values() if keys is None else (sketches[key] for key in keys if key in sketches)
+        return AmountSketch.merge_all(selected, self.mapping)
+
+    def quantiles(self, dimension: str, quantiles: List[float] = QUANTILES) -> pd.DataFrame:
+        """
+        Nombre, moyenne, extrêmes et quantiles approchés de chaque valeur d'une dimension
+        """
+        rows = []
+        for key, sketch in sorted(self.sketches[dimension].items()):
+            row = {dimension: key, 'count': sketch.count, 'mean': sketch.mean, 'std': sketch.std(),
+                   'min': sketch.minimum, 'max': sketch.maximum}
+            row.update({f"p{round(q * 100):02d}": value
+                        for q, value in zip(quantiles, sketch.quantile(quantiles))})
+            rows.append(row)
+        return pd.DataFrame(rows).round(2)
+
+    @classmethod
+    def load(cls) -> Optional['SketchStore']:
+        """
+        Relit les esquisses enregistrées, ou None si elles sont absentes ou
+        incompatibles (précision ou bornes modifiées)
+        """
+        mapping = SketchMapping()
+        state = read_fingerprint(MOMENTS_NAME)
+        if state is None or state.get('version') != STORE_VERSION or state.get('mapping') != mapping.key():
+            return None
+        moments = load_frame(state, MOMENTS_NAME)
+        buckets = load_frame(state, BUCKETS_NAME)
+        if moments is None or buckets is None:
+            return None
+
+        counts = np.zeros((len(moments), mapping.n_slots), dtype=np.int64)
+        counts[buckets['sketch'].to_numpy(), buckets['slot'].to_numpy()] = buckets['count'].to_numpy()
+        sketches = {dimension: {} for dimension in SKETCH_DIMENSIONS}
+        for i, row in enumerate(moments.itertuples(index=False)):
+            key = int(row.key) if row.dimension in INTEGER_DIMENSIONS else row.key
+            sketches[row.dimension][key] = AmountSketch(mapping, counts[i], row.count, row.mean,
+                                                        row.m2, row.m3, row.minimum, row.maximum)
+        return cls(sketches, state, mapping)
+
+    def save(self) -> None:
+        """
+        Enregistre les moments (une ligne par esquisse) et les seuils non vides
+        (format long) dans le cache colonnaire
+        """
+        entries = [(dimension, key, sketch) for dimension in SKETCH_DIMENSIONS
+                   for key, sketch in self.sketches[dimension].items()]
+        moments = pd.DataFrame({
+            'dimension': [dimension for dimension, _, _ in entries],
+            'key': [str(key) for _, key, _ in entries],
+            'count': np.array([sketch.count for _, _, sketch in entries], dtype=np.int64),
+            'mean': [sketch.mean for _, _, sketch in entries],
+            'm2': [sketch.m2 for _, _, sketch in entries],
+            'm3': [sketch.m3 for _, _, sketch in entries],
+            'minimum': [sketch.minimum for _, _, sketch in entries],
+            'maximum': [sketch.maximum for _, _, sketch in entries]
+        })
+        counts = (np.vstack([sketch.counts for _, _, sketch in entries]) if entries
+                  else np.zeros((0, self.mapping.n_slots), dtype=np.int64))
+        sketch_index, slot = np.nonzero(counts)
+        buckets = pd.DataFrame({'sketch': sketch_index.astype(np.int32), 'slot': slot.astype(np.int32),
+                                'count': counts[sketch_index, slot]})
+        save_frame(moments, self.state, MOMENTS_NAME)
+        save_frame(buckets, self.state, BUCKETS_NAME)
+
+    @classmethod
+    def refresh(cls, chunk_size: int = STREAMING_CHUNK_SIZE) -> 'SketchStore':
+        """
+        Met à jour les esquisses avec les lignes ajoutées depuis le dernier
+        rafraîchissement (reconstruction complète si aucune esquisse n'existe
+        ou si des lignes déjà traitées ont changé)
+        """
+        store = cls.load()
+        conn = get_db_connection()
+
+        if store is not None:
+            rows, max_step = conn.execute(
+                "SELECT COUNT(*), MAX(step) FROM transactions WHERE id <= ?",
+                (store.state['max_id'],)
+            ).fetchone()
+            if rows != store.state['rows'] or max_step != store.state['max_step']:
+                logger.warning("Des lignes déjà résumées ont changé : reconstruction complète des esquisses")
+                store = None
+        if store is None:
+            logger.info("Construction complète des esquisses de montants")
+            store = cls.empty()
+
+        last_id = store.state['max_id']
+        sketches = store.sketches
+        state = dict(store.state)
+        for chunk in iter_rows_after(last_id, chunk_size):
+            if chunk.empty:
+                continue
+            sketches = {dimension: merge_sketch_maps(sketches[dimension],
+                                                     frame_sketches(chunk, dimension, store.mapping))
+                        for dimension in SKETCH_DIMENSIONS}
+            state['max_id'] = int(chunk['id'].max())
+            chunk_max_step = int(chunk['step'].max())
+            state['max_step'] = chunk_max_step if state['max_step'] is None else max(state['max_step'], chunk_max_step)
+            state['rows'] += len(chunk)
+
+        new_rows = state['rows'] - store.state['rows']
+        if new_rows == 0:
+            logger.info(f"Esquisses de montants à jour (id <= {last_id}, {store.state['rows']} lignes)")
+            return store
+
+        store = cls(sketches, state, store.mapping)
+        store.save()
+        logger.info(f"Esquisses de montants rafraîchies: {new_rows} nouvelles lignes (id > {last_id}), "
+                    f"dernier step {state['max_step']}")
+        return store
+
+if __name__ == '__main__':
+    from utils import save_results
+
+    setup_logging()
+    store = SketchStore.refresh()
+    for dimension in ['category', 'merchant', 'fraud']:
+        quantiles = store.quantiles(dimension)
+        save_results(quantiles, f"amount_quantiles_{dimension}")
+    overall = store.overall()
+    print(f"{overall.count:,} montants : médiane {overall.quantile(0.5):.2f} €, "
+          f"p99 {overall.quantile(0.99):.2f} €, asymétrie {overall.skew():.2f}")
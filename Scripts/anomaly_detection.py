@@ -6,8 +6,10 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple
 import logging
-from scipy import stats
-from utils import save_results
+from config import BEHAVIOUR_RATIO_THRESHOLD, CUSTOMER_MEDIAN_WINDOW
+from customer_features import behaviour_fraud_rates, build_customer_features
+from instrumentation import span, traced
+from utils import save_results, with_amount
 
 logger = logging.getLogger(__name__)
 
@@ -30,17 +32,26 @@ def perform_anomaly_detection(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     # Détection des comportements marchands suspects
     results['merchant_anomalies'] = detect_merchant_anomalies(df)
     
+    # Écarts au comportement habituel de chaque client
+    features = build_customer_features(df)
+    results['behaviour_anomalies'] = detect_behaviour_anomalies(df, features)
+    results['behaviour_fraud_rates'] = behaviour_fraud_rates(features, df['fraud'])
+    
     # Sauvegarde des résultats
-    for name, result_df in results.items():
-        save_results(result_df, f"anomaly_{name}")
+    with span('save_results'):
+        for name, result_df in results.items():
+            save_results(result_df, f"anomaly_{name}")
     
     logger.info("Détection d'anomalies terminée")
     return results
 
+@traced
 def detect_transaction_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     """
     Détecte les anomalies au niveau des transactions
     """
+    df = with_amount(df)
+    
     # Calculer les statistiques par catégorie
     category_stats = df.groupby('category', observed=True).agg({
         'amount': ['mean', 'std']
@@ -77,10 +88,39 @@ def detect_transaction_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     
     return result
 
+def customer_anomaly_type(stats: pd.DataFrame) -> np.ndarray:
+    """
+    Type d'anomalie principal de chaque client, par ordre de priorité :
+    fraude détectée, nombre de transactions, montant moyen, montant total
+    """
+    return np.select(
+        [stats['fraud_count'] > 0,
+         abs(stats['transaction_count_zscore']) > 3,
+         abs(stats['avg_amount_zscore']) > 3],
+        ['fraude_détectée', 'nombre_transactions_anormal', 'montant_moyen_anormal'],
+        default='montant_total_anormal'
+    ).astype(object)
+
+def merchant_anomaly_type(stats: pd.DataFrame) -> np.ndarray:
+    """
+    Type d'anomalie principal de chaque commerçant, par ordre de priorité :
+    taux de fraude élevé, nombre de transactions, montant moyen, montant total
+    """
+    return np.select(
+        [stats['fraud_rate_zscore'] > 3,
+         abs(stats['transaction_count_zscore']) > 3,
+         abs(stats['avg_amount_zscore']) > 3],
+        ['taux_fraude_élevé', 'nombre_transactions_anormal', 'montant_moyen_anormal'],
+        default='montant_total_anormal'
+    ).astype(object)
+
+@traced
 def detect_customer_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     """
     Détecte les anomalies au niveau des clients
     """
+    df = with_amount(df)
+    
     # Calculer les statistiques par client
     customer_stats = df.groupby('customer', observed=True).agg({
         'amount': ['count', 'mean', 'sum'],
@@ -105,17 +145,7 @@ def detect_customer_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     ].copy()
     
     # Déterminer le type d'anomalie principal
-    def get_anomaly_type(row):
-        if row['fraud_count'] > 0:
-            return 'fraude_détectée'
-        elif abs(row['transaction_count_zscore']) > 3:
-            return 'nombre_transactions_anormal'
-        elif abs(row['avg_amount_zscore']) > 3:
-            return 'montant_moyen_anormal'
-        else:
-            return 'montant_total_anormal'
-    
-    anomalies['anomaly_type'] = anomalies.apply(get_anomaly_type, axis=1)
+    anomalies['anomaly_type'] = customer_anomaly_type(anomalies)
     
     # Trier par gravité d'anomalie
     anomalies = anomalies.sort_values(
@@ -125,22 +155,23 @@ def detect_customer_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     
     return anomalies
 
+@traced
 def detect_merchant_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     """
     Détecte les anomalies au niveau des commerçants
     """
-    # Calculer les statistiques par commerçant
-    merchant_stats = df.groupby('merchant', observed=True).agg({
-        'amount': ['count', 'mean', 'sum'],
-        'fraud': ['sum', lambda x: (x.sum() / len(x)) * 100]
+    df = with_amount(df)
+    
+    # Calculer les statistiques par commerçant (agrégations natives de pandas)
+    grouped = df.groupby('merchant', observed=True)
+    merchant_stats = pd.DataFrame({
+        'transaction_count': grouped['amount'].count(),
+        'avg_amount': grouped['amount'].mean(),
+        'total_amount': grouped['amount'].sum(),
+        'fraud_count': grouped['fraud'].sum(),
+        'fraud_rate': grouped['fraud'].mean() * 100
     })
     
-    # Aplatir les colonnes multi-index
-    merchant_stats.columns = [
-        'transaction_count', 'avg_amount', 'total_amount',
-        'fraud_count', 'fraud_rate'
-    ]
-    
     # Calculer les z-scores pour chaque métrique
     for col in ['transaction_count', 'avg_amount', 'total_amount', 'fraud_rate']:
         mean = merchant_stats[col].mean()
@@ -156,17 +187,7 @@ def detect_merchant_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     ].copy()
     
     # Déterminer le type d'anomalie principal
-    def get_anomaly_type(row):
-        if row['fraud_rate_zscore'] > 3:
-            return 'taux_fraude_élevé'
-        elif abs(row['transaction_count_zscore']) > 3:
-            return 'nombre_transactions_anormal'
-        elif abs(row['avg_amount_zscore']) > 3:
-            return 'montant_moyen_anormal'
-        else:
-            return 'montant_total_anormal'
-    
-    anomalies['anomaly_type'] = anomalies.apply(get_anomaly_type, axis=1)
+    anomalies['anomaly_type'] = merchant_anomaly_type(anomalies)
     
     # Trier par gravité d'anomalie
     anomalies = anomalies.sort_values(
@@ -175,3 +196,31 @@ def detect_merchant_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     )
     
     return anomalies
+
+@traced
+def detect_behaviour_anomalies(df: pd.DataFrame, features: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Détecte les transactions qui s'écartent de l'historique de leur client :
+    montant supérieur à BEHAVIOUR_RATIO_THRESHOLD fois la médiane de ses
+    transactions précédentes (au moins la moitié de la fenêtre de la médiane
+    disponible), chez un nouveau commerçant ou un commerçant habituel
+    """
+    df = with_amount(df)
+    if features is None:
+        features = build_customer_features(df)
+    
+    flagged = (
+        (features['amount_to_median'] >= BEHAVIOUR_RATIO_THRESHOLD) &
+        (features['history'] >= CUSTOMER_MEDIAN_WINDOW // 2)
+    )
+    anomalies = df.loc[flagged, [
+        'step', 'customer', 'age', 'gender', 'merchant', 'category', 'amount', 'fraud'
+    ]].join(features[flagged])
+    
+    anomalies['anomaly_type'] = np.where(
+        anomalies['new_merchant'] == 1,
+        'montant_inhabituel_nouveau_commerçant',
+        'montant_inhabituel'
+    )
+    
+    return anomalies.sort_values('amount_to_median', ascending=False)
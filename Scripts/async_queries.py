@@ -0,0 +1,188 @@
+"""
+API asyncio d'exécution des requêtes SQL de rapport
+
+Les requêtes sont exécutées sur un pool borné de threads (QUERY_WORKERS),
+chacun avec sa connexion en lecture seule (voir db_pool) : SQLite libère le
+GIL pendant l'exécution, si bien que plusieurs requêtes avancent en même
+temps. execute_query_async() retourne un DataFrame ; gather_queries() soumet
+un lot de requêtes nommées et rassemble leurs résultats et durées.
+
+La commande exécute en parallèle toutes les requêtes de
+SQLite/analysis_queries.sql et SQLite/export_queries.sql, écrit un CSV par
+requête (nommé d'après son titre) et leur concaténation
+(all_queries_results.csv) dans QUERY_EXPORT_DIR, puis les durées dans
+Results/query_timings_*.csv.
+
+Usage :
+    python async_queries.py [--sql fichier.sql ...] [--output-dir dossier] [--workers N]
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import pandas as pd
+
+from config import (
+    ANALYSIS_QUERIES_SQL, EXPORT_QUERIES_SQL, QUERY_CACHE_ENABLED, QUERY_EXPORT_DIR, QUERY_WORKERS
+)
+from data_loader import get_db_connection, read_sql_queries
+from instrumentation import sql_span
+from query_cache import cached_query
+from utils import save_results, setup_logging
+
+logger = logging.getLogger(__name__)
+
+class QueryResult(NamedTuple):
+    """
+    Résultat d'une requête nommée et sa durée d'exécution (lecture comprise)
+    """
+    name: str
+    data: pd.DataFrame
+    duration: float
+
+# Pool de threads partagé, créé au premier appel
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_workers = 0
+
+def get_executor(max_workers: int = QUERY_WORKERS) -> ThreadPoolExecutor:
+    """
+    Pool de threads de lecture (recréé si le nombre de threads change)
+    """
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != max_workers:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sql')
+        _executor_workers = max_workers
+    return _executor
+
+def _run_query(name: str, query: str, params: Optional[Sequence] = None,
+               use_cache: bool = QUERY_CACHE_ENABLED) -> QueryResult:
+    start = time.perf_counter()
+    try:
+        conn = get_db_connection()
+        if use_cache:
+            data = cached_query(query, conn, params)
+        else:
+            with sql_span(query) as query_span:
+                data = pd.read_sql_query(query, conn, params=params)
+                query_span.set(rows=len(data))
+    except Exception as e:
+        logger.error(f"Erreur lors de l'exécution de la requête {name}: {str(e)}")
+        raise
+    duration = time.perf_counter() - start
+    logger.debug(f"Requête {name}: {len(data)} lignes en {duration * 1000:.1f} ms")
+    return QueryResult(name, data, duration)
+
+async def execute_query_async(query: str, params: Optional[Sequence] = None,
+                              max_workers: int = QUERY_WORKERS) -> pd.DataFrame:
+    """
+    Exécute une requête SQL sur le pool de threads de lecture
+
+    Returns:
+        DataFrame des résultats
+    """
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(get_executor(max_workers), _run_query, 'anonyme', query, params)
+    return result.data
+
+async def gather_queries(queries: Iterable[Tuple[str, str]],
+                         max_workers: int = QUERY_WORKERS) -> Dict[str, QueryResult]:
+    """
+    Exécute un lot de requêtes nommées en parallèle
+
+    Args:
+        queries: couples (nom, requête)
+        max_workers: nombre maximal de requêtes exécutées en même temps
+
+    Returns:
+        Dict {nom: QueryResult} dans l'ordre du lot
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor(max_workers)
+    queries = list(queries)
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, _run_query, name, query) for name, query in queries
+    ))
+    return {result.name: result for result in results}
+
+def run_queries(queries: Iterable[Tuple[str, str]], max_workers: int = QUERY_WORKERS) -> Dict[str, QueryResult]:
+    """
+    Version synchrone de gather_queries (hors boucle asyncio)
+    """
+    return asyncio.run(gather_queries(queries, max_workers))
+
+def query_file_name(title: str) -> str:
+    """
+    Nom de fichier d'une requête dérivé de son titre (minuscules ASCII, '_')
+    """
+    ascii_title = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', ascii_title.lower()).strip('_')
+
+def named_queries(sql_paths: List[Path]) -> List[Tuple[str, str]]:
+    """
+    Requêtes des fichiers SQL, nommées d'après leur titre (noms uniques)
+    """
+    queries = []
+    seen = set()
+    for sql_path in sql_paths:
+        for title, query in read_sql_queries(sql_path):
+            name = base = query_file_name(title)
+            suffix = 2
+            while name in seen:
+                name, suffix = f"{base}_{suffix}", suffix + 1
+            seen.add(name)
+            queries.append((name, query))
+    return queries
+
+def export_results(results: Dict[str, QueryResult], output_dir: Path) -> pd.DataFrame:
+    """
+    Écrit un CSV par requête et leur concaténation (colonne query_name)
+
+    Returns:
+        DataFrame des durées par requête
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    frames = []
+    for name, result in results.items():
+        result.data.to_csv(output_dir / f"{name}.csv", index=False)
+        frames.append(result.data.assign(query_name=name))
+    if frames:
+        pd.concat(frames, ignore_index=True).to_csv(output_dir / 'all_queries_results.csv', index=False)
+    logger.info(f"{len(results)} fichiers CSV écrits dans {output_dir}")
+    return pd.DataFrame({
+        'requete': list(results),
+        'lignes': [len(result.data) for result in results.values()],
+        'duree_s': [result.duration for result in results.values()]
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Exécution parallèle des requêtes SQL de rapport")
+    parser.add_argument('--sql', type=Path, nargs='+', default=[ANALYSIS_QUERIES_SQL, EXPORT_QUERIES_SQL],
+                        help="Fichiers SQL à exécuter")
+    parser.add_argument('--output-dir', type=Path, default=QUERY_EXPORT_DIR, help="Dossier des CSV")
+    parser.add_argument('--workers', type=int, default=QUERY_WORKERS,
+                        help="Nombre de requêtes exécutées en même temps")
+    args = parser.parse_args()
+
+    queries = named_queries(args.sql)
+    start = time.perf_counter()
+    results = run_queries(queries, args.workers)
+    elapsed = time.perf_counter() - start
+
+    timings = export_results(results, args.output_dir)
+    for _, row in timings.sort_values('duree_s', ascending=False).iterrows():
+        print(f"{row['duree_s'] * 1000:8.1f} ms  {row['lignes']:>7,} lignes  {row['requete']}")
+    print(f"\n{len(queries)} requêtes en {elapsed:.2f} s avec {args.workers} threads "
+          f"(somme des durées : {timings['duree_s'].sum():.2f} s)")
+    save_results(timings, 'query_timings')
+
+if __name__ == '__main__':
+    setup_logging()
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark de la classification des anomalies clients et commerçants
+
+Compare les implémentations vectorisées de anomaly_detection aux versions
+ligne à ligne d'origine (DataFrame.apply(axis=1) et lambda dans
+groupby.agg), conservées ici comme référence, sur des transactions
+synthétiques comptant 10 000, 1 000 000 et 10 000 000 clients et
+commerçants distincts. Les deux implémentations doivent produire des
+résultats identiques.
+
+Usage :
+    python benchmark_anomalies.py [--sizes 10000 1000000 10000000]
+                                  [--rows-per-entity 2] [--reference-limit N]
+"""
+
+import argparse
+import logging
+import time
+from typing import Callable, Tuple
+import numpy as np
+import pandas as pd
+
+from anomaly_detection import detect_customer_anomalies, detect_merchant_anomalies
+from utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+def reference_customer_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Version d'origine de detect_customer_anomalies (classification ligne à ligne)
+    """
+    customer_stats = df.groupby('customer', observed=True).agg({
+        'amount': ['count', 'mean', 'sum'],
+        'fraud': 'sum'
+    })
+    customer_stats.columns = ['transaction_count', 'avg_amount', 'total_amount', 'fraud_count']
+    for col in ['transaction_count', 'avg_amount', 'total_amount']:
+        mean = customer_stats[col].mean()
+        std = customer_stats[col].std()
+        customer_stats[f'{col}_zscore'] = (customer_stats[col] - mean) / std
+
+    anomalies = customer_stats[
+        (abs(customer_stats['transaction_count_zscore']) > 3) |
+        (abs(customer_stats['avg_amount_zscore']) > 3) |
+        (abs(customer_stats['total_amount_zscore']) > 3) |
+        (customer_stats['fraud_count'] > 0)
+    ].copy()
+
+    def get_anomaly_type(row):
+        if row['fraud_count'] > 0:
+            return 'fraude_détectée'
+        elif abs(row['transaction_count_zscore']) > 3:
+            return 'nombre_transactions_anormal'
+        elif abs(row['avg_amount_zscore']) > 3:
+            return 'montant_moyen_anormal'
+        else:
+            return 'montant_total_anormal'
+
+    anomalies['anomaly_type'] = anomalies.apply(get_anomaly_type, axis=1)
+    return anomalies.sort_values(
+        ['fraud_count', 'transaction_count_zscore', 'total_amount_zscore'],
+        ascending=[False, False, False]
+    )
+
+def reference_merchant_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Version d'origine de detect_merchant_anomalies (lambda dans groupby.agg
+    et classification ligne à ligne)
+    """
+    merchant_stats = df.groupby('merchant', observed=True).agg({
+        'amount': ['count', 'mean', 'sum'],
+        'fraud': ['sum', lambda x: (x.sum() / len(x)) * 100]
+    })
+    merchant_stats.columns = [
+        'transaction_count', 'avg_amount', 'total_amount',
+        'fraud_count', 'fraud_rate'
+    ]
+    for col in ['transaction_count', 'avg_amount', 'total_amount', 'fraud_rate']:
+        mean = merchant_stats[col].mean()
+        std = merchant_stats[col].std()
+        merchant_stats[f'{col}_zscore'] = (merchant_stats[col] - mean) / std
+
+    anomalies = merchant_stats[
+        (abs(merchant_stats['transaction_count_zscore']) > 3) |
+        (abs(merchant_stats['avg_amount_zscore']) > 3) |
+        (abs(merchant_stats['total_amount_zscore']) > 3) |
+        (merchant_stats['fraud_rate_zscore'] > 3)
+    ].copy()
+
+    def get_anomaly_type(row):
+        if row['fraud_rate_zscore'] > 3:
+            return 'taux_fraude_élevé'
+        elif abs(row['transaction_count_zscore']) > 3:
+            return 'nombre_transactions_anormal'
+        elif abs(row['avg_amount_zscore']) > 3:
+            return 'montant_moyen_anormal'
+        else:
+            return 'montant_total_anormal'
+
+    anomalies['anomaly_type'] = anomalies.apply(get_anomaly_type, axis=1)
+    return anomalies.sort_values(
+        ['fraud_rate_zscore', 'transaction_count_zscore', 'total_amount_zscore'],
+        ascending=[False, False, False]
+    )
+
+def synthetic_transactions(n_entities: int, rows_per_entity: float = 2, seed: int = 0) -> pd.DataFrame:
+    """
+    Transactions synthétiques avec `n_entities` clients et commerçants distincts
+    (montants log-normaux, environ 1,2 % de fraudes)
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = max(int(n_entities * rows_per_entity), n_entities)
+
+    def entity_codes() -> np.ndarray:
+        # Chaque entité apparaît au moins une fois, le reste est tiré au hasard
+        codes = np.concatenate([np.arange(n_entities), rng.integers(0, n_entities, n_rows - n_entities)])
+        rng.shuffle(codes)
+        return codes.astype(np.int32)
+
+    def categorical(prefix: str) -> pd.Categorical:
+        categories = pd.Index(np.char.add(prefix, np.arange(n_entities).astype(str)).astype(object))
+        return pd.Categorical.from_codes(entity_codes(), categories=categories)
+
+    return pd.DataFrame({
+        'customer': categorical('C'),
+        'merchant': categorical('M'),
+        'amount': np.round(rng.lognormal(3.3, 1.0, n_rows), 2),
+        'fraud': (rng.random(n_rows) < 0.012).astype(np.int64)
+    })
+
+def _time(func: Callable[[pd.DataFrame], pd.DataFrame], df: pd.DataFrame) -> Tuple[pd.DataFrame, float]:
+    start = time.perf_counter()
+    result = func(df)
+    return result, time.perf_counter() - start
+
+def run_benchmark(sizes=DEFAULT_SIZES, rows_per_entity: float = 2,
+                  reference_limit: int = None) -> pd.DataFrame:
+    """
+    Mesure les deux implémentations pour chaque taille et vérifie l'égalité des résultats
+
+    Returns:
+        DataFrame (une ligne par taille et par niveau) des durées et de l'accélération
+    """
+    rows = []
+    for n_entities in sizes:
+        df = synthetic_transactions(n_entities, rows_per_entity)
+        logger.info(f"{n_entities:,} entités, {len(df):,} transactions")
+        for level, vectorised, reference in [
+            ('client', detect_customer_anomalies, reference_customer_anomalies),
+            ('commerçant', detect_merchant_anomalies, reference_merchant_anomalies)
+        ]:
+            result, vectorised_seconds = _time(vectorised, df)
+            reference_seconds = np.nan
+            if reference_limit is None or n_entities <= reference_limit:
+                expected, reference_seconds = _time(reference, df)
+                pd.testing.assert_frame_equal(result, expected)
+            rows.append({
+                'entites': n_entities,
+                'niveau': level,
+                'anomalies': len(result),
+                'reference_s': reference_seconds,
+                'vectorise_s': vectorised_seconds,
+                'acceleration': reference_seconds / vectorised_seconds
+            })
+            logger.info(f"  {level}: référence {reference_seconds:.2f} s, vectorisé {vectorised_seconds:.2f} s")
+        del df
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la classification des anomalies")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Nombres de clients / commerçants distincts")
+    parser.add_argument('--rows-per-entity', type=float, default=2,
+                        help="Nombre moyen de transactions par entité")
+    parser.add_argument('--reference-limit', type=int, default=None,
+                        help="Taille au-delà de laquelle la version d'origine n'est pas mesurée")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.rows_per_entity, args.reference_limit)
+    print(results.to_string(index=False, float_format=lambda value: f"{value:,.2f}"))
+
+if __name__ == '__main__':
+    setup_logging()
+    main()
@@ -0,0 +1,434 @@
+"""
+Benchmark de toutes les étapes du pipeline à plusieurs tailles de données
+
+Pour chaque taille (BENCHMARK_SCALES, en lignes), une base de test est
+construite une fois dans BENCHMARK_DIR, générée par synthetic_data.py
+(BENCHMARK_SYNTHETIC) ou en répétant la table courante (chaque copie avec ses
+propres clients), puis indexée comme structure.sql ; la taille 0 désigne la
+base courante telle quelle. Les étapes sont mesurées dans un
+processus dédié dont la base, les résultats et le cache sont redirigés
+(BANKDATA_DB_PATH, BANKDATA_RESULTS_DIR, BANKDATA_CACHE_DIR) :
+- chargement : load_data (sans cache), clean_data ;
+- analyse : construction du cube, chaque perform_* et chaque analyse
+  produisant des figures (figures collectées, non rendues) ;
+- figure : tracé et encodage PNG de chaque figure ;
+- requete : chaque requête de SQLite/analysis_queries.sql (sans cache) ;
+- demarrage : import de main dans un nouvel interpréteur (python -X
+  importtime), mesuré une fois par exécution.
+
+Chaque mesure est faite dans un processus fils (fork) : durée, pic de
+mémoire résidente pendant l'étape (VmHWM remis à zéro au début de l'étape,
+Linux) et débit en lignes/s. Les mesures sont ajoutées à BENCHMARK_HISTORY
+(JSON) et comparées à la référence BENCHMARK_BASELINE : les étapes plus
+lentes ou plus gourmandes en mémoire sont signalées comme régressions.
+
+Usage :
+    python benchmark_pipeline.py [--scales 600000 5000000 50000000] [--repeat N]
+                                 [--only motif] [--save-baseline] [--fail-on-regression]
+    python benchmark_pipeline.py --import-time [module]
+"""
+
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import numpy as np
+import pandas as pd
+
+from config import (
+    ANALYSIS_QUERIES_SQL, BENCHMARK_BASELINE, BENCHMARK_DIR, BENCHMARK_HISTORY,
+    BENCHMARK_MIN_RSS_MB, BENCHMARK_MIN_SECONDS, BENCHMARK_SCALES, BENCHMARK_SYNTHETIC,
+    BENCHMARK_TOLERANCE, DB_PATH, EXPECTED_COLUMNS, INGEST_PRAGMAS, ROOT_DIR, SYNTHETIC_SEED
+)
+from ingest import RUNTIME_PRAGMAS, TRANSACTION_COLUMNS, apply_pragmas, read_schema
+from synthetic_data import write_sqlite
+from utils import get_peak_rss_mb, reset_peak_rss, save_results, setup_logging, status_mb
+
+logger = logging.getLogger(__name__)
+
+class BenchmarkCase(NamedTuple):
+    """
+    Étape mesurée : `run` est chronométré, `setup` (non mesuré) prépare son argument
+    """
+    group: str
+    name: str
+    run: Callable[[Any], Any]
+    setup: Optional[Callable[[], Any]] = None
+
+def build_scaled_database(rows: int, source: Path = DB_PATH, directory: Path = BENCHMARK_DIR,
+                          synthetic: bool = BENCHMARK_SYNTHETIC) -> Path:
+    """
+    Base de test de `rows` lignes : transactions synthétiques (graine
+    SYNTHETIC_SEED) ou copies successives de la table source (clients
+    suffixés par le numéro de copie, steps inchangés), indexée comme
+    structure.sql. Réutilisée si elle existe déjà.
+    """
+    if rows <= 0:
+        return source
+    path = directory / (f"bankdata_{rows}_synthetic.db" if synthetic else f"bankdata_{rows}.db")
+    if path.exists():
+        conn = sqlite3.connect(path)
+        existing_rows = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        conn.close()
+        if existing_rows == rows:
+            return path
+        path.unlink()
+
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.unlink(missing_ok=True)
+    if synthetic:
+        logger.info(f"Génération de la base de test {path} ({rows:,} lignes)")
+        write_sqlite(tmp_path, rows, SYNTHETIC_SEED)
+        tmp_path.replace(path)
+        return path
+    table_statements, index_statements = read_schema()
+    columns = ', '.join(TRANSACTION_COLUMNS)
+    selected = ', '.join("customer || ?" if column == 'customer' else column for column in TRANSACTION_COLUMNS)
+
+    logger.info(f"Construction de la base de test {path} ({rows:,} lignes)")
+    start = time.perf_counter()
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        apply_pragmas(conn, INGEST_PRAGMAS)
+        for stmt in table_statements:
+            conn.execute(stmt)
+        conn.execute("ATTACH DATABASE ? AS source", (str(source),))
+        source_rows = conn.execute("SELECT COUNT(*) FROM source.transactions").fetchone()[0]
+        if source_rows == 0:
+            raise ValueError(f"La base source {source} est vide")
+
+        copied, copy = 0, 0
+        conn.execute("BEGIN")
+        while copied < rows:
+            suffix = '' if copy == 0 else f"_{copy}"
+            conn.execute(
+                f"INSERT INTO transactions ({columns}) "
+                f"SELECT {selected} FROM source.transactions ORDER BY id LIMIT ?",
+                (suffix, rows - copied)
+            )
+            copied += min(source_rows, rows - copied)
+            copy += 1
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE source")
+        for stmt in index_statements.values():
+            conn.execute(stmt)
+        apply_pragmas(conn, RUNTIME_PRAGMAS)
+    finally:
+        conn.close()
+    tmp_path.replace(path)
+    logger.info(f"Base de test construite en {time.perf_counter() - start:.1f} s ({copy} copies)")
+    return path
+
+def _measure(case: BenchmarkCase) -> Dict[str, float]:
+    """
+    Exécute une étape et mesure sa durée et son pic de mémoire
+    """
+    argument = case.setup() if case.setup is not None else None
+    exact_peak = reset_peak_rss()
+    rss_before = status_mb('VmRSS')
+    start = time.perf_counter()
+    case.run(argument)
+    seconds = time.perf_counter() - start
+    peak = status_mb('VmHWM') if exact_peak else get_peak_rss_mb()
+    return {'duree_s': seconds, 'pic_rss_mo': peak, 'hausse_rss_mo': peak - rss_before}
+
+def _measure_in_child(case: BenchmarkCase, conn) -> None:
+    try:
+        conn.send(_measure(case))
+    except Exception as e:
+        conn.send({'erreur': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+def measure_case(case: BenchmarkCase) -> Dict[str, float]:
+    """
+    Mesure une étape dans un processus fils (fork) pour isoler son pic de
+    mémoire et ses effets de bord ; directement si fork est indisponible
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return _measure(case)
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_in_child, args=(case, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'erreur': f"processus terminé (code {process.exitcode})"}
+    process.join()
+    return result
+
+def _render_figure(job) -> None:
+    import matplotlib.pyplot as plt
+    from figures import savefig_options
+
+    fig = job.render(job.data)
+    fig.savefig(io.BytesIO(), **savefig_options(job))
+    plt.close(fig)
+
+def pipeline_cases(df: pd.DataFrame) -> List[BenchmarkCase]:
+    """
+    Étapes du pipeline sur le DataFrame chargé (les figures sont collectées
+    une fois pour mesurer ensuite leur rendu)
+    """
+    from amount_distribution_analysis import analyze_amount_distribution
+    from anomaly_detection import perform_anomaly_detection
+    from config import RESULTS_DIR
+    from context import AnalysisContext
+    from cycle_analysis import analyze_cycles
+    from data_cube import DataCube
+    from data_loader import clean_data, get_db_connection, load_data, read_sql_queries
+    from descriptive_analysis import perform_descriptive_analysis
+    from fraud_analysis import perform_fraud_analysis
+    from generate_kpi_dashboard import create_kpi_dashboard
+    from temporal_analysis import perform_temporal_analysis
+    from temporal_patterns_analysis import analyze_temporal_patterns
+    from visualization import generate_visualizations
+
+    cube = DataCube.from_frame(df)
+
+    def ctx():
+        return AnalysisContext(df, cube=cube)
+
+    figure_analyses = {
+        'generate_visualizations': lambda figures: generate_visualizations(df, RESULTS_DIR, cube, figures=figures),
+        'create_kpi_dashboard': lambda figures: create_kpi_dashboard(ctx(), figures=figures),
+        'analyze_temporal_patterns': lambda figures: analyze_temporal_patterns(ctx(), figures=figures),
+        'analyze_cycles': lambda figures: analyze_cycles(ctx(), figures=figures),
+        'analyze_amount_distribution': lambda figures: analyze_amount_distribution(ctx(), figures=figures)
+    }
+    raw_query = f"SELECT {', '.join(EXPECTED_COLUMNS)} FROM transactions"
+
+    cases = [
+        BenchmarkCase('chargement', 'load_data', lambda _: load_data(use_cache=False)),
+        BenchmarkCase('chargement', 'clean_data', clean_data,
+                      lambda: pd.read_sql_query(raw_query, get_db_connection())),
+        BenchmarkCase('analyse', 'DataCube.from_frame', lambda _: DataCube.from_frame(df)),
+        BenchmarkCase('analyse', 'perform_descriptive_analysis', lambda _: perform_descriptive_analysis(cube)),
+        BenchmarkCase('analyse', 'perform_temporal_analysis', lambda _: perform_temporal_analysis(cube)),
+        BenchmarkCase('analyse', 'perform_fraud_analysis', lambda _: perform_fraud_analysis(cube)),
+        BenchmarkCase('analyse', 'perform_anomaly_detection', lambda _: perform_anomaly_detection(df))
+    ]
+    cases += [BenchmarkCase('analyse', name, lambda _, analysis=analysis: analysis([]))
+              for name, analysis in figure_analyses.items()]
+
+    jobs = []
+    for analysis in figure_analyses.values():
+        analysis(jobs)
+    cases += [BenchmarkCase('figure', job.name, lambda _, job=job: _render_figure(job)) for job in jobs]
+
+    cases += [BenchmarkCase('requete', title, lambda conn, query=query: pd.read_sql_query(query, conn),
+                            get_db_connection)
+              for title, query in read_sql_queries(ANALYSIS_QUERIES_SQL)]
+    return cases
+
+def run_worker(output: Path, repeat: int = 1, only: Optional[str] = None) -> None:
+    """
+    Mesure toutes les étapes sur la base désignée par BANKDATA_DB_PATH
+    (exécuté dans le sous-processus de chaque taille)
+    """
+    from data_loader import load_data
+
+    df = load_data()
+    cases = [case for case in pipeline_cases(df) if only is None or only in case.name]
+    records = []
+    for case in cases:
+        runs = [measure_case(case) for _ in range(repeat)]
+        errors = [run['erreur'] for run in runs if 'erreur' in run]
+        if errors:
+            logger.error(f"{case.group}/{case.name}: {errors[0]}")
+            continue
+        seconds = float(np.median([run['duree_s'] for run in runs]))
+        records.append({
+            'groupe': case.group,
+            'etape': case.name,
+            'lignes': len(df),
+            'duree_s': seconds,
+            'pic_rss_mo': max(run['pic_rss_mo'] for run in runs),
+            'hausse_rss_mo': max(run['hausse_rss_mo'] for run in runs),
+            'lignes_par_s': len(df) / seconds if seconds > 0 else np.inf
+        })
+        logger.info(f"{case.group}/{case.name}: {seconds:.3f} s, pic {records[-1]['pic_rss_mo']:.0f} Mo")
+    output.write_text(json.dumps(records), encoding='utf-8')
+
+def run_scale(rows: int, repeat: int = 1, only: Optional[str] = None) -> List[dict]:
+    """
+    Mesure le pipeline sur la base de test de `rows` lignes, dans un
+    sous-processus dont la base, les résultats et le cache sont redirigés
+    """
+    db_path = build_scaled_database(rows)
+    work_dir = BENCHMARK_DIR / f"run_{rows}"
+    (work_dir / 'Results' / 'Figures').mkdir(parents=True, exist_ok=True)
+    output = work_dir / 'measures.json'
+    env = {
+        **os.environ,
+        'BANKDATA_DB_PATH': str(db_path),
+        'BANKDATA_RESULTS_DIR': str(work_dir / 'Results'),
+        'BANKDATA_CACHE_DIR': str(work_dir / 'Cache'),
+        'MPLBACKEND': 'Agg'
+    }
+    command = [sys.executable, str(Path(__file__).resolve()), '--worker', str(output), '--repeat', str(repeat)]
+    if only:
+        command += ['--only', only]
+    logger.info(f"Mesure du pipeline sur {db_path}")
+    subprocess.run(command, env=env, check=True)
+    return [{'echelle': rows, **record} for record in json.loads(output.read_text(encoding='utf-8'))]
+
+def import_times(module: str = 'main') -> pd.DataFrame:
+    """
+    Durées d'import de `module` et de ses dépendances, mesurées par
+    `python -X importtime` dans un nouvel interpréteur
+
+    Returns:
+        Une ligne par module importé (durées propre et cumulée en ms,
+        profondeur dans l'arbre des imports), par durée cumulée décroissante
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                               cwd=Path(__file__).resolve().parent, capture_output=True, text=True, check=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append({
+            'module': name.strip(),
+            'profondeur': (len(name) - len(name.lstrip()) - 1) // 2,
+            'propre_ms': int(self_us) / 1000,
+            'cumule_ms': int(cumulative_us) / 1000
+        })
+    return pd.DataFrame(rows).sort_values('cumule_ms', ascending=False, ignore_index=True)
+
+def startup_measures(module: str = 'main', repeat: int = 3) -> List[dict]:
+    """
+    Démarrage à froid : durée d'import de `module` dans un nouvel
+    interpréteur (médiane de `repeat` mesures)
+    """
+    seconds = []
+    for _ in range(repeat):
+        times = import_times(module)
+        seconds.append(times.loc[(times['module'] == module) & (times['profondeur'] == 0), 'cumule_ms'].iloc[0] / 1000)
+    median = float(np.median(seconds))
+    logger.info(f"demarrage/import {module}: {median:.3f} s")
+    return [{'echelle': 0, 'groupe': 'demarrage', 'etape': f"import {module}", 'lignes': 0, 'duree_s': median,
+             'pic_rss_mo': np.nan, 'hausse_rss_mo': np.nan, 'lignes_par_s': np.nan}]
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(scales: List[int] = BENCHMARK_SCALES, repeat: int = 1, only: Optional[str] = None) -> dict:
+    """
+    Mesure le pipeline à chaque taille
+
+    Returns:
+        Exécution du benchmark : environnement et mesures
+    """
+    measures = startup_measures(repeat=max(repeat, 3)) if only is None or only in 'import main' else []
+    for rows in scales:
+        measures += run_scale(rows, repeat, only)
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'cpu': os.cpu_count(),
+        'mesures': measures
+    }
+
+def load_runs(path: Path) -> List[dict]:
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return []
+
+def append_history(run: dict, path: Path = BENCHMARK_HISTORY) -> None:
+    history = load_runs(path)
+    history.append(run)
+    path.write_text(json.dumps(history, indent=1), encoding='utf-8')
+
+def compare_with_baseline(run: dict, baseline: dict, tolerance: float = BENCHMARK_TOLERANCE) -> pd.DataFrame:
+    """
+    Compare les mesures à la référence (mêmes taille, groupe et étape)
+
+    Returns:
+        Une ligne par étape : durées et pics de mémoire, rapports à la
+        référence et indicateur de régression
+    """
+    current = pd.DataFrame(run['mesures'])
+    keys = ['echelle', 'groupe', 'etape']
+    reference = pd.DataFrame(baseline.get('mesures', []), columns=keys + ['duree_s', 'pic_rss_mo'])
+    comparison = current.merge(reference[keys + ['duree_s', 'pic_rss_mo']], on=keys, how='left',
+                               suffixes=('', '_reference'))
+    comparison['rapport_duree'] = comparison['duree_s'] / comparison['duree_s_reference']
+    comparison['rapport_rss'] = comparison['pic_rss_mo'] / comparison['pic_rss_mo_reference']
+    slower = ((comparison['rapport_duree'] > 1 + tolerance) &
+              (comparison['duree_s'] - comparison['duree_s_reference'] > BENCHMARK_MIN_SECONDS))
+    heavier = ((comparison['rapport_rss'] > 1 + tolerance) &
+               (comparison['pic_rss_mo'] - comparison['pic_rss_mo_reference'] > BENCHMARK_MIN_RSS_MB))
+    comparison['regression'] = np.select([slower & heavier, slower, heavier],
+                                         ['duree+memoire', 'duree', 'memoire'], default='')
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des étapes du pipeline")
+    parser.add_argument('--scales', type=int, nargs='+', default=BENCHMARK_SCALES,
+                        help="Tailles des bases mesurées, en lignes (0 : base courante)")
+    parser.add_argument('--repeat', type=int, default=1, help="Mesures par étape (médiane retenue)")
+    parser.add_argument('--only', help="Ne mesure que les étapes dont le nom contient ce texte")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Enregistre cette exécution comme référence")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="Code de retour 1 si une régression est détectée")
+    parser.add_argument('--import-time', nargs='?', const='main', metavar='MODULE',
+                        help="Affiche les durées d'import du module (python -X importtime) et s'arrête")
+    parser.add_argument('--worker', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.repeat, args.only)
+        return
+    if args.import_time:
+        times = import_times(args.import_time)
+        save_results(times, 'import_time')
+        print(times.head(30).to_string(index=False, float_format=lambda value: f"{value:,.1f}"))
+        return
+
+    run = run_benchmark(args.scales, args.repeat, args.only)
+    append_history(run)
+    baseline = load_runs(BENCHMARK_BASELINE) or {}
+    comparison = compare_with_baseline(run, baseline if isinstance(baseline, dict) else {})
+    save_results(comparison, 'benchmark')
+
+    columns = ['echelle', 'groupe', 'etape', 'duree_s', 'lignes_par_s', 'pic_rss_mo', 'rapport_duree', 'regression']
+    print(comparison[columns].to_string(index=False, float_format=lambda value: f"{value:,.3f}"))
+    regressions = comparison[comparison['regression'] != '']
+    for _, row in regressions.iterrows():
+        logger.warning(f"Régression ({row['regression']}) : {row['groupe']}/{row['etape']} à {row['echelle']:,} lignes, "
+                       f"{row['duree_s']:.3f} s contre {row['duree_s_reference']:.3f} s, "
+                       f"{row['pic_rss_mo']:.0f} Mo contre {row['pic_rss_mo_reference']:.0f} Mo")
+    if args.save_baseline:
+        BENCHMARK_BASELINE.write_text(json.dumps(run, indent=1), encoding='utf-8')
+        logger.info(f"Référence enregistrée dans {BENCHMARK_BASELINE}")
+    if args.fail_on_regression and len(regressions):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    setup_logging()
+    main()
@@ -6,19 +6,77 @@ import os
 import logging
 from pathlib import Path
 
-# Chemins des données
+# Chemins des données ; la base, les résultats et le cache peuvent être
+# déplacés par les variables d'environnement BANKDATA_DB_PATH,
+# BANKDATA_RESULTS_DIR et BANKDATA_CACHE_DIR (voir benchmark_pipeline.py)
 ROOT_DIR = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-RESULTS_DIR = ROOT_DIR / 'Results'
+RESULTS_DIR = Path(os.environ.get('BANKDATA_RESULTS_DIR', ROOT_DIR / 'Results'))
 FIGURES_DIR = RESULTS_DIR / 'Figures'
 SQLITE_DIR = ROOT_DIR / 'SQLite'
 
-# Création des dossiers nécessaires
-RESULTS_DIR.mkdir(exist_ok=True)
-FIGURES_DIR.mkdir(exist_ok=True)
-SQLITE_DIR.mkdir(exist_ok=True)
+def ensure_directories() -> None:
+    """
+    Crée les dossiers nécessaires (au lancement, pas à l'import de la configuration)
+    """
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    SQLITE_DIR.mkdir(parents=True, exist_ok=True)
 
 # Base de données SQLite
-DB_PATH = SQLITE_DIR / 'bankdata.db'
+DB_PATH = Path(os.environ.get('BANKDATA_DB_PATH', SQLITE_DIR / 'bankdata.db'))
+STRUCTURE_SQL = SQLITE_DIR / 'structure.sql'
+ANALYSIS_QUERIES_SQL = SQLITE_DIR / 'analysis_queries.sql'
+EXPORT_QUERIES_SQL = SQLITE_DIR / 'export_queries.sql'
+
+# Connexions de lecture partagées (voir db_pool.py) : connexions inactives
+# conservées par processus et PRAGMA appliqués à l'ouverture de chaque connexion
+SQLITE_POOL_SIZE = 4
+SQLITE_READ_PRAGMAS = {
+    'mmap_size': '268435456',  # 256 Mo lus par mmap
+    'cache_size': '-65536',  # 64 Mo
+    'temp_store': 'MEMORY'
+}
+
+# Requêtes SQL exécutées en parallèle (voir async_queries.py) : threads de
+# lecture et dossier des CSV par requête
+QUERY_WORKERS = 4
+QUERY_EXPORT_DIR = ROOT_DIR / 'Scripts'
+
+# Ingestion des CSV BankSim (voir ingest.py)
+INGEST_BATCH_SIZE = 50_000
+INGEST_COMMIT_EVERY = 1_000_000
+# PRAGMA appliqués pendant le chargement uniquement (surchargeables via --pragma)
+INGEST_PRAGMAS = {
+    'journal_mode': 'MEMORY',
+    'synchronous': 'OFF',
+    'cache_size': '-262144',  # 256 Mo
+    'temp_store': 'MEMORY',
+    'locking_mode': 'EXCLUSIVE'
+}
+
+# Cache colonnaire du DataFrame nettoyé (créé à la première écriture)
+CACHE_DIR = Path(os.environ.get('BANKDATA_CACHE_DIR', ROOT_DIR / 'Cache'))
+FRAME_CACHE_ENABLED = True
+
+# Cache des résultats des requêtes SQL (voir query_cache.py) : résultats gardés
+# en mémoire (LRU) et taille maximale du cache sur disque (Cache/queries)
+QUERY_CACHE_ENABLED = True
+QUERY_CACHE_MEMORY_ENTRIES = 64
+QUERY_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Chargement par blocs (mode streaming, recommandé pour les gros extraits)
+STREAMING_ENABLED = False
+STREAMING_CHUNK_SIZE = 100_000
+# Types numériques appliqués dès la lecture ; 'amount' reste en float64 par
+# défaut pour que les sommes des rapports soient inchangées ('float32' divise
+# sa taille par deux)
+STREAMING_DTYPES = {'step': 'int32', 'amount': 'float64', 'fraud': 'int8'}
+
+# Schéma compact du DataFrame nettoyé (voir data_loader.compact_frame) :
+# 'fraud' en int8, 'step' en int16/int32, 'age' en catégorie ordonnée ;
+# avec COMPACT_AMOUNT_CENTS, 'amount' est remplacé par 'amount_cents' (int32)
+COMPACT_SCHEMA = False
+COMPACT_AMOUNT_CENTS = False
 
 # Configuration du logging
 LOGGING_LEVEL = logging.INFO
@@ -29,6 +87,81 @@ FIGURE_SIZE = (12, 8)
 STYLE = 'seaborn'
 DPI = 300
 
+# Rendu des figures (voir figures.py) : processus de rendu (0 = tous les
+# cœurs), résolution du mode aperçu et cache de rendu
+FIGURE_WORKERS = 0
+FIGURE_PREVIEW_DPI = 72
+FIGURE_CACHE_ENABLED = True
+
+# Rapports descriptifs, temporels, de fraude et KPIs dérivés des agrégats
+# persistés (voir aggregate_store.py) : seules les nouvelles lignes sont lues
+INCREMENTAL_AGGREGATES = False
+
+# Rapports exécutés sans contexte chargé (modules lancés seuls, descriptive_analysis
+# sans cube) lus dans les tables de synthèse tenues à jour par triggers
+# (voir summary_tables.py ; `python summary_tables.py` les construit)
+SUMMARY_TABLES_ENABLED = False
+
+# Analyse des cycles (voir periodicity.py) : période saisonnière en steps, jour
+# de la semaine du step 0 (0 = lundi) et dimensions des profils calculés en lot
+CYCLE_PERIOD = 7
+FIRST_STEP_WEEKDAY = 0
+CYCLE_PROFILE_DIMENSIONS = ['category', 'merchant']
+
+# Variables comportementales par client (voir customer_features.py) : fenêtre
+# de vélocité en steps, nombre de transactions précédentes de la médiane
+# glissante ; une transaction est une anomalie comportementale quand son
+# montant dépasse BEHAVIOUR_RATIO_THRESHOLD fois cette médiane
+CUSTOMER_VELOCITY_WINDOW = 7
+CUSTOMER_MEDIAN_WINDOW = 10
+BEHAVIOUR_RATIO_THRESHOLD = 10
+
+# Esquisses de quantiles des montants (voir amount_sketch.py) : erreur
+# relative maximale des quantiles et bornes des montants représentés ; avec
+# AMOUNT_SKETCHES_ENABLED, l'analyse de la distribution des montants est
+# calculée depuis les esquisses persistées, sans relire tous les montants
+AMOUNT_SKETCH_ACCURACY = 0.005
+AMOUNT_SKETCH_MIN = 0.01
+AMOUNT_SKETCH_MAX = 1e7
+AMOUNT_SKETCHES_ENABLED = False
+
+# Générateur de transactions synthétiques (voir synthetic_data.py) : graine par
+# défaut, lignes par bloc (unité de travail des processus : la sortie ne dépend
+# pas de leur nombre), processus (0 = tous les cœurs), steps simulés et
+# dispersion (sigma log-normal) des montants
+SYNTHETIC_SEED = 42
+SYNTHETIC_BLOCK_ROWS = 1_000_000
+SYNTHETIC_WORKERS = 0
+SYNTHETIC_STEPS = 180
+SYNTHETIC_AMOUNT_SIGMA = 0.9
+
+# Benchmark du pipeline (voir benchmark_pipeline.py) : tailles mesurées (en
+# lignes, 0 = base courante), bases de test générées par synthetic_data.py
+# (sinon copies de la base courante), dossier des bases de test, historique et
+# référence des mesures ; une durée ou un pic de mémoire est une régression
+# s'il dépasse la référence de plus de BENCHMARK_TOLERANCE (et des écarts
+# minimaux, pour ignorer le bruit des étapes très courtes)
+BENCHMARK_SCALES = [600_000, 5_000_000, 50_000_000]
+BENCHMARK_SYNTHETIC = True
+BENCHMARK_DIR = CACHE_DIR / 'benchmark'
+BENCHMARK_HISTORY = RESULTS_DIR / 'benchmark_history.json'
+BENCHMARK_BASELINE = RESULTS_DIR / 'benchmark_baseline.json'
+BENCHMARK_TOLERANCE = 0.2
+BENCHMARK_MIN_SECONDS = 0.05
+BENCHMARK_MIN_RSS_MB = 20
+
+# Instrumentation du pipeline (voir instrumentation.py ; main.py --instrument) :
+# intervalles par étape et sous-étape, requêtes SQL et pic de mémoire résidente
+# par étape, rapport Results/run_report.json ; INSTRUMENTATION_TRACEMALLOC
+# ajoute le pic d'allocations mesuré par tracemalloc (coûteux) et
+# INSTRUMENTATION_PROFILER ('cprofile' ou 'pyinstrument') un profil par étape
+INSTRUMENTATION_ENABLED = False
+INSTRUMENTATION_TRACEMALLOC = False
+INSTRUMENTATION_PROFILER = None
+
+# Exécution parallèle des étapes d'analyse (main.py --jobs ; 0 = tous les cœurs)
+ANALYSIS_JOBS = 1
+
 # Paramètres d'analyse
 AMOUNT_BINS = [0, 100, 500, 1000, 2000, 5000, float('inf')]
 AMOUNT_LABELS = ['0-100', '100-500', '500-1000', '1000-2000', '2000-5000', '>5000']
@@ -0,0 +1,85 @@
+"""
+Contexte d'analyse partagé entre les différentes étapes du pipeline
+"""
+
+import logging
+from typing import Callable, Dict, List, Union
+import pandas as pd
+
+from config import SUMMARY_TABLES_ENABLED
+from data_cube import DataCube
+from data_loader import get_db_connection, load_data
+from dataset_summary import get_dataset_summary
+from summary_tables import SummaryTables, is_installed
+
+logger = logging.getLogger(__name__)
+
+class AnalysisContext:
+    """
+    Regroupe le DataFrame des transactions, chargé une seule fois depuis
+    SQLite, et les agrégats intermédiaires partagés entre plusieurs analyses.
+
+    Les agrégats sont calculés à la première demande puis mémorisés, de sorte
+    qu'aucune analyse n'ait besoin de relire la table `transactions`. Un cube
+    déjà construit (par exemple maintenu incrémentalement par aggregate_store)
+    peut être fourni à la construction.
+    """
+
+    def __init__(self, df: pd.DataFrame, cube: DataCube = None):
+        self.df = df
+        self._aggregates: Dict[str, object] = {}
+        if cube is not None:
+            self._aggregates['cube'] = cube
+
+    @classmethod
+    def from_database(cls) -> 'AnalysisContext':
+        """
+        Construit le contexte à partir d'un chargement complet de la base
+        """
+        return cls(load_data())
+
+    def _memoize(self, name: str, compute: Callable[[], object]) -> object:
+        if name not in self._aggregates:
+            logger.debug(f"Calcul de l'agrégat partagé '{name}'")
+            self._aggregates[name] = compute()
+        return self._aggregates[name]
+
+    def cube(self) -> DataCube:
+        """
+        Cube de données pré-agrégé, base de tous les rapports groupés
+        """
+        return self._memoize('cube', lambda: DataCube.from_frame(self.df))
+
+    def rollup(self, by: Union[str, List[str]]) -> pd.DataFrame:
+        """
+        Roll-up du cube de données (voir DataCube.rollup)
+        """
+        return self.cube().rollup(by)
+
+    def data_info(self) -> dict:
+        """
+        Résumé du dataset (voir dataset_summary.get_dataset_summary),
+        calculé sur le cube s'il n'est pas déjà en cache
+        """
+        return self._memoize('summary', lambda: get_dataset_summary(self.cube()))
+
+def ensure_context(ctx: 'AnalysisContext' = None) -> AnalysisContext:
+    """
+    Retourne le contexte fourni ou en construit un depuis la base
+    (utilisé par les exécutions autonomes des modules)
+    """
+    if ctx is None:
+        ctx = AnalysisContext.from_database()
+    return ctx
+
+def report_source(ctx: AnalysisContext = None) -> Union[AnalysisContext, SummaryTables]:
+    """
+    Source des agrégats d'un rapport (méthodes rollup() et data_info()) : le
+    contexte fourni ; sinon les tables de synthèse si SUMMARY_TABLES_ENABLED
+    et qu'elles sont installées ; sinon un contexte construit depuis la base
+    """
+    if ctx is None and SUMMARY_TABLES_ENABLED:
+        if is_installed(get_db_connection()):
+            return SummaryTables()
+        logger.warning("Tables de synthèse absentes (python summary_tables.py) : chargement complet des données")
+    return ensure_context(ctx)
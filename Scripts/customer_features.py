@@ -0,0 +1,302 @@
+"""
+Variables comportementales par client, calculées en une passe triée
+
+Les transactions sont triées une seule fois par (client, step) ; chaque
+client occupe alors une plage contiguë, repérée par les tableaux de début de
+groupe. Toutes les variables sont calculées sur ces tableaux, sans boucle
+Python par client :
+- velocity : nombre de transactions du client sur les CUSTOMER_VELOCITY_WINDOW
+  derniers steps (transaction courante comprise) ;
+- amount_to_median : montant rapporté à la médiane des
+  CUSTOMER_MEDIAN_WINDOW transactions précédentes du client ;
+- new_merchant / new_category : premier achat du client chez ce commerçant
+  ou dans cette catégorie ;
+- steps_since_previous : steps écoulés depuis la transaction précédente du
+  client (-1 pour la première) ;
+- history : nombre de transactions précédentes du client.
+
+build_customer_features() traite un DataFrame déjà chargé, par blocs de
+clients entiers ; iter_customer_features() lit la base triée par client et
+bloc par bloc, en mémoire bornée quelle que soit la taille de la table
+(`python customer_features.py` écrit le résultat dans le cache colonnaire).
+"""
+
+import json
+import logging
+import shutil
+import time
+from typing import Dict, Iterator, Optional
+import numpy as np
+import pandas as pd
+
+from config import (
+    CACHE_DIR, CUSTOMER_MEDIAN_WINDOW, CUSTOMER_VELOCITY_WINDOW, FRAME_CACHE_ENABLED, STREAMING_CHUNK_SIZE
+)
+from data_loader import get_db_connection
+from frame_cache import FORMAT_VERSION, MANIFEST_NAME, database_fingerprint, load_frame
+from instrumentation import traced
+from utils import setup_logging, with_amount
+
+logger = logging.getLogger(__name__)
+
+FEATURES_CACHE_NAME = 'customer_features'
+
+FEATURE_DTYPES = {
+    'velocity': np.int32,
+    'amount_to_median': np.float32,
+    'new_merchant': np.int8,
+    'new_category': np.int8,
+    'steps_since_previous': np.int32,
+    'history': np.int32
+}
+
+# Lecture triée par client (index sur customer, tri des steps par client)
+SORTED_QUERY = """
+SELECT id, customer, merchant, category, step, amount
+FROM transactions
+ORDER BY customer, step, id
+"""
+
+def _codes(values) -> np.ndarray:
+    """
+    Codes entiers d'une colonne (catégorielle ou non)
+    """
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        return np.asarray(values.cat.codes if isinstance(values, pd.Series) else values.codes)
+    return pd.factorize(np.asarray(values))[0]
+
+def _rolling_median(amount: np.ndarray, position: np.ndarray, window: int) -> np.ndarray:
+    """
+    Médiane des `window` montants précédents de chaque ligne dans son groupe
+    (NaN sans historique)
+    """
+    n = len(amount)
+    lags = np.arange(1, window + 1)
+    source = np.arange(n)[:, None] - lags
+    previous = np.where(position[:, None] >= lags, amount[np.clip(source, 0, None)], np.nan)
+    previous.sort(axis=1)  # NaN en fin de ligne
+    count = window - np.isnan(previous).sum(axis=1)
+    low = np.take_along_axis(previous, np.clip((count - 1) // 2, 0, None)[:, None], axis=1)[:, 0]
+    high = np.take_along_axis(previous, np.clip(count // 2, 0, None)[:, None], axis=1)[:, 0]
+    return np.where(count > 0, (low + high) / 2, np.nan)
+
+def sorted_features(customer: np.ndarray, merchant: np.ndarray, category: np.ndarray,
+                    step: np.ndarray, amount: np.ndarray,
+                    window: int = CUSTOMER_VELOCITY_WINDOW,
+                    median_window: int = CUSTOMER_MEDIAN_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    Variables de lignes triées par (client, step), chaque client étant
+    entièrement présent (codes entiers pour client, commerçant et catégorie)
+
+    Returns:
+        Dict {variable: tableau} dans l'ordre des lignes
+    """
+    n = len(customer)
+    if n == 0:
+        return {name: np.zeros(0, dtype=dtype) for name, dtype in FEATURE_DTYPES.items()}
+    step = np.asarray(step, dtype=np.int64)
+    amount = np.asarray(amount, dtype=float)
+
+    # Tableaux de groupes : début de chaque client et rang dans le client
+    is_start = np.empty(n, dtype=bool)
+    is_start[0] = True
+    is_start[1:] = customer[1:] != customer[:-1]
+    group = np.cumsum(is_start) - 1
+    starts = np.flatnonzero(is_start)
+    position = np.arange(n) - starts[group]
+
+    steps_since = np.empty(n, dtype=np.int64)
+    steps_since[0] = -1
+    steps_since[1:] = np.diff(step)
+    steps_since[is_start] = -1
+
+    # Vélocité : clé (client, step) croissante, recherche du début de fenêtre
+    span = int(step.max() - step.min()) + window + 1
+    key = group * span + (step - step.min())
+    first_in_window = np.searchsorted(key, key - window + 1, side='left')
+    velocity = np.arange(n) - first_in_window + 1
+
+    median = _rolling_median(amount, position, median_window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(median > 0, amount / median, np.nan)
+
+    new_merchant = ~pd.Series(group * (int(merchant.max()) + 1) + merchant).duplicated().to_numpy()
+    new_category = ~pd.Series(group * (int(category.max()) + 1) + category).duplicated().to_numpy()
+
+    features = {
+        'velocity': velocity,
+        'amount_to_median': ratio,
+        'new_merchant': new_merchant,
+        'new_category': new_category,
+        'steps_since_previous': steps_since,
+        'history': position
+    }
+    return {name: values.astype(FEATURE_DTYPES[name]) for name, values in features.items()}
+
+@traced
+def build_customer_features(df: pd.DataFrame, window: int = CUSTOMER_VELOCITY_WINDOW,
+                            median_window: int = CUSTOMER_MEDIAN_WINDOW,
+                            chunk_rows: int = STREAMING_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Variables comportementales de chaque transaction d'un DataFrame
+
+    Le tri par (client, step) est fait une fois ; les calculs sont faits par
+    blocs d'environ chunk_rows lignes formés de clients entiers, pour borner
+    la mémoire temporaire.
+
+    Returns:
+        DataFrame des variables (types compacts), même index que df
+    """
+    start_time = time.perf_counter()
+    df = with_amount(df)
+    customer = _codes(df['customer'])
+    merchant = _codes(df['merchant'])
+    category = _codes(df['category'])
+    step = df['step'].to_numpy()
+    amount = df['amount'].to_numpy(dtype=float)
+
+    order = np.lexsort((step, customer))
+    sorted_customer = customer[order]
+    n = len(order)
+
+    # Limites des blocs placées sur des débuts de client
+    starts = np.flatnonzero(np.r_[True, sorted_customer[1:] != sorted_customer[:-1]]) if n else np.zeros(0, int)
+    bounds = np.unique(np.r_[starts[np.searchsorted(starts, np.arange(0, n, chunk_rows))], n]) if n else [0]
+
+    result = {name: np.empty(n, dtype=dtype) for name, dtype in FEATURE_DTYPES.items()}
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        rows = order[lo:hi]
+        chunk = sorted_features(sorted_customer[lo:hi], merchant[rows], category[rows],
+                                step[rows], amount[rows], window, median_window)
+        for name, values in chunk.items():
+            result[name][rows] = values
+
+    logger.info(f"Variables comportementales de {n} transactions calculées "
+                f"en {time.perf_counter() - start_time:.2f} s")
+    return pd.DataFrame(result, index=df.index)
+
+def iter_customer_features(chunk_size: int = STREAMING_CHUNK_SIZE,
+                           window: int = CUSTOMER_VELOCITY_WINDOW,
+                           median_window: int = CUSTOMER_MEDIAN_WINDOW) -> Iterator[pd.DataFrame]:
+    """
+    Parcourt la table triée par (client, step) et produit les variables bloc
+    par bloc (colonne `id` + variables) ; les lignes du dernier client d'un
+    bloc sont reportées au bloc suivant pour que chaque client soit complet
+    """
+    conn = get_db_connection()
+    carry = None
+    for chunk in pd.read_sql_query(SORTED_QUERY, conn, chunksize=chunk_size):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        last_customer = chunk['customer'].iloc[-1]
+        complete = chunk['customer'].to_numpy() != last_customer
+        carry = chunk[~complete]
+        if complete.any():
+            yield _chunk_features(chunk[complete], window, median_window)
+    if carry is not None and len(carry):
+        yield _chunk_features(carry, window, median_window)
+
+def _chunk_features(chunk: pd.DataFrame, window: int, median_window: int) -> pd.DataFrame:
+    features = sorted_features(_codes(chunk['customer']), _codes(chunk['merchant']),
+                               _codes(chunk['category']), chunk['step'].to_numpy(),
+                               chunk['amount'].to_numpy(dtype=float), window, median_window)
+    return pd.DataFrame({'id': chunk['id'].to_numpy(dtype=np.int64), **features})
+
+def save_customer_features(chunk_size: int = STREAMING_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Calcule les variables de toute la table en mémoire bornée et les écrit
+    dans le cache colonnaire (triées par id)
+
+    Les colonnes sont des fichiers .npy préalloués et mappés en mémoire :
+    chaque bloc produit par iter_customer_features() y est écrit directement
+    à la position de ses ids, sans jamais assembler toute la table.
+
+    Returns:
+        Les variables relues depuis le cache (colonnes mappées en mémoire)
+    """
+    start_time = time.perf_counter()
+    conn = get_db_connection()
+    fingerprint = database_fingerprint(conn)
+    rows = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    target = CACHE_DIR / FEATURES_CACHE_NAME
+    tmp_dir = target.with_name(target.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    dtypes = {'id': np.int64, **FEATURE_DTYPES}
+    entries = [{'name': name, 'file': f"{position:03d}.npy", 'dtype': np.dtype(dtype).name, 'encoding': 'plain'}
+               for position, (name, dtype) in enumerate(dtypes.items())]
+    columns = {entry['name']: np.lib.format.open_memmap(tmp_dir / entry['file'], mode='w+',
+                                                        dtype=dtypes[entry['name']], shape=(rows,))
+               for entry in entries}
+
+    # Ids triés d'abord : ils donnent la position de chaque ligne des blocs
+    written = 0
+    for chunk in pd.read_sql_query("SELECT id FROM transactions ORDER BY id", conn, chunksize=chunk_size):
+        columns['id'][written:written + len(chunk)] = chunk['id'].to_numpy()
+        written += len(chunk)
+    for features in iter_customer_features(chunk_size):
+        positions = np.searchsorted(columns['id'], features['id'].to_numpy())
+        for name in FEATURE_DTYPES:
+            columns[name][positions] = features[name].to_numpy()
+    for values in columns.values():
+        values.flush()
+    del columns
+
+    # Le manifeste est écrit en dernier : un cache incomplet n'est jamais lu
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'fingerprint': fingerprint,
+        'rows': rows,
+        'columns': entries,
+        'index_file': None
+    }
+    with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(target, ignore_errors=True)
+    tmp_dir.rename(target)
+    logger.info(f"Variables comportementales de {rows} transactions écrites "
+                f"en {time.perf_counter() - start_time:.2f} s")
+    return load_frame(fingerprint, FEATURES_CACHE_NAME)
+
+def load_customer_features(use_cache: bool = FRAME_CACHE_ENABLED) -> Optional[pd.DataFrame]:
+    """
+    Variables de toute la table (colonne `id`), relues depuis le cache
+    colonnaire tant que la base n'a pas changé, recalculées sinon
+    """
+    if use_cache:
+        features = load_frame(database_fingerprint(get_db_connection()), FEATURES_CACHE_NAME)
+        if features is not None:
+            return features
+    return save_customer_features()
+
+@traced
+def behaviour_fraud_rates(features: pd.DataFrame, fraud: pd.Series) -> pd.DataFrame:
+    """
+    Taux de fraude selon les variables comportementales (nouveau commerçant,
+    nouvelle catégorie, tranches de vélocité et de montant relatif)
+    """
+    data = features.assign(fraud=np.asarray(fraud))
+    groups = {
+        'new_merchant': data['new_merchant'],
+        'new_category': data['new_category'],
+        'velocity': pd.cut(data['velocity'], [0, 1, 3, 7, 15, np.inf]),
+        'amount_to_median': pd.cut(data['amount_to_median'], [0, 0.5, 1, 2, 5, 10, np.inf],
+                                   include_lowest=True)
+    }
+    rates = []
+    for name, values in groups.items():
+        stats = data.groupby(values, observed=True, sort=True)['fraud'].agg(['size', 'sum'])
+        rates.append(pd.DataFrame({
+            'variable': name,
+            'modalite': stats.index.astype(str),
+            'transactions': stats['size'].to_numpy(),
+            'fraudes': stats['sum'].to_numpy(),
+            'taux_fraude': (stats['sum'] / stats['size'] * 100).round(2).to_numpy()
+        }))
+    return pd.concat(rates, ignore_index=True)
+
+if __name__ == '__main__':
+    setup_logging()
+    features = save_customer_features()
+    print(features.describe().T)
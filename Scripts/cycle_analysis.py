@@ -2,40 +2,116 @@
 Analyse des cycles dans les transactions
 """
 
-import sqlite3
-from pathlib import Path
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
-from scipy.signal import find_peaks
-import seaborn as sns
+from typing import List
+from config import CYCLE_PERIOD, CYCLE_PROFILE_DIMENSIONS, FIGURES_DIR, RESULTS_DIR
+from context import AnalysisContext, ensure_context, report_source
+from figures import FigureJob, render_figures
+from instrumentation import traced
+from periodicity import (
+    autocorrelation, autocorrelation_period, day_names, dominant_periods,
+    periodicity_profiles, series_matrix, weekday_profile
+)
 
-# Configuration
-DB_PATH = Path(__file__).parent.parent / 'SQLite' / 'bankdata.db'
-RESULTS_DIR = Path(__file__).parent.parent / 'Results'
-FIGURES_DIR = RESULTS_DIR / 'Figures'
-FIGURES_DIR.mkdir(parents=True, exist_ok=True)
-
-def get_daily_transactions():
+@traced
+def get_daily_transactions(ctx: AnalysisContext = None):
     """Récupère le nombre de transactions par jour"""
-    query = """
-    SELECT 
-        step,
-        COUNT(*) as nb_transactions,
-        SUM(fraud) as nb_fraudes,
-        ROUND(AVG(amount), 2) as montant_moyen
-    FROM transactions
-    GROUP BY step
-    ORDER BY step;
+    daily = report_source(ctx).rollup('step').reset_index()
+    return pd.DataFrame({
+        'step': daily['step'],
+        'nb_transactions': daily['transactions'],
+        'nb_fraudes': daily['fraud_count'],
+        'montant_moyen': daily['amount_mean'].round(2)
+    })
+
+def analyze_cycles(ctx: AnalysisContext = None, figures: List[FigureJob] = None):
+    """
+    Analyse et visualise les cycles dans les transactions
+    
+    L'autocorrélation, les périodes dominantes et le profil par jour de la
+    semaine sont calculés par le moteur de périodicité (voir periodicity).
+    Si une liste `figures` est fournie, la figure y est ajoutée pour être
+    rendue plus tard avec les autres ; sinon elle est rendue immédiatement.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query(query, conn)
+    from scipy.signal import find_peaks
 
-def analyze_cycles():
-    """Analyse et visualise les cycles dans les transactions"""
     # Récupération des données
-    daily_data = get_daily_transactions()
+    daily_data = get_daily_transactions(ctx)
+    x = daily_data['nb_transactions'].values
+    
+    # Détection des pics
+    peaks, _ = find_peaks(x, distance=5, prominence=100)
+    
+    # Calculer la distance moyenne entre les pics
+    peak_distances = np.diff(peaks)
+    mean_distance = np.mean(peak_distances)
+    std_distance = np.std(peak_distances)
+    
+    # Périodicité de la série (un point par step)
+    series = daily_data.set_index('step')['nb_transactions']
+    steps = np.arange(series.index.min(), series.index.max() + 1)
+    series = series.reindex(steps, fill_value=0).to_numpy()
+    acf = autocorrelation(series)
+    periods, shares = dominant_periods(series)
+    
+    # Moyenne et écart-type par jour de la semaine
+    day_mean, day_std = weekday_profile(series, steps)
+    weekly_stats = pd.DataFrame({'day_name': day_names(), 'mean': day_mean, 'std': day_std})
+    weekly_stats = weekly_stats.sort_values('mean', ascending=False)
+    
+    # Figure (rendue dans un processus dédié)
+    job = FigureJob('cycle_analysis', plot_cycles,
+                    {'daily': daily_data[['step', 'nb_transactions']], 'peaks': peaks,
+                     'mean_distance': mean_distance, 'std_distance': std_distance,
+                     'weekly_stats': weekly_stats, 'acf': acf[:31]},
+                    FIGURES_DIR / 'cycle_analysis.png', dpi=300, bbox_inches='tight')
+    if figures is not None:
+        figures.append(job)
+    else:
+        render_figures([job])
+    
+    # Calcul des statistiques sur les cycles
+    stats = {
+        'distance_moyenne_pics': mean_distance,
+        'ecart_type_distance': std_distance,
+        'jour_plus_actif': weekly_stats.iloc[0]['day_name'],
+        'jour_moins_actif': weekly_stats.iloc[-1]['day_name'],
+        'variation_hebdomadaire': (weekly_stats['mean'].max() - weekly_stats['mean'].min()) / weekly_stats['mean'].min() * 100,
+        'periode_dominante': periods[0],
+        'part_puissance_periode_dominante': shares[0],
+        'periode_autocorrelation': autocorrelation_period(acf),
+        f'autocorrelation_lag_{CYCLE_PERIOD}': acf[CYCLE_PERIOD] if len(acf) > CYCLE_PERIOD else np.nan
+    }
+    
+    # Sauvegarde des statistiques
+    pd.Series(stats).to_csv(RESULTS_DIR / 'cycle_stats.csv')
+    
+    return stats
+
+@traced
+def analyze_cycle_profiles(ctx: AnalysisContext = None, by: str = 'merchant') -> pd.DataFrame:
+    """
+    Profils de périodicité de toutes les séries journalières d'une dimension
+    (une par catégorie ou par commerçant), calculés en un seul lot
+    
+    Returns:
+        DataFrame (une ligne par modalité) des périodes dominantes, de
+        l'autocorrélation hebdomadaire et des indices par jour de la semaine
+    """
+    matrix = series_matrix(ensure_context(ctx).rollup([by, 'step']), by)
+    profiles = periodicity_profiles(matrix).sort_values('transactions', ascending=False)
+    profiles.to_csv(RESULTS_DIR / f'cycle_profiles_{by}.csv')
+    return profiles
+
+def plot_cycles(data: dict):
+    """Trace la série avec ses pics, l'autocorrélation et le profil hebdomadaire"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    daily_data = data['daily']
+    peaks = data['peaks']
+    weekly_stats = data['weekly_stats']
     
     # Configuration de la figure
     plt.style.use('default')
@@ -47,47 +123,34 @@ def analyze_cycles():
     ax1 = fig.add_subplot(gs[0, :])
     x = daily_data['nb_transactions'].values
     
-    # Détection des pics
-    peaks, _ = find_peaks(x, distance=5, prominence=100)
-    
     # Tracer la série et les pics
     ax1.plot(daily_data['step'], x, label='Transactions')
     ax1.plot(daily_data['step'].iloc[peaks], x[peaks], "x", color='red',
              label='Pics détectés', markersize=10)
     
-    # Calculer et afficher la distance moyenne entre les pics
-    peak_distances = np.diff(peaks)
-    mean_distance = np.mean(peak_distances)
-    std_distance = np.std(peak_distances)
-    
     ax1.set_title(f'Série Temporelle avec Pics\n'
-                 f'Distance moyenne entre pics: {mean_distance:.1f} ± {std_distance:.1f} jours')
+                 f'Distance moyenne entre pics: {data["mean_distance"]:.1f} ± {data["std_distance"]:.1f} jours')
     ax1.set_xlabel('Jour')
     ax1.set_ylabel('Nombre de Transactions')
     ax1.legend()
     
     # 2. Autocorrélation
     ax2 = fig.add_subplot(gs[1, 0])
-    pd.plotting.autocorrelation_plot(daily_data['nb_transactions'], ax=ax2)
+    acf = data['acf']
+    ax2.bar(range(len(acf)), acf, width=0.6)
+    # Bandes de confiance à 95 % et 99 % (comme pandas.plotting.autocorrelation_plot)
+    for z, style in ((1.959963984540054, '--'), (2.5758293035489004, '-')):
+        bound = z / np.sqrt(len(daily_data))
+        ax2.axhline(bound, linestyle=style, color='grey')
+        ax2.axhline(-bound, linestyle=style, color='grey')
+    ax2.axhline(0, color='black')
     ax2.set_title('Autocorrélation des Transactions')
-    ax2.set_xlim(0, 30)  # Focus sur les 30 premiers lags
+    ax2.set_xlabel('Décalage (jours)')
+    ax2.set_ylabel('Autocorrélation')
+    ax2.set_xlim(-0.5, len(acf) - 0.5)  # Focus sur les 30 premiers lags
     
-    # 3. Analyse par jour de la semaine
+    # 3. Moyenne par jour de la semaine, avec barres d'erreur
     ax3 = fig.add_subplot(gs[1, 1])
-    daily_data['day_of_week'] = daily_data['step'] % 7
-    day_mapping = {
-        0: 'Lundi', 1: 'Mardi', 2: 'Mercredi', 3: 'Jeudi',
-        4: 'Vendredi', 5: 'Samedi', 6: 'Dimanche'
-    }
-    daily_data['day_name'] = daily_data['day_of_week'].map(day_mapping)
-    
-    # Calculer les statistiques par jour
-    weekly_stats = daily_data.groupby('day_name')['nb_transactions'].agg([
-        'mean', 'std'
-    ]).reset_index()
-    weekly_stats = weekly_stats.sort_values('mean', ascending=False)
-    
-    # Tracer le graphique avec barres d'erreur
     ax3.bar(range(7), weekly_stats['mean'], yerr=weekly_stats['std'],
             capsize=5, alpha=0.8)
     ax3.set_xticks(range(7))
@@ -99,25 +162,12 @@ def analyze_cycles():
     plt.suptitle('Analyse des Cycles dans les Transactions', fontsize=16, y=0.95)
     plt.tight_layout()
     
-    # Sauvegarde
-    plt.savefig(FIGURES_DIR / 'cycle_analysis.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    # Calcul des statistiques sur les cycles
-    stats = {
-        'distance_moyenne_pics': mean_distance,
-        'ecart_type_distance': std_distance,
-        'jour_plus_actif': weekly_stats.iloc[0]['day_name'],
-        'jour_moins_actif': weekly_stats.iloc[-1]['day_name'],
-        'variation_hebdomadaire': (weekly_stats['mean'].max() - weekly_stats['mean'].min()) / weekly_stats['mean'].min() * 100
-    }
-    
-    # Sauvegarde des statistiques
-    pd.Series(stats).to_csv(RESULTS_DIR / 'cycle_stats.csv')
-    
-    return stats
+    return fig
 
 if __name__ == '__main__':
+    from utils import setup_logging
+
+    setup_logging()
     stats = analyze_cycles()
     print("\nStatistiques des cycles :")
     for key, value in stats.items():
@@ -125,3 +175,8 @@ if __name__ == '__main__':
             print(f"{key}: {value:.2f}")
         else:
             print(f"{key}: {value}")
+    
+    for dimension in CYCLE_PROFILE_DIMENSIONS:
+        profiles = analyze_cycle_profiles(by=dimension)
+        print(f"\nProfils de périodicité par {dimension} ({len(profiles)} séries) :")
+        print(profiles[['transactions', 'periode_1', 'part_puissance_1', 'jour_plus_actif']].head(10))
@@ -0,0 +1,173 @@
+"""
+Cube de données pré-agrégé utilisé par tous les rapports groupés
+
+Le cube est construit en une passe vectorisée sur les transactions : une
+cellule par combinaison (step, catégorie, commerçant, âge, genre, tranche de
+montant) avec le nombre de transactions, la somme et la somme des carrés des
+montants et le nombre de fraudes. Les rapports agrègent ensuite les cellules
+(roll-up), si bien que leur coût dépend du nombre de cellules et non du
+nombre de transactions.
+
+Les montants sont cumulés en centimes entiers : la fusion de cubes est exacte
+et ne dépend pas de l'ordre de lecture des lignes.
+"""
+
+import logging
+from typing import Iterable, List, Union
+import numpy as np
+import pandas as pd
+
+from config import AMOUNT_BINS, AMOUNT_LABELS
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ['step', 'category', 'merchant', 'age', 'gender', 'amount_bucket']
+TEXT_DIMENSIONS = ['category', 'merchant', 'age', 'gender']
+MEASURES = ['transactions', 'amount_cents', 'amount_sq_cents', 'fraud_count']
+
+# Tranches de montant (bornes supérieures incluses) : la tranche 0 isole les
+# montants nuls, exclus par pd.cut dans fraud_analysis mais comptés dans la
+# tranche '0-100' de descriptive_analysis ; la tranche i correspond ensuite
+# à AMOUNT_LABELS[i - 1].
+BUCKET_EDGES = np.array(AMOUNT_BINS[:-1], dtype=float)
+
+def bucket_label(bucket: int) -> str:
+    """
+    Libellé (config.AMOUNT_LABELS) d'une tranche de montant du cube
+    """
+    return AMOUNT_LABELS[max(bucket, 1) - 1]
+
+def _normalize(cells: pd.DataFrame) -> pd.DataFrame:
+    """
+    Types canoniques des cellules (dimensions textuelles en catégories triées)
+    """
+    cells = cells.astype({'step': np.int64, 'amount_bucket': np.int8,
+                          **{measure: np.int64 for measure in MEASURES}})
+    for dim in TEXT_DIMENSIONS:
+        cells[dim] = cells[dim].astype(str).astype('category')
+    return cells[DIMENSIONS + MEASURES].reset_index(drop=True)
+
+class DataCube:
+    """
+    Cellules agrégées et ensemble des clients distincts
+    """
+
+    def __init__(self, cells: pd.DataFrame, customers: np.ndarray):
+        self.cells = cells
+        self.customers = customers
+
+    @classmethod
+    def empty(cls) -> 'DataCube':
+        cells = pd.DataFrame({col: pd.Series(dtype=object) for col in DIMENSIONS + MEASURES})
+        return cls(_normalize(cells), np.array([], dtype=object))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'DataCube':
+        """
+        Construit le cube à partir de transactions nettoyées (une passe vectorisée)
+        """
+        if 'amount_cents' in df.columns:
+            # Schéma compact (data_loader.compact_frame) : centimes exacts
+            cents = df['amount_cents'].to_numpy(dtype=np.int64)
+            amount = cents / 100
+        else:
+            amount = df['amount'].to_numpy(dtype=float)
+            cents = np.rint(amount * 100).astype(np.int64)
+            if not np.allclose(cents / 100, amount):
+                logger.warning("Montants avec plus de deux décimales : arrondis au centime dans le cube")
+
+        work = pd.DataFrame({dim: df[dim].array for dim in DIMENSIONS[:-1]})
+        work['amount_bucket'] = np.searchsorted(BUCKET_EDGES, amount, side='left').astype(np.int8)
+        work['amount_cents'] = cents
+        work['amount_sq_cents'] = cents * cents
+        work['fraud_count'] = df['fraud'].to_numpy(dtype=np.int64)
+
+        grouped = work.groupby(DIMENSIONS, observed=True, sort=False)
+        cells = grouped[MEASURES[1:]].sum()
+        cells.insert(0, 'transactions', grouped.size())
+
+        customers = np.asarray(pd.unique(df['customer']), dtype=object).astype(str).astype(object)
+        cube = cls(_normalize(cells.reset_index()), np.sort(customers))
+        logger.debug(f"Cube construit: {len(df)} transactions, {len(cube.cells)} cellules")
+        return cube
+
+    @classmethod
+    def merge(cls, cubes: Iterable['DataCube']) -> 'DataCube':
+        """
+        Fusionne plusieurs cubes en additionnant les mesures des cellules communes
+        """
+        cubes = [cube for cube in cubes if len(cube.cells)]
+        if not cubes:
+            return cls.empty()
+        if len(cubes) == 1:
+            return cubes[0]
+        combined = pd.concat([cube.cells.astype({dim: str for dim in TEXT_DIMENSIONS}) for cube in cubes],
+                             ignore_index=True)
+        cells = combined.groupby(DIMENSIONS, sort=False)[MEASURES].sum().reset_index()
+        customers = np.unique(np.concatenate([cube.customers for cube in cubes]).astype(str)).astype(object)
+        return cls(_normalize(cells), customers)
+
+    def rollup(self, by: Union[str, List[str]]) -> pd.DataFrame:
+        """
+        Agrège les cellules selon les dimensions demandées
+
+        Returns:
+            DataFrame indexé par `by` (trié) avec transactions, amount_sum,
+            amount_mean, amount_std, fraud_count et fraud_mean
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        grouped = self.cells.groupby(by, observed=True)[MEASURES].sum()
+        n = grouped['transactions']
+
+        # Variance calculée en entiers Python (exacte) sur les lignes agrégées
+        n_int = n.to_numpy(dtype=object)
+        s_int = grouped['amount_cents'].to_numpy(dtype=object)
+        sq_int = grouped['amount_sq_cents'].to_numpy(dtype=object)
+        numerator = (n_int * sq_int - s_int * s_int).astype(float)
+        denominator = (n_int * (n_int - 1)).astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.where(denominator > 0, numerator / denominator, np.nan)
+
+        return pd.DataFrame({
+            'transactions': n,
+            'amount_sum': grouped['amount_cents'] / 100,
+            'amount_mean': grouped['amount_cents'] / n / 100,
+            'amount_std': np.sqrt(variance) / 100,
+            'fraud_count': grouped['fraud_count'],
+            'fraud_mean': grouped['fraud_count'] / n
+        }, index=grouped.index)
+
+    @property
+    def total_transactions(self) -> int:
+        return int(self.cells['transactions'].sum())
+
+    @property
+    def total_frauds(self) -> int:
+        return int(self.cells['fraud_count'].sum())
+
+    @property
+    def total_amount(self) -> float:
+        return int(self.cells['amount_cents'].sum()) / 100
+
+    def data_info(self) -> dict:
+        """
+        Informations de base sur le dataset (mêmes clés que data_loader.get_data_info)
+        """
+        total = self.total_transactions
+        fraud_count = self.total_frauds
+        return {
+            'total_transactions': total,
+            'unique_customers': len(self.customers),
+            'unique_merchants': int((self.rollup('merchant')['transactions'] > 0).sum()),
+            'total_amount': self.total_amount,
+            'fraud_count': fraud_count,
+            'fraud_rate': round(fraud_count * 100.0 / total, 2) if total else 0.0
+        }
+
+def as_cube(data: Union[pd.DataFrame, DataCube]) -> DataCube:
+    """
+    Retourne le cube fourni, ou le construit à partir d'un DataFrame de transactions
+    """
+    if isinstance(data, DataCube):
+        return data
+    return DataCube.from_frame(data)
@@ -5,93 +5,230 @@ Chargement et préparation des données depuis SQLite
 import pandas as pd
 import numpy as np
 import sqlite3
-from typing import Tuple
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 import logging
-from config import DB_PATH, EXPECTED_COLUMNS
+from config import (
+    ANALYSIS_QUERIES_SQL, COMPACT_AMOUNT_CENTS, COMPACT_SCHEMA, DB_PATH, EXPECTED_COLUMNS,
+    FRAME_CACHE_ENABLED, QUERY_CACHE_ENABLED, STREAMING_ENABLED, STREAMING_CHUNK_SIZE, STREAMING_DTYPES
+)
+from db_pool import close_pools, get_pool
+from frame_cache import database_fingerprint, load_frame, save_frame
+from instrumentation import sql_span, traced
+from query_cache import cached_query
+from utils import get_peak_rss_mb
 import atexit
 
 logger = logging.getLogger(__name__)
 
-# Variable globale pour la connexion
-_connection = None
-
 def get_db_connection():
     """
-    Établit une connexion à la base de données SQLite
+    Connexion SQLite en lecture seule du thread courant, issue du pool
+    partagé (voir db_pool)
     """
-    global _connection
-    
-    if _connection is None:
-        logger.info(f"Tentative de connexion à la base de données: {DB_PATH}")
-        try:
-            _connection = sqlite3.connect(DB_PATH)
-            # Configuration de la connexion
-            _connection.execute("PRAGMA journal_mode=WAL")  # Write-Ahead Logging
-            _connection.execute("PRAGMA synchronous=NORMAL")  # Meilleur compromis performance/sécurité
-            
-            # Vérifier que la connexion fonctionne
-            cursor = _connection.cursor()
-            cursor.execute("SELECT COUNT(*) FROM transactions")
-            count = cursor.fetchone()[0]
-            logger.info(f"Connexion réussie. Nombre de transactions: {count}")
-        except Exception as e:
-            logger.error(f"Erreur de connexion à la base de données: {str(e)}")
-            raise
-    
-    return _connection
+    try:
+        return get_pool(DB_PATH).get_connection()
+    except Exception as e:
+        logger.error(f"Erreur de connexion à la base de données: {str(e)}")
+        raise
 
 def close_connection():
     """
-    Ferme proprement la connexion à la base de données
+    Ferme proprement les connexions à la base de données
     """
-    global _connection
-    if _connection is not None:
-        logger.info("Fermeture de la connexion à la base de données")
-        try:
-            _connection.close()
-            _connection = None
-        except Exception as e:
-            logger.error(f"Erreur lors de la fermeture de la connexion: {str(e)}")
+    close_pools()
 
-# S'assurer que la connexion est fermée à la fin du programme
+# S'assurer que les connexions sont fermées à la fin du programme
 atexit.register(close_connection)
 
-def load_data() -> pd.DataFrame:
+def load_data(use_cache: bool = FRAME_CACHE_ENABLED, streaming: bool = STREAMING_ENABLED,
+              chunk_size: int = STREAMING_CHUNK_SIZE, compact: bool = COMPACT_SCHEMA,
+              amount_cents: bool = COMPACT_AMOUNT_CENTS, columns: Optional[List[str]] = None) -> pd.DataFrame:
     """
     Charge les données depuis la base SQLite
     
+    Args:
+        use_cache: relit le DataFrame nettoyé depuis le cache colonnaire
+            lorsque la base n'a pas changé depuis son écriture
+        streaming: lit la table par blocs et construit directement les
+            colonnes typées (voir read_transactions_chunked)
+        chunk_size: nombre de lignes par bloc en mode streaming
+        compact: applique le schéma compact (voir compact_frame)
+        amount_cents: avec compact, stocke les montants en centimes (int32)
+        columns: colonnes à charger (toutes par défaut) ; 'step' et 'amount',
+            dont dépendent les lignes conservées par le nettoyage, sont
+            toujours chargées. Un chargement partiel relit le cache complet
+            s'il existe mais n'y est pas écrit
+    
     Returns:
         DataFrame contenant les données nettoyées
     """
     logger.info("Chargement des données depuis SQLite")
+    start_time = time.perf_counter()
+    cache_name = 'transactions_streaming' if streaming else 'transactions'
+    if compact:
+        cache_name += '_cents' if amount_cents else '_compact'
+    if columns is not None:
+        columns = [col for col in EXPECTED_COLUMNS if col in {'step', 'amount', *columns}]
+        if len(columns) == len(EXPECTED_COLUMNS):
+            columns = None
     
     try:
-        query = """
-        SELECT step, customer, age, gender, merchant, category,
-               amount, fraud
-        FROM transactions
-        """
-        
         conn = get_db_connection()
-        logger.info("Exécution de la requête SQL")
-        df = pd.read_sql_query(query, conn)
-        logger.info(f"Données chargées avec succès: {len(df)} lignes")
         
-        # Vérification des colonnes
-        missing_cols = set(EXPECTED_COLUMNS) - set(df.columns)
-        if missing_cols:
-            raise ValueError(f"Colonnes manquantes dans le dataset: {missing_cols}")
+        if use_cache:
+            fingerprint = database_fingerprint(conn)
+            df = load_frame(fingerprint, cache_name,
+                            None if columns is None else columns + ['amount_cents'])
+            if df is not None:
+                logger.info(f"Chargement à chaud depuis le cache colonnaire: {len(df)} lignes "
+                            f"en {time.perf_counter() - start_time:.2f} secondes")
+                logger.info(f"Pic de mémoire (RSS) après chargement: {get_peak_rss_mb():.0f} Mo")
+                return df
+        
+        if streaming:
+            df = read_transactions_chunked(conn, chunk_size)
+            if columns is not None:
+                df = df[columns]
+        else:
+            query = """
+            SELECT step, customer, age, gender, merchant, category,
+                   amount, fraud
+            FROM transactions
+            """
+            if columns is not None:
+                query = f"SELECT {', '.join(columns)} FROM transactions"
+            
+            logger.info("Exécution de la requête SQL")
+            with sql_span(query) as query_span:
+                df = pd.read_sql_query(query, conn)
+                query_span.set(rows=len(df))
+            logger.info(f"Données chargées avec succès: {len(df)} lignes")
+            
+            # Vérification des colonnes
+            missing_cols = set(columns or EXPECTED_COLUMNS) - set(df.columns)
+            if missing_cols:
+                raise ValueError(f"Colonnes manquantes dans le dataset: {missing_cols}")
+            
+            # Nettoyage des données
+            df = clean_data(df)
         
-        # Nettoyage des données
-        df = clean_data(df)
+        if compact:
+            df = compact_frame(df, amount_cents)
         
         logger.info(f"Données chargées et nettoyées avec succès: {len(df)} lignes")
+        logger.info(f"Chargement à froid depuis SQLite en {time.perf_counter() - start_time:.2f} secondes")
+        logger.info(f"Pic de mémoire (RSS) après chargement: {get_peak_rss_mb():.0f} Mo")
+        
+        if use_cache and columns is None:
+            save_frame(df, fingerprint, cache_name)
+        
         return df
     
     except Exception as e:
         logger.error(f"Erreur lors du chargement des données: {str(e)}")
         raise
 
+@traced
+def read_transactions_chunked(conn: sqlite3.Connection,
+                              chunk_size: int = STREAMING_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Lit la table transactions par blocs via le curseur
+    
+    Les colonnes numériques sont écrites au fur et à mesure dans des tableaux
+    pré-alloués aux types de STREAMING_DTYPES, et les colonnes textuelles
+    sont encodées en codes de catégories bloc par bloc : seul le bloc courant
+    existe sous forme d'objets Python. Le résultat est équivalent à
+    clean_data() appliqué à la table complète, avec `age` en catégorie.
+    """
+    text_columns = [col for col in EXPECTED_COLUMNS if col not in STREAMING_DTYPES]
+    cursor = conn.cursor()
+    
+    # Comptage et lecture dans la même transaction : instantané cohérent
+    cursor.execute("BEGIN")
+    try:
+        expected_rows = cursor.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        numeric = {col: np.empty(expected_rows, dtype=STREAMING_DTYPES[col])
+                   for col in STREAMING_DTYPES}
+        codes = {col: np.empty(expected_rows, dtype=np.int32) for col in text_columns}
+        lookups = {col: {} for col in text_columns}
+        valid = np.ones(expected_rows, dtype=bool)
+        
+        cursor.execute(f"SELECT {', '.join(EXPECTED_COLUMNS)} FROM transactions")
+        filled = 0
+        n_chunks = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            block = slice(filled, filled + len(rows))
+            
+            for col, values in zip(EXPECTED_COLUMNS, zip(*rows)):
+                values = np.array(values, dtype=object)
+                if col in text_columns:
+                    # Codes locaux au bloc, puis traduction vers les codes globaux
+                    chunk_codes, uniques = pd.factorize(values)
+                    lookup = lookups[col]
+                    mapping = np.array([lookup.setdefault(value, len(lookup)) for value in uniques]
+                                       + [-1], dtype=np.int32)
+                    codes[col][block] = mapping[chunk_codes]
+                elif col == 'fraud':
+                    numeric[col][block] = values.astype(int)
+                else:
+                    converted = pd.to_numeric(values, errors='coerce').astype(float)
+                    missing = np.isnan(converted)
+                    valid[block] &= ~missing
+                    numeric[col][block] = np.where(missing, 0, converted)
+            
+            filled += len(rows)
+            n_chunks += 1
+            logger.debug(f"Bloc {n_chunks} lu ({filled}/{expected_rows} lignes)")
+    finally:
+        conn.rollback()
+    
+    logger.info(f"Données lues par blocs: {filled} lignes en {n_chunks} blocs de {chunk_size}")
+    
+    data = {}
+    for col in EXPECTED_COLUMNS:
+        if col in numeric:
+            data[col] = numeric[col][:filled]
+            continue
+        # Catégories triées, comme avec astype('category')
+        categories = np.array(list(lookups[col]), dtype=object)
+        order = np.argsort(categories)
+        remap = np.empty(len(order) + 1, dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        remap[-1] = -1
+        data[col] = pd.Categorical.from_codes(remap[codes[col][:filled]],
+                                              categories=categories[order].tolist())
+    
+    df = pd.DataFrame(data)
+    
+    # Suppression des lignes sans montant ou sans step, comme clean_data()
+    if not valid[:filled].all():
+        df = df[valid[:filled]]
+    
+    return df
+
+def iter_rows_after(last_id: int = 0, chunk_size: int = STREAMING_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Parcourt par blocs les transactions d'id strictement supérieur à last_id
+    (utilisé par les rafraîchissements incrémentaux). Chaque bloc est nettoyé
+    par clean_data et conserve la colonne `id`.
+    """
+    query = """
+    SELECT id, step, customer, age, gender, merchant, category,
+           amount, fraud
+    FROM transactions
+    WHERE id > ?
+    ORDER BY id
+    """
+    conn = get_db_connection()
+    for chunk in pd.read_sql_query(query, conn, params=(last_id,), chunksize=chunk_size):
+        yield clean_data(chunk)
+
+@traced
 def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Nettoie et prépare les données
@@ -102,7 +239,8 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     # Conversion des types
     df['step'] = pd.to_numeric(df['step'], errors='coerce')
     df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
-    df['fraud'] = df['fraud'].astype(int)
+    if 'fraud' in df.columns:
+        df['fraud'] = df['fraud'].astype(int)
     
     # Nettoyage des valeurs manquantes
     df = df.dropna(subset=['amount', 'step'])
@@ -115,57 +253,144 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
+def _smallest_int_dtype(values: pd.Series, candidates=(np.int8, np.int16, np.int32)) -> np.dtype:
+    """
+    Plus petit type entier contenant toutes les valeurs de la colonne
+    """
+    low, high = (values.min(), values.max()) if len(values) else (0, 0)
+    for dtype in candidates:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+@traced
+def compact_frame(df: pd.DataFrame, amount_cents: bool = COMPACT_AMOUNT_CENTS) -> pd.DataFrame:
+    """
+    Applique le schéma compact à un DataFrame nettoyé
+    
+    'fraud' passe en int8, 'step' dans le plus petit entier qui le contient
+    (int16 pour BankSim), 'age' en catégorie ordonnée. Avec amount_cents,
+    'amount' est remplacé par 'amount_cents' (int32) si tous les montants ont
+    au plus deux décimales et tiennent sur 32 bits ; utils.with_amount
+    reconstruit alors les montants en euros à l'identique.
+    Les occupations mémoire avant/après sont journalisées par colonne.
+    """
+    before = df.memory_usage(index=False, deep=True)
+    df = df.copy()
+    
+    if 'fraud' in df.columns:
+        df['fraud'] = df['fraud'].astype(np.int8)
+    df['step'] = df['step'].astype(_smallest_int_dtype(df['step'], (np.int16, np.int32)))
+    if 'age' in df.columns and (not isinstance(df['age'].dtype, pd.CategoricalDtype) or not df['age'].cat.ordered):
+        ages = df['age'].astype(str)
+        df['age'] = pd.Categorical(ages, categories=sorted(ages.unique()), ordered=True)
+    
+    if amount_cents:
+        amount = df['amount'].to_numpy(dtype=float)
+        cents = np.rint(amount * 100)
+        exact = np.array_equal(cents / 100, amount)
+        fits = len(cents) == 0 or np.abs(cents).max() <= np.iinfo(np.int32).max
+        if exact and fits:
+            position = df.columns.get_loc('amount')
+            df = df.drop(columns='amount')
+            df.insert(position, 'amount_cents', cents.astype(np.int32))
+        else:
+            logger.warning("Montants non représentables en centimes sur 32 bits : 'amount' conservé en float64")
+    
+    after = df.memory_usage(index=False, deep=True)
+    log_memory_report(before, after)
+    return df
+
+def log_memory_report(before: pd.Series, after: pd.Series) -> pd.DataFrame:
+    """
+    Journalise l'occupation mémoire par colonne (octets) avant et après compactage
+    
+    Returns:
+        DataFrame (une ligne par colonne) avec type, octets avant et après
+    """
+    # 'amount_cents' remplace 'amount' : même ligne du rapport
+    after = after.rename({'amount_cents': 'amount'})
+    report = pd.DataFrame({'avant': before, 'apres': after}).fillna(0).astype(np.int64)
+    report.loc['total'] = report.sum()
+    lines = '\n'.join(f"  {col:<10} {row['avant']:>14,} o -> {row['apres']:>14,} o"
+                      for col, row in report.iterrows())
+    ratio = report.loc['total', 'apres'] / report.loc['total', 'avant'] if report.loc['total', 'avant'] else 1
+    logger.info(f"Occupation mémoire du DataFrame (schéma compact, {ratio:.0%} de l'original) :\n{lines}")
+    return report
+
 def get_data_info() -> dict:
     """
     Retourne des informations de base sur le dataset
+    
+    Les indicateurs sont calculés en une seule requête et réutilisés tant que
+    la base n'a pas changé (voir dataset_summary.get_dataset_summary).
     """
+    # Import local : dataset_summary dépend de ce module
+    from dataset_summary import get_dataset_summary
+    
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Statistiques générales
-        stats = {}
-        
-        # Nombre total de transactions
-        cursor.execute("SELECT COUNT(*) FROM transactions")
-        stats['total_transactions'] = cursor.fetchone()[0]
-        
-        # Nombre de clients uniques
-        cursor.execute("SELECT COUNT(DISTINCT customer) FROM transactions")
-        stats['unique_customers'] = cursor.fetchone()[0]
-        
-        # Nombre de commerçants uniques
-        cursor.execute("SELECT COUNT(DISTINCT merchant) FROM transactions")
-        stats['unique_merchants'] = cursor.fetchone()[0]
-        
-        # Montant total
-        cursor.execute("SELECT SUM(amount) FROM transactions")
-        stats['total_amount'] = cursor.fetchone()[0]
-        
-        # Statistiques sur les fraudes
-        cursor.execute("""
-            SELECT COUNT(*) as fraud_count,
-                   (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM transactions)) as fraud_rate
-            FROM transactions
-            WHERE fraud = 1
-        """)
-        fraud_count, fraud_rate = cursor.fetchone()
-        stats['fraud_count'] = fraud_count
-        stats['fraud_rate'] = round(fraud_rate, 2)
-        
-        return stats
-        
+        return get_dataset_summary()
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des informations: {str(e)}")
         raise
 
-def execute_query(query: str) -> pd.DataFrame:
+def execute_query(query: str, use_cache: bool = QUERY_CACHE_ENABLED) -> pd.DataFrame:
     """
     Exécute une requête SQL et retourne les résultats dans un DataFrame
+    
+    Args:
+        use_cache: relit le résultat depuis le cache des requêtes tant que la
+            base n'a pas changé (voir query_cache)
     """
     try:
         conn = get_db_connection()
-        return pd.read_sql_query(query, conn)
+        if use_cache:
+            return cached_query(query, conn)
+        with sql_span(query) as query_span:
+            df = pd.read_sql_query(query, conn)
+            query_span.set(rows=len(df))
+        return df
     except Exception as e:
         logger.error(f"Erreur lors de l'exécution de la requête: {str(e)}")
         raise
+
+def read_sql_queries(sql_path: Path = ANALYSIS_QUERIES_SQL) -> List[Tuple[str, str]]:
+    """
+    Découpe un script SQL (par exemple analysis_queries.sql) en requêtes
+    
+    Les blocs de commentaires /* ... */ (résultats de référence) sont
+    ignorés ; chaque requête est nommée d'après le dernier commentaire `--`
+    qui la précède, hors lignes de séparation.
+    
+    Returns:
+        Liste de couples (titre, requête) dans l'ordre du fichier
+    """
+    text = sql_path.read_text(encoding='utf-8')
+    queries = []
+    title = None
+    lines = []
+    in_block_comment = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if in_block_comment:
+            in_block_comment = '*/' not in stripped
+            continue
+        if stripped.startswith('/*'):
+            in_block_comment = '*/' not in stripped
+            continue
+        if stripped.startswith('--'):
+            comment = stripped.lstrip('-').strip()
+            # Les commentaires à l'intérieur d'une requête ne la renomment pas
+            if comment and not lines and not set(comment) <= set('=-'):
+                title = comment.rstrip(' :')
+            continue
+        if not stripped and not lines:
+            continue
+        lines.append(line)
+        if stripped.endswith(';'):
+            queries.append((title or f"requête {len(queries) + 1}", '\n'.join(lines).rstrip(';')))
+            lines = []
+    if any(line.strip() for line in lines):
+        queries.append((title or f"requête {len(queries) + 1}", '\n'.join(lines)))
+    return queries
@@ -0,0 +1,132 @@
+"""
+Résumé du dataset : indicateurs globaux partagés par main, le dashboard KPI et le résumé final
+
+Les indicateurs (nombre de transactions, clients, commerçants et catégories
+distincts, montant total et moyen, fraudes, premier et dernier step) sont
+calculés en une seule passe : sur le cube de données lorsqu'il est déjà
+construit, sinon par une unique requête sur la table `transactions` (au lieu
+de cinq). Le résultat est mémorisé, en mémoire et dans `Cache/summary.json`,
+avec l'empreinte de la base : il est réutilisé tant que la base n'a pas changé.
+"""
+
+import json
+import logging
+from typing import Optional
+
+from config import CACHE_DIR
+from data_cube import DataCube
+from data_loader import get_db_connection
+from frame_cache import database_fingerprint
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CACHE_PATH = CACHE_DIR / 'summary.json'
+SUMMARY_VERSION = 1
+
+# Une seule requête : un parcours de la table pour les cumuls (montants en
+# centimes comme dans le cube) ; les valeurs distinctes sont comptées sur les
+# index (couvrants), plus rapides qu'un COUNT(DISTINCT) pendant le parcours
+SUMMARY_QUERY = """
+SELECT COUNT(*),
+       (SELECT COUNT(DISTINCT customer) FROM transactions),
+       (SELECT COUNT(DISTINCT merchant) FROM transactions),
+       (SELECT COUNT(DISTINCT category) FROM transactions),
+       SUM(CAST(ROUND(amount * 100) AS INTEGER)),
+       SUM(fraud = 1),
+       MIN(step),
+       MAX(step)
+FROM transactions
+"""
+
+# Dernier résumé calculé dans le processus, avec son empreinte
+_memory_cache = {}
+
+def make_summary(total: int, customers: int, merchants: int, categories: int, amount_cents: int,
+                 frauds: int, min_step, max_step) -> dict:
+    """
+    Résumé à partir des agrégats globaux (montant total en centimes)
+    """
+    total_amount = int(amount_cents or 0) / 100
+    return {
+        'total_transactions': int(total),
+        'unique_customers': int(customers),
+        'unique_merchants': int(merchants),
+        'unique_categories': int(categories),
+        'total_amount': total_amount,
+        'avg_amount': total_amount / total if total else 0.0,
+        'fraud_count': int(frauds or 0),
+        'fraud_rate': round(int(frauds or 0) * 100.0 / total, 2) if total else 0.0,
+        'min_step': None if min_step is None else int(min_step),
+        'max_step': None if max_step is None else int(max_step)
+    }
+
+def summary_from_cube(cube: DataCube) -> dict:
+    """
+    Résumé calculé sur le cube de données (roll-ups sur les cellules)
+    """
+    steps = cube.cells['step']
+    return make_summary(
+        cube.total_transactions,
+        len(cube.customers),
+        int((cube.rollup('merchant')['transactions'] > 0).sum()),
+        int((cube.rollup('category')['transactions'] > 0).sum()),
+        int(cube.cells['amount_cents'].sum()),
+        cube.total_frauds,
+        steps.min() if len(steps) else None,
+        steps.max() if len(steps) else None
+    )
+
+def summary_from_database(conn=None) -> dict:
+    """
+    Résumé calculé par une seule requête sur la table `transactions`
+    """
+    conn = conn if conn is not None else get_db_connection()
+    return make_summary(*conn.execute(SUMMARY_QUERY).fetchone())
+
+def _read_cached(fingerprint: dict) -> Optional[dict]:
+    if _memory_cache.get('fingerprint') == fingerprint:
+        return _memory_cache['summary']
+    try:
+        with open(SUMMARY_CACHE_PATH, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('version') != SUMMARY_VERSION or cached.get('fingerprint') != fingerprint:
+        return None
+    _memory_cache.update(fingerprint=fingerprint, summary=cached['summary'])
+    return cached['summary']
+
+def _write_cached(fingerprint: dict, summary: dict) -> None:
+    _memory_cache.update(fingerprint=fingerprint, summary=summary)
+    SUMMARY_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = SUMMARY_CACHE_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': SUMMARY_VERSION, 'fingerprint': fingerprint, 'summary': summary}, f, indent=1)
+    tmp_path.replace(SUMMARY_CACHE_PATH)
+
+def get_dataset_summary(cube: DataCube = None, use_cache: bool = True) -> dict:
+    """
+    Résumé du dataset, réutilisé tant que la base n'a pas changé
+
+    Args:
+        cube: cube de données construit sur toute la table, utilisé à la place
+            de la requête SQL si le résumé doit être recalculé
+        use_cache: réutilise le résumé enregistré pour la même version de la base
+
+    Returns:
+        Dict des indicateurs globaux (clés de data_loader.get_data_info, plus
+        unique_categories, avg_amount, min_step et max_step)
+    """
+    conn = get_db_connection()
+    fingerprint = database_fingerprint(conn)
+    if use_cache:
+        summary = _read_cached(fingerprint)
+        if summary is not None:
+            logger.debug("Résumé du dataset relu depuis le cache")
+            return dict(summary)
+
+    summary = summary_from_cube(cube) if cube is not None else summary_from_database(conn)
+    logger.debug(f"Résumé du dataset calculé ({'cube' if cube is not None else 'SQL'})")
+    if use_cache:
+        _write_cached(fingerprint, summary)
+    return dict(summary)
@@ -0,0 +1,205 @@
+"""
+Gestion des index de la table transactions et benchmark des requêtes de rapport
+
+La commande crée les index déclarés dans structure.sql absents de la base
+(notamment les index couvrants des requêtes de rapport), supprime les index
+devenus redondants (colonnes formant un préfixe d'un index déclaré, index
+absent de structure.sql) puis met à jour les statistiques de l'optimiseur
+(ANALYZE).
+
+Avec --benchmark, les requêtes de rapport (descriptive_analysis et
+SQLite/analysis_queries.sql) sont exécutées avec les anciens index simples,
+puis avec les index couvrants : le plan d'exécution (EXPLAIN QUERY PLAN) et
+la meilleure durée sur --repeat exécutions sont comparés.
+
+Usage :
+    python db_indexes.py [--db chemin.db] [--benchmark] [--repeat N]
+"""
+
+import argparse
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+import pandas as pd
+
+from config import DB_PATH
+from data_loader import read_sql_queries
+from descriptive_analysis import AMOUNT_QUERY, CATEGORY_QUERY, DEMOGRAPHICS_QUERY
+from ingest import read_schema
+from utils import save_results, setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Index simples de la structure d'origine, remplacés par les index couvrants
+# (recréés par --benchmark pour la mesure « avant »)
+LEGACY_INDEXES = {
+    'idx_transactions_step': "CREATE INDEX idx_transactions_step ON transactions(step)",
+    'idx_transactions_category': "CREATE INDEX idx_transactions_category ON transactions(category)"
+}
+
+def declared_indexes() -> Dict[str, str]:
+    """
+    Index déclarés dans structure.sql ({nom: instruction CREATE INDEX})
+    """
+    return read_schema()[1]
+
+def existing_indexes(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """
+    Index de la table transactions présents dans la base ({nom: colonnes}),
+    hors index internes de SQLite
+    """
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'transactions' AND sql IS NOT NULL"
+    )]
+    return {name: [row[2] for row in conn.execute(f"PRAGMA index_info({name})")] for name in names}
+
+def redundant_indexes(conn: sqlite3.Connection) -> List[str]:
+    """
+    Index absents de structure.sql dont les colonnes sont un préfixe strict
+    des colonnes d'un index déclaré (celui-ci sert les mêmes requêtes)
+    """
+    declared = declared_indexes()
+    existing = existing_indexes(conn)
+    redundant = []
+    for name, columns in existing.items():
+        if name in declared:
+            continue
+        if any(other in declared and len(other_columns) > len(columns)
+               and other_columns[:len(columns)] == columns
+               for other, other_columns in existing.items()):
+            redundant.append(name)
+    return redundant
+
+def create_indexes(conn: sqlite3.Connection, drop_redundant: bool = True) -> List[str]:
+    """
+    Crée les index de structure.sql manquants, supprime les index redondants
+    et met à jour les statistiques de l'optimiseur
+
+    Returns:
+        Noms des index créés
+    """
+    existing = existing_indexes(conn)
+    created = []
+    for name, statement in declared_indexes().items():
+        if name in existing:
+            continue
+        start = time.perf_counter()
+        conn.execute(statement)
+        created.append(name)
+        logger.info(f"Index {name} créé en {time.perf_counter() - start:.2f} s")
+
+    if drop_redundant:
+        for name in redundant_indexes(conn):
+            conn.execute(f"DROP INDEX {name}")
+            logger.info(f"Index redondant {name} supprimé")
+
+    start = time.perf_counter()
+    conn.execute("ANALYZE")
+    logger.info(f"Statistiques de l'optimiseur mises à jour (ANALYZE) en {time.perf_counter() - start:.2f} s")
+    return created
+
+def restore_legacy_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Rétablit les index de la structure d'origine (index simples, sans
+    index couvrants ni statistiques ANALYZE)
+    """
+    for name in existing_indexes(conn):
+        if name.endswith('_covering'):
+            conn.execute(f"DROP INDEX {name}")
+    for name, statement in LEGACY_INDEXES.items():
+        conn.execute(statement.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+    conn.execute("DROP TABLE IF EXISTS sqlite_stat1")
+    logger.info("Index d'origine rétablis")
+
+def report_queries() -> List[Tuple[str, str]]:
+    """
+    Requêtes mesurées : rapports SQL de descriptive_analysis et analysis_queries.sql
+    """
+    queries = [
+        ('descriptive: par catégorie', CATEGORY_QUERY),
+        ('descriptive: par tranche de montant', AMOUNT_QUERY),
+        ('descriptive: démographie', DEMOGRAPHICS_QUERY)
+    ]
+    return queries + [(f"analysis_queries: {title}", query) for title, query in read_sql_queries()]
+
+def query_plan(conn: sqlite3.Connection, query: str) -> str:
+    """
+    Plan d'exécution (EXPLAIN QUERY PLAN) résumé sur une ligne
+    """
+    return ' | '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}"))
+
+def time_query(conn: sqlite3.Connection, query: str, repeat: int = 3) -> float:
+    """
+    Meilleure durée d'exécution (résultats lus en entier) sur `repeat` exécutions,
+    après une exécution de mise en cache des pages
+    """
+    conn.execute(query).fetchall()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def measure(conn: sqlite3.Connection, repeat: int = 3) -> pd.DataFrame:
+    """
+    Plan et durée de chaque requête de rapport avec les index actuels
+    """
+    rows = []
+    for name, query in report_queries():
+        rows.append({'requete': name, 'plan': query_plan(conn, query), 'duree_s': time_query(conn, query, repeat)})
+        logger.info(f"{name}: {rows[-1]['duree_s'] * 1000:.1f} ms")
+    return pd.DataFrame(rows)
+
+def run_benchmark(conn: sqlite3.Connection, repeat: int = 3) -> pd.DataFrame:
+    """
+    Mesure les requêtes de rapport avec les index d'origine puis avec les
+    index couvrants (la base est laissée avec les index couvrants)
+
+    Returns:
+        DataFrame (une ligne par requête) des plans et durées avant/après
+    """
+    logger.info("Mesure avec les index d'origine")
+    restore_legacy_indexes(conn)
+    before = measure(conn, repeat)
+
+    logger.info("Mesure avec les index couvrants")
+    create_indexes(conn)
+    after = measure(conn, repeat)
+
+    results = before.merge(after, on='requete', suffixes=('_avant', '_apres'))
+    results['acceleration'] = results['duree_s_avant'] / results['duree_s_apres']
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Index couvrants de la table transactions")
+    parser.add_argument('--db', type=Path, default=DB_PATH, help="Base SQLite")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Compare plans et durées des requêtes de rapport avant/après")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Nombre d'exécutions mesurées par requête (meilleure durée retenue)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        if not args.benchmark:
+            create_indexes(conn)
+            return
+
+        results = run_benchmark(conn, args.repeat)
+        for _, row in results.iterrows():
+            print(f"\n{row['requete']}\n"
+                  f"  avant : {row['duree_s_avant'] * 1000:8.1f} ms  {row['plan_avant']}\n"
+                  f"  après : {row['duree_s_apres'] * 1000:8.1f} ms  {row['plan_apres']}")
+        total_before, total_after = results['duree_s_avant'].sum(), results['duree_s_apres'].sum()
+        print(f"\nTotal : {total_before * 1000:.1f} ms -> {total_after * 1000:.1f} ms "
+              f"(x{total_before / total_after:.2f})")
+        save_results(results, 'index_benchmark')
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    setup_logging()
+    main()
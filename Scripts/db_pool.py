@@ -0,0 +1,176 @@
+"""
+Pool de connexions SQLite en lecture seule partagé par les modules d'analyse
+
+Les connexions sont ouvertes en lecture seule (URI `mode=ro`) sur une base en
+mode WAL : les threads et les processus lisent en parallèle sans se bloquer
+entre eux ni bloquer un chargement en cours. Les PRAGMA de lecture
+(mmap_size, cache_size, temp_store, voir SQLITE_READ_PRAGMAS) sont appliqués
+une seule fois, à l'ouverture de chaque connexion.
+
+Chaque thread garde sa propre connexion (get_connection) ; connection() prête
+une connexion inactive le temps d'un bloc `with`. Après un fork (pool de
+processus du scheduler), le processus enfant ouvre ses propres connexions au
+lieu de réutiliser celles du parent.
+
+Les écritures (ingest.py, db_indexes.py, summary_tables.py) utilisent leurs
+propres connexions.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from config import DB_PATH, SQLITE_POOL_SIZE, SQLITE_READ_PRAGMAS
+
+logger = logging.getLogger(__name__)
+
+class ConnectionPool:
+    """
+    Connexions en lecture seule d'une base SQLite, propres au processus courant
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, pragmas: Dict[str, str] = SQLITE_READ_PRAGMAS,
+                 max_idle: int = SQLITE_POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.pragmas = pragmas
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        # Connexions héritées d'un processus parent : ni réutilisées ni fermées
+        self._inherited: List[sqlite3.Connection] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._idle: List[sqlite3.Connection] = []
+        self._connections: List[sqlite3.Connection] = []
+        self._wal_checked = False
+
+    def _check_process(self) -> None:
+        if self._pid != os.getpid():
+            self._inherited.extend(self._connections)
+            self._reset()
+
+    def _ensure_wal(self) -> None:
+        """
+        Passe la base en mode WAL (persistant dans le fichier) si nécessaire,
+        une fois par processus
+        """
+        if self._wal_checked:
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != 'wal':
+                conn.execute("PRAGMA journal_mode=WAL")
+                logger.info(f"Base {self.db_path.name} passée en mode WAL")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Impossible de passer la base en mode WAL : {e}")
+        finally:
+            conn.close()
+        self._wal_checked = True
+
+    def _open(self) -> sqlite3.Connection:
+        first = not self._connections
+        if first:
+            logger.info(f"Tentative de connexion à la base de données: {self.db_path}")
+            if not self.db_path.exists():
+                raise FileNotFoundError(f"Base de données introuvable : {self.db_path}")
+            self._ensure_wal()
+
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True,
+                               check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        if first:
+            count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+            logger.info(f"Connexion réussie. Nombre de transactions: {count}")
+        self._connections.append(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Connexion inactive du pool, ou nouvelle connexion
+        """
+        with self._lock:
+            self._check_process()
+            if self._idle:
+                return self._idle.pop()
+            return self._open()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """
+        Rend une connexion obtenue par acquire() (fermée si le pool est plein)
+        """
+        with self._lock:
+            self._check_process()
+            if conn not in self._connections:
+                return
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+            else:
+                self._connections.remove(conn)
+                conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Prête une connexion le temps d'un bloc `with`
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        Connexion du thread courant, conservée pour la durée du thread
+        """
+        self._check_process()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.acquire()
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        """
+        Ferme les connexions ouvertes par le processus courant
+        """
+        with self._lock:
+            self._check_process()
+            if self._connections:
+                logger.info("Fermeture de la connexion à la base de données")
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.error(f"Erreur lors de la fermeture de la connexion: {str(e)}")
+            self._reset()
+
+# Un pool par base
+_pools: Dict[Path, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: Path = DB_PATH) -> ConnectionPool:
+    """
+    Pool partagé de la base `db_path`
+    """
+    key = Path(db_path).resolve()
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(key)
+        return _pools[key]
+
+def close_pools() -> None:
+    """
+    Ferme les connexions de tous les pools du processus courant
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
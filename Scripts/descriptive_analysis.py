@@ -4,125 +4,186 @@ Analyses descriptives des données
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Union
 import logging
 from utils import save_results
-from data_loader import execute_query
-from config import AMOUNT_BINS, AMOUNT_LABELS
+from config import SUMMARY_TABLES_ENABLED
+from data_loader import execute_query, get_db_connection
+from data_cube import DataCube, as_cube, bucket_label
+from summary_tables import SummaryTables, is_installed
+from instrumentation import span, traced
 
 logger = logging.getLogger(__name__)
 
-def perform_descriptive_analysis(df: pd.DataFrame = None) -> Dict[str, pd.DataFrame]:
+# Requêtes SQL des rapports (utilisées sans cube ; voir aussi db_indexes.py)
+CATEGORY_QUERY = """
+SELECT 
+    category,
+    COUNT(*) as total_transactions,
+    SUM(amount) as total_amount,
+    AVG(amount) as avg_amount,
+    SUM(CASE WHEN fraud = 1 THEN 1 ELSE 0 END) as fraud_count,
+    (SUM(CASE WHEN fraud = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as fraud_rate
+FROM transactions
+GROUP BY category
+ORDER BY total_transactions DESC
+"""
+
+AMOUNT_QUERY = """
+WITH amount_categories AS (
+    SELECT 
+        CASE 
+            WHEN amount <= 100 THEN '0-100'
+            WHEN amount <= 500 THEN '100-500'
+            WHEN amount <= 1000 THEN '500-1000'
+            WHEN amount <= 2000 THEN '1000-2000'
+            WHEN amount <= 5000 THEN '2000-5000'
+            ELSE '>5000'
+        END as amount_category,
+        amount,
+        fraud
+    FROM transactions
+)
+SELECT 
+    amount_category,
+    COUNT(*) as transaction_count,
+    SUM(amount) as total_amount,
+    AVG(amount) as avg_amount,
+    SUM(fraud) as fraud_count,
+    (SUM(fraud) * 100.0 / COUNT(*)) as fraud_rate
+FROM amount_categories
+GROUP BY amount_category
+ORDER BY 
+    CASE amount_category
+        WHEN '0-100' THEN 1
+        WHEN '100-500' THEN 2
+        WHEN '500-1000' THEN 3
+        WHEN '1000-2000' THEN 4
+        WHEN '2000-5000' THEN 5
+        WHEN '>5000' THEN 6
+    END
+"""
+
+DEMOGRAPHICS_QUERY = """
+SELECT 
+    age,
+    gender,
+    COUNT(*) as transaction_count,
+    SUM(amount) as total_amount,
+    AVG(amount) as avg_amount,
+    SUM(fraud) as fraud_count,
+    (SUM(fraud) * 100.0 / COUNT(*)) as fraud_rate
+FROM transactions
+GROUP BY age, gender
+ORDER BY age, gender
+"""
+
+def perform_descriptive_analysis(data: Union[pd.DataFrame, DataCube] = None) -> Dict[str, pd.DataFrame]:
     """
     Réalise l'ensemble des analyses descriptives
     
+    Si les transactions (DataFrame ou cube de données) sont fournies, les
+    agrégats sont obtenus par roll-up du cube ; sinon ils sont lus dans les
+    tables de synthèse (SUMMARY_TABLES_ENABLED) ou calculés par SQLite.
+    
     Returns:
         Dict contenant les différents DataFrames d'analyse
     """
     logger.info("Début de l'analyse descriptive")
+    cube = as_cube(data) if data is not None else None
+    source = cube
+    if cube is None and SUMMARY_TABLES_ENABLED and is_installed(get_db_connection()):
+        source = SummaryTables()
     results = {}
     
     # Analyse par catégorie
-    results['category_analysis'] = analyze_by_category()
+    results['category_analysis'] = analyze_by_category(source)
     
-    # Analyse des montants
-    results['amount_analysis'] = analyze_amounts()
+    # Analyse des montants (tranches non matérialisées : cube ou SQL)
+    results['amount_analysis'] = analyze_amounts(cube)
     
     # Analyse démographique
-    results['demographic_analysis'] = analyze_demographics()
+    results['demographic_analysis'] = analyze_demographics(source)
     
     # Sauvegarde des résultats
-    for name, result_df in results.items():
-        save_results(result_df, f"descriptive_{name}")
+    with span('save_results'):
+        for name, result_df in results.items():
+            save_results(result_df, f"descriptive_{name}")
     
     logger.info("Analyse descriptive terminée")
     return results
 
-def analyze_by_category() -> pd.DataFrame:
+def _summarize(stats: pd.DataFrame) -> pd.DataFrame:
     """
-    Analyse des transactions par catégorie
+    Agrégats communs (nombre, somme, moyenne, fraudes) d'un roll-up du cube,
+    clés converties en texte comme dans les résultats SQL
     """
-    query = """
-    SELECT 
-        category,
-        COUNT(*) as total_transactions,
-        SUM(amount) as total_amount,
-        AVG(amount) as avg_amount,
-        SUM(CASE WHEN fraud = 1 THEN 1 ELSE 0 END) as fraud_count,
-        (SUM(CASE WHEN fraud = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as fraud_rate
-    FROM transactions
-    GROUP BY category
-    ORDER BY total_transactions DESC
+    summary = pd.DataFrame({
+        'transaction_count': stats['transactions'],
+        'total_amount': stats['amount_sum'],
+        'avg_amount': stats['amount_mean'],
+        'fraud_count': stats['fraud_count'],
+        'fraud_rate': stats['fraud_mean'] * 100.0
+    })
+    if isinstance(summary.index, pd.MultiIndex):
+        summary.index = summary.index.set_levels([level.astype(str) for level in summary.index.levels])
+    else:
+        summary.index = summary.index.astype(str)
+    return summary
+
+@traced
+def analyze_by_category(cube: Union[DataCube, SummaryTables] = None) -> pd.DataFrame:
     """
+    Analyse des transactions par catégorie (roll-up du cube ou de la table
+    de synthèse, requête SQL sinon)
+    """
+    if cube is not None:
+        category_stats = _summarize(cube.rollup('category'))
+        category_stats = category_stats.rename(columns={'transaction_count': 'total_transactions'})
+        category_stats = (category_stats
+                          .sort_values('total_transactions', ascending=False)
+                          .rename_axis('category')
+                          .reset_index())
+        category_stats['fraud_rate'] = category_stats['fraud_rate'].round(2)
+        return category_stats
     
-    category_stats = execute_query(query)
+    category_stats = execute_query(CATEGORY_QUERY)
     category_stats['fraud_rate'] = category_stats['fraud_rate'].round(2)
     
     return category_stats
 
-def analyze_amounts() -> pd.DataFrame:
+@traced
+def analyze_amounts(cube: DataCube = None) -> pd.DataFrame:
     """
     Analyse de la distribution des montants
     """
-    query = """
-    WITH amount_categories AS (
-        SELECT 
-            CASE 
-                WHEN amount <= 100 THEN '0-100'
-                WHEN amount <= 500 THEN '100-500'
-                WHEN amount <= 1000 THEN '500-1000'
-                WHEN amount <= 2000 THEN '1000-2000'
-                WHEN amount <= 5000 THEN '2000-5000'
-                ELSE '>5000'
-            END as amount_category,
-            amount,
-            fraud
-        FROM transactions
-    )
-    SELECT 
-        amount_category,
-        COUNT(*) as transaction_count,
-        SUM(amount) as total_amount,
-        AVG(amount) as avg_amount,
-        SUM(fraud) as fraud_count,
-        (SUM(fraud) * 100.0 / COUNT(*)) as fraud_rate
-    FROM amount_categories
-    GROUP BY amount_category
-    ORDER BY 
-        CASE amount_category
-            WHEN '0-100' THEN 1
-            WHEN '100-500' THEN 2
-            WHEN '500-1000' THEN 3
-            WHEN '1000-2000' THEN 4
-            WHEN '2000-5000' THEN 5
-            WHEN '>5000' THEN 6
-        END
-    """
+    if cube is not None:
+        # Mêmes tranches que la requête SQL : les montants nuls sont comptés
+        # dans '0-100', c'est-à-dire fusionnés avec la tranche 1 du cube
+        cells = cube.cells.assign(amount_bucket=cube.cells['amount_bucket'].clip(lower=1))
+        amount_stats = _summarize(DataCube(cells, cube.customers).rollup('amount_bucket'))
+        amount_stats.index = [bucket_label(int(bucket)) for bucket in amount_stats.index]
+        amount_stats = amount_stats.rename_axis('amount_category').reset_index()
+        amount_stats['fraud_rate'] = amount_stats['fraud_rate'].round(2)
+        return amount_stats
     
-    amount_stats = execute_query(query)
+    amount_stats = execute_query(AMOUNT_QUERY)
     amount_stats['fraud_rate'] = amount_stats['fraud_rate'].round(2)
     
     return amount_stats
 
-def analyze_demographics() -> pd.DataFrame:
-    """
-    Analyse démographique des transactions
+@traced
+def analyze_demographics(cube: Union[DataCube, SummaryTables] = None) -> pd.DataFrame:
     """
-    query = """
-    SELECT 
-        age,
-        gender,
-        COUNT(*) as transaction_count,
-        SUM(amount) as total_amount,
-        AVG(amount) as avg_amount,
-        SUM(fraud) as fraud_count,
-        (SUM(fraud) * 100.0 / COUNT(*)) as fraud_rate
-    FROM transactions
-    GROUP BY age, gender
-    ORDER BY age, gender
+    Analyse démographique des transactions (roll-up du cube ou de la table
+    de synthèse, requête SQL sinon)
     """
+    if cube is not None:
+        demo_stats = _summarize(cube.rollup(['age', 'gender'])).sort_index().reset_index()
+        demo_stats['fraud_rate'] = demo_stats['fraud_rate'].round(2)
+        return demo_stats
     
-    demo_stats = execute_query(query)
+    demo_stats = execute_query(DEMOGRAPHICS_QUERY)
     demo_stats['fraud_rate'] = demo_stats['fraud_rate'].round(2)
     
     return demo_stats
@@ -0,0 +1,192 @@
+"""
+Rendu des figures : processus dédiés, backend Agg et cache de rendu
+
+Chaque figure est décrite par une FigureJob : une fonction de tracé de
+niveau module, les agrégats qu'elle affiche et le fichier de sortie. Les
+figures sont tracées dans un pool de processus sur le backend Agg (sans
+affichage). Une empreinte des agrégats, du code du module de tracé et des
+paramètres de sauvegarde est enregistrée pour chaque fichier : une figure dont
+l'empreinte n'a pas changé n'est pas retracée.
+
+Le mode aperçu sauvegarde à résolution réduite (FIGURE_PREVIEW_DPI) et sans
+le recadrage bbox_inches='tight', qui impose un second rendu de la figure.
+"""
+
+import hashlib
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from config import CACHE_DIR, FIGURE_CACHE_ENABLED, FIGURE_PREVIEW_DPI, FIGURE_WORKERS
+from scheduler import resolve_jobs
+
+logger = logging.getLogger(__name__)
+
+RENDER_CACHE_PATH = CACHE_DIR / 'figures.json'
+
+class FigureJob(NamedTuple):
+    """
+    Figure à produire : `render(data)` construit et retourne la figure
+    matplotlib, sauvegardée ensuite dans `path`
+    """
+    name: str
+    render: Callable[[Any], Any]
+    data: Any
+    path: Path
+    dpi: Optional[int] = None
+    bbox_inches: Optional[str] = None
+
+def _update_hash(digest, value) -> None:
+    """
+    Ajoute une valeur (agrégats pandas/NumPy, conteneurs, scalaires) à l'empreinte
+    """
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), [str(dtype) for dtype in value.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, (pd.Series, pd.Index)):
+        digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=isinstance(value, pd.Series)).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.shape, value.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update_hash(digest, item)
+    else:
+        digest.update(repr(value).encode())
+
+def _module_source(render: Callable) -> bytes:
+    """
+    Code source du module de la fonction de tracé (une modification du tracé
+    invalide les figures en cache)
+    """
+    module_file = getattr(sys.modules.get(render.__module__), '__file__', None)
+    return Path(module_file).read_bytes() if module_file else b''
+
+def figure_key(job: FigureJob, preview: bool = False) -> str:
+    """
+    Empreinte d'une figure : agrégats, fonction de tracé et paramètres de sauvegarde
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{job.render.__module__}.{job.render.__qualname__}".encode())
+    digest.update(_module_source(job.render))
+    _update_hash(digest, savefig_options(job, preview))
+    _update_hash(digest, job.data)
+    return digest.hexdigest()
+
+def savefig_options(job: FigureJob, preview: bool = False) -> Dict[str, Any]:
+    """
+    Paramètres passés à savefig (résolution réduite et pas de recadrage en aperçu)
+    """
+    if preview:
+        return {'dpi': FIGURE_PREVIEW_DPI}
+    options = {}
+    if job.dpi is not None:
+        options['dpi'] = job.dpi
+    if job.bbox_inches is not None:
+        options['bbox_inches'] = job.bbox_inches
+    return options
+
+def _use_agg_backend(instrumentation_settings: Optional[dict] = None) -> None:
+    import matplotlib
+    matplotlib.use('Agg')
+    instrumentation.init_worker(instrumentation_settings)
+
+def _render(job: FigureJob, preview: bool) -> Tuple[float, List[dict]]:
+    """
+    Trace et sauvegarde une figure (exécuté dans un processus du pool)
+
+    Returns:
+        (durée du rendu, intervalles mesurés si l'instrumentation est active)
+    """
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    with instrumentation.span(job.name, kind='figure'):
+        with instrumentation.span('plot'):
+            fig = job.render(job.data)
+        with instrumentation.span('savefig'):
+            fig.savefig(job.path, **savefig_options(job, preview))
+        plt.close(fig)
+    return time.perf_counter() - start, instrumentation.drain()
+
+def _load_render_cache() -> Dict[str, str]:
+    try:
+        with open(RENDER_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_render_cache(keys: Dict[str, str]) -> None:
+    RENDER_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = RENDER_CACHE_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(keys, f, indent=1, sort_keys=True)
+    tmp_path.replace(RENDER_CACHE_PATH)
+
+def render_figures(jobs: List[FigureJob], workers: int = FIGURE_WORKERS, preview: bool = False,
+                   use_cache: bool = FIGURE_CACHE_ENABLED) -> Dict[str, float]:
+    """
+    Produit les figures, chacune dans un processus du pool (backend Agg)
+
+    Args:
+        jobs: Figures à produire
+        workers: Nombre de processus (0 : tous les cœurs disponibles)
+        preview: Mode aperçu (résolution réduite, pas de bbox_inches='tight')
+        use_cache: Ne retrace pas une figure dont l'empreinte n'a pas changé
+
+    Returns:
+        Dict {nom de la figure: durée de rendu en secondes} (figures retracées)
+    """
+    start = time.perf_counter()
+    cache = _load_render_cache() if use_cache else {}
+    pending, up_to_date = [], {}
+    for job in jobs:
+        job.path.parent.mkdir(parents=True, exist_ok=True)
+        key = figure_key(job, preview)
+        if use_cache and cache.get(str(job.path)) == key and job.path.exists():
+            logger.info(f"Figure {job.name} inchangée, rendu ignoré ({job.path.name})")
+            up_to_date[str(job.path)] = key
+        else:
+            pending.append((job, key))
+
+    timings = {}
+    try:
+        if pending:
+            workers = min(resolve_jobs(workers), len(pending))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_use_agg_backend,
+                                     initargs=(instrumentation.settings(),)) as pool:
+                futures = {pool.submit(_render, job, preview): (job, key) for job, key in pending}
+                for future in as_completed(futures):
+                    job, key = futures[future]
+                    try:
+                        timings[job.name], records = future.result()
+                    except Exception:
+                        logger.error(f"Échec du rendu de la figure {job.name}")
+                        raise
+                    instrumentation.adopt(records)
+                    up_to_date[str(job.path)] = key
+                    logger.info(f"Figure {job.name} rendue en {timings[job.name]:.2f} s ({job.path.name})")
+    finally:
+        # Seules les figures effectivement sauvegardées sont marquées à jour
+        if use_cache:
+            stale = {str(job.path) for job, _ in pending}
+            _save_render_cache({**{path: key for path, key in cache.items() if path not in stale},
+                                **up_to_date})
+
+    mode = "aperçu" if preview else "finale"
+    logger.info(f"{len(timings)} figure(s) rendue(s), {len(jobs) - len(pending)} inchangée(s) "
+                f"(qualité {mode}, {time.perf_counter() - start:.2f} s)")
+    return timings
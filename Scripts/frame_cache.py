@@ -0,0 +1,207 @@
+"""
+Cache colonnaire sur disque du DataFrame nettoyé des transactions
+
+Chaque colonne est stockée dans son propre fichier NumPy (.npy) :
+les colonnes textuelles sont encodées par dictionnaire (codes entiers +
+modalités dans le manifeste) et tous les fichiers sont relus en mémoire
+mappée. Le cache est associé à une empreinte de la base SQLite (taille,
+date de modification, nombre de lignes et id maximal) et est ignoré dès
+que la base change.
+"""
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR, DB_PATH
+from instrumentation import traced
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_VERSION = 1
+
+def database_fingerprint(conn, db_path: Path = DB_PATH) -> dict:
+    """
+    Calcule l'empreinte de la base utilisée pour invalider le cache
+    """
+    db_stat = os.stat(db_path)
+    wal_path = Path(f"{db_path}-wal")
+    # Le fichier WAL est recréé à chaque ouverture : seule sa taille compte
+    wal_size = wal_path.stat().st_size if wal_path.exists() else 0
+    row_count, max_id = conn.execute(
+        "SELECT COUNT(*), MAX(id) FROM transactions"
+    ).fetchone()
+    return {
+        'db_size': db_stat.st_size,
+        'db_mtime_ns': db_stat.st_mtime_ns,
+        'wal_size': wal_size,
+        'row_count': row_count,
+        'max_id': max_id
+    }
+
+def _codes_dtype(n_categories: int) -> np.dtype:
+    """
+    Plus petit type entier capable de contenir les codes (et -1 pour NaN)
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+def encode_column(series: pd.Series) -> Tuple[dict, np.ndarray]:
+    """
+    Encode une colonne en tableau NumPy de type fixe
+
+    Les colonnes catégorielles sont stockées par leurs codes, les colonnes
+    textuelles sont encodées par dictionnaire (codes entiers + modalités dans
+    la description) et les autres colonnes sont conservées telles quelles.
+
+    Returns:
+        (description de la colonne, tableau à stocker)
+    """
+    entry = {'name': series.name, 'dtype': str(series.dtype)}
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        entry['encoding'] = 'categorical'
+        entry['ordered'] = bool(series.cat.ordered)
+        categories = series.cat.categories
+        codes = series.cat.codes.to_numpy()
+    elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        # Encodage par dictionnaire, la colonne retrouve son type au décodage
+        entry['encoding'] = 'dictionary'
+        codes, categories = pd.factorize(series, sort=True)
+    else:
+        entry['encoding'] = 'plain'
+        return entry, series.to_numpy()
+
+    entry['categories'] = [str(value) for value in categories]
+    return entry, codes.astype(_codes_dtype(len(categories)))
+
+def decode_column(entry: dict, values: np.ndarray):
+    """
+    Reconstruit une colonne à partir de sa description et du tableau stocké
+    (le tableau n'est pas copié pour les colonnes numériques)
+    """
+    if entry['encoding'] == 'plain':
+        return values
+    column = pd.Categorical.from_codes(values, categories=pd.Index(entry['categories']),
+                                       ordered=entry.get('ordered', False))
+    if entry['encoding'] == 'dictionary':
+        column = pd.Series(column).astype(entry['dtype']).array
+    return column
+
+def is_memory_mapped(values: np.ndarray) -> bool:
+    """
+    Indique si le tableau est une vue d'un fichier mappé en mémoire (np.memmap)
+    """
+    while isinstance(values, np.ndarray):
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+def _cache_dir(name: str) -> Path:
+    return CACHE_DIR / name
+
+@traced
+def save_frame(df: pd.DataFrame, fingerprint: dict, name: str = 'transactions') -> None:
+    """
+    Écrit le DataFrame dans le cache colonnaire
+    """
+    target = _cache_dir(name)
+    tmp_dir = target.with_name(target.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    columns = []
+    for position, col in enumerate(df.columns):
+        entry, values = encode_column(df[col])
+        entry['file'] = f"{position:03d}.npy"
+        np.save(tmp_dir / entry['file'], values)
+        columns.append(entry)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'fingerprint': fingerprint,
+        'rows': len(df),
+        'columns': columns,
+        'index_file': None
+    }
+    if not df.index.equals(pd.RangeIndex(len(df))):
+        manifest['index_file'] = 'index.npy'
+        np.save(tmp_dir / 'index.npy', df.index.to_numpy())
+
+    # Le manifeste est écrit en dernier : un cache incomplet n'est jamais lu
+    with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(target, ignore_errors=True)
+    tmp_dir.rename(target)
+    logger.info(f"Cache colonnaire écrit dans {target} ({len(df)} lignes)")
+
+def read_fingerprint(name: str = 'transactions') -> Optional[dict]:
+    """
+    Retourne l'empreinte enregistrée avec un DataFrame en cache, ou None
+    """
+    manifest_path = _cache_dir(name) / MANIFEST_NAME
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format_version') != FORMAT_VERSION:
+        return None
+    return manifest.get('fingerprint')
+
+@traced
+def load_frame(fingerprint: dict, name: str = 'transactions',
+               columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Relit le DataFrame depuis le cache s'il correspond à l'empreinte fournie
+    (seulement les colonnes `columns` présentes dans le cache, si fournies)
+
+    Returns:
+        Le DataFrame en cache, ou None si le cache est absent ou périmé
+    """
+    target = _cache_dir(name)
+    manifest_path = target / MANIFEST_NAME
+    if not manifest_path.exists():
+        logger.info("Aucun cache colonnaire disponible")
+        return None
+
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Manifeste du cache illisible, cache ignoré: {str(e)}")
+        return None
+
+    if manifest.get('format_version') != FORMAT_VERSION or manifest.get('fingerprint') != fingerprint:
+        logger.info("Cache colonnaire périmé (la base a changé)")
+        return None
+
+    data = {entry['name']: decode_column(entry, np.load(target / entry['file'], mmap_mode='r'))
+            for entry in manifest['columns'] if columns is None or entry['name'] in columns}
+
+    index = None
+    if manifest['index_file'] is not None:
+        index = np.load(target / manifest['index_file'], mmap_mode='r')
+
+    # Sans copy=False, pandas copie les tableaux : tout le cache serait lu en mémoire
+    df = pd.DataFrame(data, index=index, copy=False)
+    plain = [entry['name'] for entry in manifest['columns']
+             if entry['encoding'] == 'plain' and entry['name'] in df.columns]
+    if plain and not is_memory_mapped(df[plain[0]].to_numpy()):
+        logger.warning("Colonnes du cache copiées en mémoire au lieu d'être mappées")
+    return df
+
+def clear_cache(name: str = 'transactions') -> None:
+    """
+    Supprime le cache colonnaire
+    """
+    shutil.rmtree(_cache_dir(name), ignore_errors=True)
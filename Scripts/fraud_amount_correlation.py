@@ -2,70 +2,87 @@
 Analyse de la corrélation entre les montants et les fraudes
 """
 
-import sqlite3
-from pathlib import Path
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from typing import List
+from context import AnalysisContext, ensure_context
+from figures import FigureJob, render_figures
+from utils import setup_logging, with_amount
 
 # Configuration
-DB_PATH = Path(__file__).parent.parent / 'SQLite' / 'bankdata.db'
-RESULTS_DIR = Path(__file__).parent.parent / 'Results'
-FIGURES_DIR = RESULTS_DIR / 'Figures'
-FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+from config import FIGURES_DIR
 
-def get_fraud_amount_data():
+# Tranches de montant (bornes supérieures incluses)
+TRANCHE_BINS = [float('-inf'), 10, 20, 50, 100, 200, 500, 1000, float('inf')]
+TRANCHE_LABELS = ['0-10€', '10-20€', '20-50€', '50-100€', '100-200€',
+                  '200-500€', '500-1000€', '> 1000€']
+
+def get_fraud_amount_data(ctx: AnalysisContext = None):
     """Récupère les données pour l'analyse"""
-    # Requête pour les tranches
-    tranche_query = """
-    WITH amount_ranges AS (
-        SELECT 
-            CASE 
-                WHEN amount <= 10 THEN '0-10€'
-                WHEN amount <= 20 THEN '10-20€'
-                WHEN amount <= 50 THEN '20-50€'
-                WHEN amount <= 100 THEN '50-100€'
-                WHEN amount <= 200 THEN '100-200€'
-                WHEN amount <= 500 THEN '200-500€'
-                WHEN amount <= 1000 THEN '500-1000€'
-                ELSE '> 1000€'
-            END AS tranche_montant,
-            fraud,
-            amount,
-            category
-        FROM transactions
-    )
-    SELECT 
-        tranche_montant,
-        COUNT(*) as total_transactions,
-        SUM(fraud) as fraudulent_transactions,
-        ROUND(AVG(fraud) * 100, 2) as fraud_rate,
-        ROUND(AVG(amount), 2) as avg_amount,
-        ROUND(MIN(amount), 2) as min_amount,
-        ROUND(MAX(amount), 2) as max_amount
-    FROM amount_ranges
-    GROUP BY tranche_montant
-    ORDER BY min_amount;
+    df = with_amount(ensure_context(ctx).df)
+    
+    # Données brutes (pour la corrélation)
+    correlation_data = df[['amount', 'fraud']]
+    
+    # Statistiques par tranche
+    tranches = pd.cut(correlation_data['amount'], bins=TRANCHE_BINS, labels=TRANCHE_LABELS)
+    grouped = correlation_data.groupby(tranches, observed=True)
+    tranche_data = pd.DataFrame({
+        'total_transactions': grouped['fraud'].size(),
+        'fraudulent_transactions': grouped['fraud'].sum(),
+        'fraud_rate': (grouped['fraud'].mean() * 100).round(2),
+        'avg_amount': grouped['amount'].mean().round(2),
+        'min_amount': grouped['amount'].min().round(2),
+        'max_amount': grouped['amount'].max().round(2)
+    })
+    tranche_data.index = tranche_data.index.astype(str)
+    tranche_data = (tranche_data.rename_axis('tranche_montant')
+                    .reset_index()
+                    .sort_values('min_amount')
+                    .reset_index(drop=True))
+    
+    return tranche_data, correlation_data
+
+def analyze_fraud_amount_correlation(ctx: AnalysisContext = None, figures: List[FigureJob] = None):
     """
+    Analyse et visualise la corrélation entre montants et fraudes
     
-    # Requête pour les données brutes (pour la corrélation)
-    correlation_query = """
-    SELECT amount, fraud
-    FROM transactions;
+    Si une liste `figures` est fournie, la figure y est ajoutée pour être
+    rendue plus tard avec les autres ; sinon elle est rendue immédiatement.
     """
+    # Récupération des données
+    data, raw_data = get_fraud_amount_data(ctx)
     
-    with sqlite3.connect(DB_PATH) as conn:
-        tranche_data = pd.read_sql_query(tranche_query, conn)
-        correlation_data = pd.read_sql_query(correlation_query, conn)
+    # Calculer la distribution des fraudes
+    data['fraud_distribution'] = (data['fraudulent_transactions'] / 
+                                data['fraudulent_transactions'].sum() * 100)
     
-    return tranche_data, correlation_data
-
-def analyze_fraud_amount_correlation():
-    """Analyse et visualise la corrélation entre montants et fraudes"""
-    # Récupération des données
-    data, raw_data = get_fraud_amount_data()
+    # Figure (rendue dans un processus dédié)
+    job = FigureJob('fraud_amount_correlation', plot_fraud_amount_correlation, data,
+                    FIGURES_DIR / 'fraud_amount_correlation.png', dpi=300, bbox_inches='tight')
+    if figures is not None:
+        figures.append(job)
+    else:
+        render_figures([job])
+    
+    # Calcul des statistiques
+    stats = {
+        # Corrélation point-bisériale (entre variable continue et binaire)
+        'correlation': raw_data['amount'].corr(raw_data['fraud']),
+        'correlation_spearman': raw_data['amount'].corr(raw_data['fraud'], method='spearman'),
+        'tranche_plus_risquee': data.iloc[data['fraud_rate'].idxmax()]['tranche_montant'],
+        'taux_max': data['fraud_rate'].max(),
+        'tranche_plus_fraudee': data.iloc[data['fraudulent_transactions'].idxmax()]['tranche_montant'],
+        'nb_fraudes_max': data['fraudulent_transactions'].max()
+    }
     
+    return stats
+
+def plot_fraud_amount_correlation(data: pd.DataFrame):
+    """Trace le taux et la distribution des fraudes par tranche de montant"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Configuration de la figure
     plt.style.use('default')
     sns.set_theme(style="whitegrid")
@@ -101,10 +118,6 @@ def analyze_fraud_amount_correlation():
     # 2. Distribution des fraudes par tranche de montant
     ax2 = plt.subplot(2, 1, 2)
     
-    # Calculer la distribution des fraudes
-    data['fraud_distribution'] = (data['fraudulent_transactions'] / 
-                                data['fraudulent_transactions'].sum() * 100)
-    
     # Créer le graphique en barres
     bars = ax2.bar(range(len(data)), data['fraud_distribution'], color='lightblue')
     
@@ -132,25 +145,10 @@ def analyze_fraud_amount_correlation():
     # Ajustements finaux
     plt.tight_layout(rect=[0, 0, 1, 1])  # Ajustement des marges sans titre
     
-    # Sauvegarde
-    plt.savefig(FIGURES_DIR / 'fraud_amount_correlation.png', 
-                dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    # Calcul des statistiques
-    stats = {
-        # Corrélation point-bisériale (entre variable continue et binaire)
-        'correlation': raw_data['amount'].corr(raw_data['fraud']),
-        'correlation_spearman': raw_data['amount'].corr(raw_data['fraud'], method='spearman'),
-        'tranche_plus_risquee': data.iloc[data['fraud_rate'].idxmax()]['tranche_montant'],
-        'taux_max': data['fraud_rate'].max(),
-        'tranche_plus_fraudee': data.iloc[data['fraudulent_transactions'].idxmax()]['tranche_montant'],
-        'nb_fraudes_max': data['fraudulent_transactions'].max()
-    }
-    
-    return stats
+    return fig
 
 if __name__ == '__main__':
+    setup_logging()
     stats = analyze_fraud_amount_correlation()
     print("\nStatistiques sur la relation montants-fraudes :")
     print(f"• Corrélation de Pearson : {stats['correlation']:.3f}")
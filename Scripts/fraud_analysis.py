@@ -4,76 +4,73 @@ Analyses spécifiques aux transactions frauduleuses
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Union
 import logging
-from utils import calculate_fraud_rate, save_results
+from utils import calculate_fraud_rate, format_group_stats, save_results
 from config import AMOUNT_BINS, AMOUNT_LABELS
+from data_cube import DataCube, as_cube, bucket_label
+from instrumentation import span, traced
 
 logger = logging.getLogger(__name__)
 
-def perform_fraud_analysis(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+def perform_fraud_analysis(data: Union[pd.DataFrame, DataCube]) -> Dict[str, pd.DataFrame]:
     """
     Réalise l'ensemble des analyses sur les fraudes
     
+    Les analyses sont calculées sur le cube de données, construit à partir
+    du DataFrame des transactions s'il n'est pas fourni directement.
+    
     Returns:
         Dict contenant les différents DataFrames d'analyse
     """
     logger.info("Début de l'analyse des fraudes")
+    cube = as_cube(data)
     results = {}
     
     # Analyse par montant
-    results['amount_fraud'] = analyze_fraud_by_amount(df)
+    results['amount_fraud'] = analyze_fraud_by_amount(cube)
     
     # Analyse par commerçant
-    results['merchant_fraud'] = analyze_merchant_risk(df)
+    results['merchant_fraud'] = analyze_merchant_risk(cube)
     
     # Analyse par catégorie de commerce
-    results['category_fraud'] = analyze_category_risk(df)
+    results['category_fraud'] = analyze_category_risk(cube)
     
     # Analyse démographique des fraudes
-    if 'age' in df.columns and 'gender' in df.columns:
-        results['demographic_fraud'] = analyze_demographic_risk(df)
+    results['demographic_fraud'] = analyze_demographic_risk(cube)
     
     # Sauvegarde des résultats
-    for name, result_df in results.items():
-        save_results(result_df, f"fraud_{name}")
+    with span('save_results'):
+        for name, result_df in results.items():
+            save_results(result_df, f"fraud_{name}")
     
     logger.info("Analyse des fraudes terminée")
     return results
 
-def analyze_fraud_by_amount(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def analyze_fraud_by_amount(cube: DataCube) -> pd.DataFrame:
     """
     Analyse des fraudes par tranche de montant
     """
-    df['amount_category'] = pd.cut(df['amount'], 
-                                 bins=AMOUNT_BINS,
-                                 labels=AMOUNT_LABELS)
+    # Tranches AMOUNT_BINS : les montants nuls (tranche 0 du cube) sont exclus
+    bucket_stats = cube.rollup('amount_bucket')
+    bucket_stats = bucket_stats[bucket_stats.index > 0]
     
     # Statistiques générales par tranche de montant
-    amount_fraud = df.groupby('amount_category', observed=True).agg({
-        'amount': ['count', 'sum', 'mean'],
-        'fraud': ['sum', 'mean']
-    }).round(2)
-    
-    amount_fraud.columns = ['transaction_count', 'total_amount', 'avg_amount',
-                          'fraud_count', 'fraud_rate']
-    amount_fraud['fraud_rate'] = (amount_fraud['fraud_rate'] * 100).round(2)
+    amount_fraud = format_group_stats(bucket_stats)
+    amount_fraud.index = pd.CategoricalIndex([bucket_label(b) for b in amount_fraud.index],
+                                             categories=AMOUNT_LABELS, ordered=True,
+                                             name='amount_category')
     
     return amount_fraud
 
-def analyze_merchant_risk(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def analyze_merchant_risk(cube: DataCube) -> pd.DataFrame:
     """
     Analyse du risque par commerçant
     """
     # Calcul des statistiques par commerçant
-    merchant_stats = df.groupby('merchant', observed=True).agg({
-        'amount': ['count', 'sum', 'mean'],
-        'fraud': ['sum', 'mean']
-    }).round(2)
-    
-    merchant_stats.columns = ['transaction_count', 'total_amount', 'avg_amount',
-                            'fraud_count', 'fraud_rate']
-    merchant_stats['fraud_rate'] = (merchant_stats['fraud_rate'] * 100).round(2)
+    merchant_stats = format_group_stats(cube.rollup('merchant'))
     
     # Identification des commerçants à haut risque
     threshold = merchant_stats['fraud_rate'].mean() + merchant_stats['fraud_rate'].std()
@@ -81,38 +78,26 @@ def analyze_merchant_risk(df: pd.DataFrame) -> pd.DataFrame:
     
     return merchant_stats.sort_values('fraud_rate', ascending=False)
 
-def analyze_category_risk(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def analyze_category_risk(cube: DataCube) -> pd.DataFrame:
     """
     Analyse du risque par catégorie de commerce
     """
     # Calcul des statistiques par catégorie
-    category_stats = df.groupby('category', observed=True).agg({
-        'amount': ['count', 'sum', 'mean'],
-        'fraud': ['sum', 'mean']
-    }).round(2)
-    
-    category_stats.columns = ['transaction_count', 'total_amount', 'avg_amount',
-                            'fraud_count', 'fraud_rate']
-    category_stats['fraud_rate'] = (category_stats['fraud_rate'] * 100).round(2)
+    category_stats = format_group_stats(cube.rollup('category'))
     
     # Calcul des indices de risque relatif
-    avg_fraud_rate = df['fraud'].mean() * 100
+    avg_fraud_rate = cube.total_frauds / cube.total_transactions * 100
     category_stats['risk_index'] = (category_stats['fraud_rate'] / avg_fraud_rate).round(2)
     
     return category_stats.sort_values('risk_index', ascending=False)
 
-def analyze_demographic_risk(df: pd.DataFrame) -> pd.DataFrame:
+@traced
+def analyze_demographic_risk(cube: DataCube) -> pd.DataFrame:
     """
     Analyse du risque par segment démographique
     """
     # Calcul des statistiques par âge et genre
-    demo_stats = df.groupby(['age', 'gender'], observed=True).agg({
-        'amount': ['count', 'sum', 'mean'],
-        'fraud': ['sum', 'mean']
-    }).round(2)
-    
-    demo_stats.columns = ['transaction_count', 'total_amount', 'avg_amount',
-                         'fraud_count', 'fraud_rate']
-    demo_stats['fraud_rate'] = (demo_stats['fraud_rate'] * 100).round(2)
+    demo_stats = format_group_stats(cube.rollup(['age', 'gender']))
     
     return demo_stats.sort_values('fraud_rate', ascending=False)
@@ -2,81 +2,88 @@
 Génération d'un dashboard des KPIs principaux
 """
 
-import sqlite3
-from pathlib import Path
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from typing import List
+from context import AnalysisContext, report_source
+from figures import FigureJob, render_figures
+from instrumentation import traced
 
 # Configuration
-DB_PATH = Path(__file__).parent.parent / 'SQLite' / 'bankdata.db'
-RESULTS_DIR = Path(__file__).parent.parent / 'Results'
-FIGURES_DIR = RESULTS_DIR / 'Figures'
-FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+from config import FIGURES_DIR
 
-# Configuration du style
-plt.style.use('default')
-sns.set_theme(style="whitegrid")
-sns.set_palette("husl")
-
-def get_general_kpis():
-    """Récupère les KPIs généraux"""
-    query = """
-    SELECT 
-        COUNT(*) AS total_transactions,
-        COUNT(DISTINCT customer) AS total_customers,
-        COUNT(DISTINCT merchant) AS total_merchants,
-        SUM(fraud) AS fraudulent_transactions,
-        ROUND(AVG(fraud) * 100, 2) AS fraud_rate,
-        ROUND(SUM(amount), 2) AS total_amount,
-        ROUND(AVG(amount), 2) AS avg_amount
-    FROM transactions;
-    """
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query(query, conn).iloc[0]
+@traced
+def get_general_kpis(ctx: AnalysisContext = None):
+    """Récupère les KPIs généraux (résumé du dataset partagé)"""
+    summary = report_source(ctx).data_info()
+    total = summary['total_transactions']
+    return pd.Series({
+        'total_transactions': total,
+        'total_customers': summary['unique_customers'],
+        'total_merchants': summary['unique_merchants'],
+        'fraudulent_transactions': summary['fraud_count'],
+        'fraud_rate': round(summary['fraud_count'] / total * 100, 2),
+        'total_amount': round(summary['total_amount'], 2),
+        'avg_amount': round(summary['avg_amount'], 2)
+    })
 
-def get_category_kpis():
+@traced
+def get_category_kpis(ctx: AnalysisContext = None):
     """Récupère les KPIs par catégorie"""
-    query = """
-    WITH fraud_totals AS (
-        SELECT SUM(fraud) as total_frauds
-        FROM transactions
-    )
-    SELECT 
-        category,
-        COUNT(*) AS transactions,
-        ROUND(SUM(amount), 2) AS volume,
-        ROUND(AVG(amount), 2) AS avg_amount,
-        SUM(fraud) as fraud_count,
-        ROUND(AVG(fraud) * 100, 2) AS fraud_rate,
-        ROUND(SUM(fraud) * 100.0 / (SELECT total_frauds FROM fraud_totals), 2) AS fraud_distribution
-    FROM transactions
-    GROUP BY category
-    ORDER BY volume DESC;
-    """
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query(query, conn)
+    stats = report_source(ctx).rollup('category')
+    category_kpis = pd.DataFrame({
+        # Clés en texte simple, comme dans les résultats des requêtes SQL
+        'category': stats.index.astype(str),
+        'transactions': stats['transactions'].to_numpy(),
+        'volume': stats['amount_sum'].round(2).to_numpy(),
+        'avg_amount': stats['amount_mean'].round(2).to_numpy(),
+        'fraud_count': stats['fraud_count'].to_numpy(),
+        'fraud_rate': (stats['fraud_mean'] * 100).round(2).to_numpy(),
+        'fraud_distribution': (stats['fraud_count'] * 100.0 / stats['fraud_count'].sum()).round(2).to_numpy()
+    })
+    return category_kpis.sort_values('volume', ascending=False).reset_index(drop=True)
 
-def get_gender_kpis():
+@traced
+def get_gender_kpis(ctx: AnalysisContext = None):
     """Récupère les KPIs par genre"""
-    query = """
-    SELECT 
-        gender,
-        COUNT(*) AS transactions,
-        ROUND(SUM(amount), 2) AS volume,
-        ROUND(AVG(fraud) * 100, 2) AS fraud_rate
-    FROM transactions
-    GROUP BY gender;
+    stats = report_source(ctx).rollup('gender')
+    gender_kpis = pd.DataFrame({
+        'gender': stats.index.astype(str),
+        'transactions': stats['transactions'].to_numpy(),
+        'volume': stats['amount_sum'].round(2).to_numpy(),
+        'fraud_rate': (stats['fraud_mean'] * 100).round(2).to_numpy()
+    })
+    return gender_kpis.sort_values('gender').reset_index(drop=True)
+
+def create_kpi_dashboard(ctx: AnalysisContext = None, figures: List[FigureJob] = None):
+    """
+    Crée un dashboard avec les KPIs principaux
+    
+    Si une liste `figures` est fournie, la figure y est ajoutée pour être
+    rendue plus tard avec les autres ; sinon elle est rendue immédiatement.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query(query, conn)
+    # Récupération des données (un seul cube, ou les tables de synthèse, pour tous les KPIs)
+    source = report_source(ctx)
+    kpis = (get_general_kpis(source), get_category_kpis(source), get_gender_kpis(source))
+    
+    job = FigureJob('kpi_dashboard', plot_kpi_dashboard, kpis, FIGURES_DIR / 'kpi_dashboard.png',
+                    dpi=300, bbox_inches='tight')
+    if figures is not None:
+        figures.append(job)
+    else:
+        render_figures([job])
 
-def create_kpi_dashboard():
-    """Crée un dashboard avec les KPIs principaux"""
-    # Récupération des données
-    general_kpis = get_general_kpis()
-    category_kpis = get_category_kpis()
-    gender_kpis = get_gender_kpis()
+def plot_kpi_dashboard(kpis):
+    """Trace le dashboard à partir des KPIs (généraux, par catégorie, par genre)"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    general_kpis, category_kpis, gender_kpis = kpis
+    gender_kpis = gender_kpis.copy()
+    
+    # Configuration du style
+    plt.style.use('default')
+    sns.set_theme(style="whitegrid")
+    sns.set_palette("husl")
     
     # Création de la figure
     fig = plt.figure(figsize=(20, 12))
@@ -196,9 +203,10 @@ def create_kpi_dashboard():
                 fontsize=16, y=0.95)
     plt.tight_layout()
     
-    # Sauvegarde
-    plt.savefig(FIGURES_DIR / 'kpi_dashboard.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    return fig
 
 if __name__ == '__main__':
+    from utils import setup_logging
+
+    setup_logging()
     create_kpi_dashboard()
@@ -0,0 +1,274 @@
+"""
+Ingestion d'un fichier CSV au format BankSim dans la base SQLite
+
+Usage :
+    python ingest.py chemin/vers/bs140513_032310.csv [--replace] [--db chemin.db]
+                     [--batch-size N] [--commit-every N] [--pragma nom=valeur ...]
+"""
+
+import argparse
+import csv
+import logging
+import operator
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from config import (
+    DB_PATH,
+    STRUCTURE_SQL,
+    INGEST_BATCH_SIZE,
+    INGEST_COMMIT_EVERY,
+    INGEST_PRAGMAS
+)
+import summary_tables
+from utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Colonnes de la table transactions (hors id), dans l'ordre d'insertion
+TRANSACTION_COLUMNS = [
+    'step', 'customer', 'age', 'gender', 'zipcodeOri', 'merchant',
+    'zipMerchant', 'category', 'amount', 'fraud'
+]
+
+INSERT_QUERY = (
+    f"INSERT INTO transactions ({', '.join(TRANSACTION_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in TRANSACTION_COLUMNS)})"
+)
+
+# Table chargée par --replace, substituée à transactions après un chargement réussi
+STAGING_TABLE = 'transactions_staging'
+STAGING_INSERT_QUERY = INSERT_QUERY.replace('INSERT INTO transactions', f"INSERT INTO {STAGING_TABLE}", 1)
+
+# Réglages rétablis après le chargement (identiques à data_loader)
+RUNTIME_PRAGMAS = {'locking_mode': 'NORMAL', 'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+
+def read_schema(structure_path: Path = STRUCTURE_SQL) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Sépare structure.sql en instructions de création de table et d'index
+
+    Returns:
+        (instructions hors index, {nom de l'index: instruction CREATE INDEX})
+    """
+    statements = [stmt.strip() for stmt in structure_path.read_text(encoding='utf-8').split(';')]
+    table_statements, index_statements = [], {}
+    for stmt in statements:
+        # Retirer les lignes de commentaires pour identifier l'instruction
+        code = '\n'.join(line for line in stmt.splitlines() if not line.strip().startswith('--')).strip()
+        if not code:
+            continue
+        match = re.match(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', code, re.IGNORECASE)
+        if match:
+            index_statements[match.group(1)] = code
+        else:
+            table_statements.append(re.sub(r'CREATE\s+TABLE\s+(?!IF)', 'CREATE TABLE IF NOT EXISTS ',
+                                           code, flags=re.IGNORECASE))
+    return table_statements, index_statements
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, str]) -> None:
+    """
+    Applique une série de PRAGMA SQLite
+    """
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+        logger.info(f"PRAGMA {name}={value}")
+
+def _clean(value: str) -> str:
+    """
+    Retire les guillemets entourant les noms de colonnes de l'en-tête BankSim
+    """
+    return value.strip().strip("'\"")
+
+def iter_csv_rows(csv_path: Path) -> Iterator[tuple]:
+    """
+    Lit le CSV ligne par ligne et produit des tuples prêts à être insérés
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, quotechar="'")
+        header = [_clean(name) for name in next(reader)]
+        missing = set(TRANSACTION_COLUMNS) - set(header)
+        if missing:
+            raise ValueError(f"Colonnes manquantes dans {csv_path.name}: {missing}")
+        pick = operator.itemgetter(*(header.index(col) for col in TRANSACTION_COLUMNS))
+
+        # Les apostrophes des champs texte sont retirées par le lecteur CSV
+        for line_number, record in enumerate(reader, start=2):
+            if not record:
+                continue
+            try:
+                (step, customer, age, gender, zipcode_ori, merchant,
+                 zip_merchant, category, amount, fraud) = pick(record)
+                yield (int(step), customer, age, gender, zipcode_ori, merchant,
+                       zip_merchant, category, float(amount), int(fraud))
+            except (IndexError, ValueError) as e:
+                raise ValueError(f"Ligne {line_number} invalide dans {csv_path.name}: {str(e)}")
+
+def ingest_csv(csv_path: Path, db_path: Path = DB_PATH, replace: bool = False,
+               batch_size: int = INGEST_BATCH_SIZE, commit_every: int = INGEST_COMMIT_EVERY,
+               pragmas: Dict[str, str] = None) -> dict:
+    """
+    Charge un CSV BankSim dans la table transactions
+
+    Les index de structure.sql sont supprimés pendant le chargement puis
+    recréés à la fin ; les lignes sont insérées par executemany en lots de
+    `batch_size`, dans des transactions de `commit_every` lignes. Si les
+    tables de synthèse sont installées, leurs triggers sont retirés pendant
+    le chargement et les tables reconstruites à la fin. Avec `replace`, les
+    lignes sont chargées dans une table intermédiaire (STAGING_TABLE) qui ne
+    remplace transactions qu'une fois le chargement terminé.
+
+    En cas d'échec, la table transactions retrouve son contenu d'avant le
+    chargement (lignes des transactions déjà validées supprimées, ou table
+    intermédiaire abandonnée), puis les index et les PRAGMA d'exécution,
+    ainsi que les tables de synthèse et leurs triggers, sont rétablis comme
+    après un chargement réussi.
+
+    Returns:
+        Statistiques du chargement (lignes, durées, débit)
+    """
+    pragmas = {**INGEST_PRAGMAS, **(pragmas or {})}
+    table_statements, index_statements = read_schema()
+    logger.info(f"Ingestion de {csv_path} dans {db_path}")
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    indexes_dropped = False
+    with_summary_tables = False
+    total_rows = 0
+    try:
+        apply_pragmas(conn, pragmas)
+
+        # Tables de synthèse reconstruites en une passe plutôt que ligne à ligne
+        with_summary_tables = summary_tables.is_installed(conn)
+        summary_tables.drop_triggers(conn)
+
+        for stmt in table_statements:
+            conn.execute(stmt)
+
+        if replace:
+            # La table existante (et ses index) reste en place jusqu'à la substitution
+            logger.info(f"Chargement dans la table intermédiaire {STAGING_TABLE}")
+            insert_query = STAGING_INSERT_QUERY
+            conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            for stmt in table_statements:
+                conn.execute(re.sub(r'\btransactions\b', STAGING_TABLE, stmt, count=1))
+        else:
+            insert_query = INSERT_QUERY
+            # Dernier id avant le chargement : les lignes ajoutées ont un id supérieur
+            first_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+
+            # Les index sont reconstruits en une fois après le chargement
+            indexes_dropped = True
+            for name in index_statements:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+        start_time = time.perf_counter()
+        rows_in_transaction = 0
+        batch = []
+        conn.execute("BEGIN")
+        for row in iter_csv_rows(csv_path):
+            batch.append(row)
+            if len(batch) < batch_size:
+                continue
+            conn.executemany(insert_query, batch)
+            total_rows += len(batch)
+            rows_in_transaction += len(batch)
+            batch = []
+            if rows_in_transaction >= commit_every:
+                conn.execute("COMMIT")
+                conn.execute("BEGIN")
+                rows_in_transaction = 0
+                elapsed = time.perf_counter() - start_time
+                logger.info(f"{total_rows:,} lignes insérées ({total_rows / elapsed:,.0f} lignes/s)")
+        if batch:
+            conn.executemany(insert_query, batch)
+            total_rows += len(batch)
+        conn.execute("COMMIT")
+
+        if replace:
+            # Substitution atomique : l'ancienne table et ses index disparaissent ensemble
+            logger.info("Remplacement de la table transactions existante")
+            conn.execute("BEGIN")
+            conn.execute("DROP TABLE transactions")
+            conn.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO transactions")
+            conn.execute("COMMIT")
+            indexes_dropped = True
+        load_time = time.perf_counter() - start_time
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        if replace:
+            conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            logger.error("Ingestion interrompue : table transactions inchangée")
+            raise
+        committed_rows, last_id = conn.execute(
+            "SELECT COUNT(*), MAX(id) FROM transactions WHERE id > ?", (first_id,)
+        ).fetchone() if indexes_dropped else (0, None)
+        if committed_rows:
+            # Pas de chargement à moitié fait : les lots déjà validés sont retirés
+            logger.error(f"Ingestion interrompue : suppression des {committed_rows:,} lignes déjà "
+                         f"validées (id {first_id + 1} à {last_id})")
+            conn.execute("DELETE FROM transactions WHERE id > ?", (first_id,))
+        raise
+    finally:
+        # Index et PRAGMA d'exécution rétablis, que le chargement ait réussi ou non
+        try:
+            index_start = time.perf_counter()
+            if indexes_dropped:
+                existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+                for name, stmt in index_statements.items():
+                    if name not in existing:
+                        conn.execute(stmt)
+                        logger.info(f"Index {name} créé")
+            index_time = time.perf_counter() - index_start
+
+            # Même après un échec : rebuild() réinstalle les triggers retirés
+            if with_summary_tables:
+                summary_tables.rebuild(conn)
+
+            apply_pragmas(conn, RUNTIME_PRAGMAS)
+        finally:
+            conn.close()
+
+    stats = {
+        'rows': total_rows,
+        'load_seconds': load_time,
+        'index_seconds': index_time,
+        'rows_per_second': total_rows / load_time if load_time > 0 else float('inf')
+    }
+    logger.info(f"Ingestion terminée: {total_rows:,} lignes en {load_time:.2f} s "
+                f"({stats['rows_per_second']:,.0f} lignes/s), index en {index_time:.2f} s")
+    return stats
+
+def parse_pragma(text: str) -> Tuple[str, str]:
+    """
+    Convertit un argument 'nom=valeur' en couple (nom, valeur)
+    """
+    name, sep, value = text.partition('=')
+    if not sep or not name.isidentifier():
+        raise argparse.ArgumentTypeError(f"PRAGMA invalide: {text} (format attendu nom=valeur)")
+    return name, value
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion d'un CSV BankSim dans SQLite")
+    parser.add_argument('csv_path', type=Path, help="Fichier CSV au format BankSim")
+    parser.add_argument('--db', type=Path, default=DB_PATH, help="Base SQLite cible")
+    parser.add_argument('--replace', action='store_true',
+                        help="Remplace le contenu de la table au lieu de l'ajouter")
+    parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE,
+                        help="Nombre de lignes par appel à executemany")
+    parser.add_argument('--commit-every', type=int, default=INGEST_COMMIT_EVERY,
+                        help="Nombre de lignes par transaction")
+    parser.add_argument('--pragma', type=parse_pragma, action='append', default=[],
+                        help="PRAGMA appliqué pendant le chargement (ex: cache_size=-1000000)")
+    args = parser.parse_args()
+
+    ingest_csv(args.csv_path, db_path=args.db, replace=args.replace,
+               batch_size=args.batch_size, commit_every=args.commit_every,
+               pragmas=dict(args.pragma))
+
+if __name__ == '__main__':
+    setup_logging()
+    main()
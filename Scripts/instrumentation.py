@@ -0,0 +1,417 @@
+"""
+Instrumentation optionnelle du pipeline : intervalles, requêtes SQL, mémoire, profils
+
+Désactivée par défaut : span() retourne alors un objet inerte partagé et un
+point de mesure ne coûte qu'un appel de fonction. Une fois activée
+(INSTRUMENTATION_ENABLED ou `python main.py --instrument`), elle enregistre :
+- un intervalle par étape (type 'stage') et par sous-étape (type 'step',
+  fonctions décorées par @traced), imbriqués ;
+- chaque requête SQL (type 'sql') avec son texte, le nombre de lignes
+  retournées et l'origine du résultat (cache ou base) ;
+- pour chaque étape, le pic de mémoire résidente (VmHWM remis à zéro à
+  l'entrée de l'étape, Linux) et, avec INSTRUMENTATION_TRACEMALLOC, le pic
+  des allocations mesuré par tracemalloc (nettement plus coûteux) ;
+- avec INSTRUMENTATION_PROFILER ('cprofile' ou 'pyinstrument'), un profil
+  de chaque étape dans Results/profiles/.
+
+Les étapes exécutées dans les processus du pool (scheduler, figures)
+enregistrent leurs intervalles sur place ; ils sont renvoyés avec le résultat
+et rattachés à l'intervalle courant du processus principal.
+
+write_report() écrit à côté de Results/analysis.log le rapport JSON de
+l'exécution (run_report.json) et les piles repliées (run_report.folded, temps
+propre en microsecondes) lisibles par flamegraph.pl, speedscope ou inferno.
+"""
+
+import cProfile
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config import INSTRUMENTATION_PROFILER, INSTRUMENTATION_TRACEMALLOC, RESULTS_DIR
+from utils import reset_peak_rss, status_mb
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # dépendance optionnelle
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILERS = ('cprofile', 'pyinstrument')
+REPORT_NAME = 'run_report'
+PROFILES_DIRNAME = 'profiles'
+# Longueur maximale du texte des requêtes conservé dans le rapport
+SQL_TEXT_LENGTH = 300
+MB = 1024 * 1024
+
+class _NullSpan:
+    """
+    Intervalle inerte retourné quand l'instrumentation est désactivée
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    """
+    Intervalle mesuré ; `set()` ajoute des attributs (lignes lues...) au rapport
+    """
+    __slots__ = ('recorder', 'name', 'kind', 'attrs', 'id', 'path', 'parent_id', 'start', 'stage_state')
+
+    def __init__(self, recorder: 'Recorder', name: str, kind: str, attrs: Dict[str, Any]):
+        self.recorder = recorder
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> 'Span':
+        recorder = self.recorder
+        parent = recorder.current()
+        self.id = recorder.next_id()
+        self.parent_id = parent.id if parent is not None else None
+        self.path = (parent.path if parent is not None else ()) + (self.name,)
+        recorder.stack().append(self)
+        self.stage_state = recorder.enter_stage(self) if self.kind == 'stage' else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        end = time.perf_counter()
+        recorder = self.recorder
+        record = {
+            'id': self.id,
+            'parent': self.parent_id,
+            'nom': self.name,
+            'type': self.kind,
+            'chemin': list(self.path),
+            'pid': recorder.pid,
+            'debut_s': self.start - recorder.origin,
+            'duree_s': end - self.start
+        }
+        if self.attrs:
+            record['attributs'] = self.attrs
+        if exc_type is not None:
+            record['erreur'] = exc_type.__name__
+        if self.stage_state is not None:
+            record.update(recorder.exit_stage(self))
+        stack = recorder.stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        recorder.records.append(record)
+        return False
+
+class Recorder:
+    """
+    Intervalles enregistrés dans le processus courant
+    """
+
+    def __init__(self, use_tracemalloc: bool = INSTRUMENTATION_TRACEMALLOC,
+                 profiler: Optional[str] = INSTRUMENTATION_PROFILER,
+                 origin: Optional[float] = None, profiles_dir: Path = RESULTS_DIR / PROFILES_DIRNAME):
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Profileur inconnu: {profiler} (attendu : {', '.join(PROFILERS)})")
+        if profiler == 'pyinstrument' and Profiler is None:
+            raise ImportError("pyinstrument n'est pas installé (pip install pyinstrument)")
+        self.use_tracemalloc = use_tracemalloc
+        self.profiler = profiler
+        self.profiles_dir = profiles_dir
+        self.origin = time.perf_counter() if origin is None else origin
+        self.pid = os.getpid()
+        self.records: List[dict] = []
+        self._ids = itertools.count()
+        self._local = threading.local()
+        # Les threads (requêtes parallèles) rattachent leurs intervalles à
+        # l'intervalle courant du thread qui a créé l'enregistreur
+        self._main_stack = self.stack()
+        self._started_tracemalloc = use_tracemalloc and not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+
+    def settings(self) -> dict:
+        """
+        Réglages transmis aux processus du pool
+        """
+        return {'use_tracemalloc': self.use_tracemalloc, 'profiler': self.profiler,
+                'origin': self.origin, 'profiles_dir': self.profiles_dir}
+
+    def stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self) -> Optional[Span]:
+        stack = self.stack() or self._main_stack
+        return stack[-1] if stack else None
+
+    def next_id(self) -> str:
+        return f"{self.pid}:{next(self._ids)}"
+
+    def enter_stage(self, span: Span) -> dict:
+        """
+        Début d'une étape : remise à zéro des pics de mémoire, démarrage du profileur
+        """
+        state = {'rss_exact': reset_peak_rss(), 'rss_start': status_mb('VmRSS')}
+        if self.use_tracemalloc:
+            tracemalloc.reset_peak()
+            state['traced_start'] = tracemalloc.get_traced_memory()[0]
+        if self.profiler == 'cprofile':
+            state['profile'] = cProfile.Profile()
+            state['profile'].enable()
+        elif self.profiler == 'pyinstrument':
+            state['profile'] = Profiler()
+            state['profile'].start()
+        return state
+
+    def exit_stage(self, span: Span) -> dict:
+        """
+        Fin d'une étape : mesures de mémoire et profil
+        """
+        state = span.stage_state
+        measures = {}
+        profile = state.get('profile')
+        if profile is not None:
+            measures.update(self._save_profile(span, profile))
+        if self.use_tracemalloc:
+            measures['pic_tracemalloc_mo'] = (tracemalloc.get_traced_memory()[1] - state['traced_start']) / MB
+        peak = status_mb('VmHWM') if state['rss_exact'] else float('nan')
+        measures['pic_rss_mo'] = peak
+        measures['hausse_rss_mo'] = peak - state['rss_start']
+        return measures
+
+    def _save_profile(self, span: Span, profile) -> dict:
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        if self.profiler == 'cprofile':
+            profile.disable()
+            path = self.profiles_dir / f"{span.name}.prof"
+            profile.dump_stats(path)
+            return {'profil': str(path)}
+        session = profile.stop()
+        path = self.profiles_dir / f"{span.name}.html"
+        path.write_text(profile.output_html(), encoding='utf-8')
+        stacks = {}
+        _fold_frame(session.root_frame(), (), stacks)
+        return {'profil': str(path), 'piles': stacks}
+
+    def close(self) -> None:
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+def _fold_frame(frame, path: tuple, stacks: Dict[str, int]) -> None:
+    """
+    Piles repliées d'un arbre d'appels pyinstrument (temps propre en µs)
+    """
+    if frame is None:
+        return
+    path = path + (f"{frame.function} ({frame.file_path_short}:{frame.line_no})",)
+    self_time = frame.time - sum(child.time for child in frame.children)
+    if self_time > 0:
+        key = ';'.join(path)
+        stacks[key] = stacks.get(key, 0) + int(self_time * 1e6)
+    for child in frame.children:
+        _fold_frame(child, path, stacks)
+
+# Enregistreur du processus courant (None : instrumentation désactivée)
+_recorder: Optional[Recorder] = None
+
+def enable(use_tracemalloc: bool = INSTRUMENTATION_TRACEMALLOC,
+           profiler: Optional[str] = INSTRUMENTATION_PROFILER) -> Recorder:
+    """
+    Active l'instrumentation dans le processus courant
+    """
+    global _recorder
+    disable()
+    _recorder = Recorder(use_tracemalloc, profiler)
+    logger.info(f"Instrumentation activée (tracemalloc : {'oui' if use_tracemalloc else 'non'}, "
+                f"profileur : {profiler or 'aucun'})")
+    return _recorder
+
+def disable() -> None:
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+    _recorder = None
+
+def is_enabled() -> bool:
+    return _recorder is not None
+
+def settings() -> Optional[dict]:
+    """
+    Réglages à transmettre aux processus du pool (None si désactivée)
+    """
+    return _recorder.settings() if _recorder is not None else None
+
+def init_worker(worker_settings: Optional[dict]) -> None:
+    """
+    Enregistreur propre à un processus du pool (sans les intervalles hérités du parent)
+    """
+    global _recorder
+    _recorder = Recorder(**worker_settings) if worker_settings is not None else None
+
+def drain() -> List[dict]:
+    """
+    Retire et retourne les intervalles enregistrés (à renvoyer au processus principal)
+    """
+    if _recorder is None:
+        return []
+    records, _recorder.records = _recorder.records, []
+    return records
+
+def adopt(records: List[dict]) -> None:
+    """
+    Rattache les intervalles d'un processus du pool à l'intervalle courant
+    """
+    if _recorder is None or not records:
+        return
+    parent = _recorder.current()
+    ids = {record['id'] for record in records}
+    for record in records:
+        if record['parent'] not in ids:
+            record['parent'] = parent.id if parent is not None else None
+        if parent is not None:
+            record['chemin'] = list(parent.path) + record['chemin']
+    _recorder.records.extend(records)
+
+def span(name: str, kind: str = 'step', **attrs):
+    """
+    Intervalle mesuré (`with span('nom'):`), inerte si l'instrumentation est désactivée
+    """
+    if _recorder is None:
+        return NULL_SPAN
+    return Span(_recorder, name, kind, attrs)
+
+def sql_span(query: str, **attrs):
+    """
+    Intervalle d'une requête SQL ; le nombre de lignes est ajouté par `set(rows=...)`
+    """
+    if _recorder is None:
+        return NULL_SPAN
+    return Span(_recorder, 'sql', 'sql', {'query': ' '.join(query.split())[:SQL_TEXT_LENGTH], **attrs})
+
+def traced(func: Callable) -> Callable:
+    """
+    Décorateur : un intervalle (sous-étape) par appel de la fonction
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if _recorder is None:
+            return func(*args, **kwargs)
+        with Span(_recorder, func.__name__, 'step', {}):
+            return func(*args, **kwargs)
+    return wrapper
+
+def _children(records: List[dict]) -> Dict[Optional[str], List[dict]]:
+    children = {}
+    for record in records:
+        children.setdefault(record['parent'], []).append(record)
+    return children
+
+def folded_stacks(records: List[dict]) -> Dict[str, int]:
+    """
+    Piles repliées {pile: temps propre en µs} ; les étapes profilées par
+    pyinstrument sont remplacées par les piles d'appels mesurées
+    """
+    children = _children(records)
+    stacks = {}
+
+    def visit(record: dict) -> None:
+        prefix = ';'.join(record['chemin'])
+        if 'piles' in record:
+            for stack, micros in record['piles'].items():
+                stacks[f"{prefix};{stack}"] = stacks.get(f"{prefix};{stack}", 0) + micros
+            return
+        # Étapes parallèles : le temps propre ne peut pas être négatif
+        own = record['duree_s'] - sum(child['duree_s'] for child in children.get(record['id'], []))
+        if own > 0:
+            stacks[prefix] = stacks.get(prefix, 0) + int(own * 1e6)
+        for child in children.get(record['id'], []):
+            visit(child)
+
+    known = {record['id'] for record in records}
+    for record in records:
+        if record['parent'] is None or record['parent'] not in known:
+            visit(record)
+    return stacks
+
+def build_report(records: List[dict], total_seconds: float) -> dict:
+    """
+    Rapport de l'exécution : étapes, requêtes SQL agrégées par texte et intervalles
+    """
+    stages = [{
+        'etape': record['nom'],
+        'chemin': ';'.join(record['chemin']),
+        'pid': record['pid'],
+        'duree_s': record['duree_s'],
+        **{key: record[key] for key in ('pic_rss_mo', 'hausse_rss_mo', 'pic_tracemalloc_mo', 'profil', 'erreur')
+           if key in record}
+    } for record in records if record['type'] == 'stage']
+
+    queries = {}
+    for record in records:
+        if record['type'] != 'sql':
+            continue
+        attrs = record.get('attributs', {})
+        entry = queries.setdefault(attrs.get('query', ''), {'requete': attrs.get('query', ''), 'appels': 0,
+                                                             'duree_s': 0.0, 'lignes': 0, 'cache': 0})
+        entry['appels'] += 1
+        entry['duree_s'] += record['duree_s']
+        entry['lignes'] += attrs.get('rows', 0)
+        entry['cache'] += attrs.get('cache') == 'hit'
+
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'duree_s': total_seconds,
+        'tracemalloc': _recorder.use_tracemalloc if _recorder is not None else False,
+        'profileur': _recorder.profiler if _recorder is not None else None,
+        'etapes': stages,
+        'requetes_sql': sorted(queries.values(), key=lambda entry: -entry['duree_s']),
+        'intervalles': [{key: value for key, value in record.items() if key != 'piles'} for record in records]
+    }
+
+def write_report(directory: Path = RESULTS_DIR, name: str = REPORT_NAME) -> Optional[Path]:
+    """
+    Écrit le rapport JSON et les piles repliées de l'exécution
+
+    Returns:
+        Chemin du rapport JSON (None si l'instrumentation est désactivée)
+    """
+    if _recorder is None:
+        return None
+    records = list(_recorder.records)
+    report = build_report(records, time.perf_counter() - _recorder.origin)
+    report_path = directory / f"{name}.json"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1, ensure_ascii=False, default=str)
+    with open(directory / f"{name}.folded", 'w', encoding='utf-8') as f:
+        for stack, micros in sorted(folded_stacks(records).items()):
+            f.write(f"{stack} {micros}\n")
+
+    summary = '\n'.join(f"  {stage['chemin']:<40} {stage['duree_s']:8.2f} s"
+                        f"  pic RSS {stage.get('pic_rss_mo', float('nan')):7.0f} Mo"
+                        for stage in report['etapes'])
+    sql_seconds = sum(entry['duree_s'] for entry in report['requetes_sql'])
+    logger.info(f"Rapport d'instrumentation écrit dans {report_path} ({len(records)} intervalles, "
+                f"{sum(entry['appels'] for entry in report['requetes_sql'])} requêtes SQL "
+                f"en {sql_seconds:.2f} s) :\n{summary}")
+    return report_path
@@ -2,19 +2,33 @@
 Script principal pour l'analyse des données bancaires
 """
 
+import argparse
 import logging
 from pathlib import Path
 import time
 import pandas as pd
-from typing import Dict
+from typing import Any, Dict, List, Optional
 
 from config import (
-    LOGGING_FORMAT,
-    LOGGING_LEVEL,
+    AMOUNT_SKETCHES_ENABLED,
+    ANALYSIS_JOBS,
+    CYCLE_PROFILE_DIMENSIONS,
+    FIGURE_WORKERS,
+    INCREMENTAL_AGGREGATES,
+    INSTRUMENTATION_ENABLED,
+    INSTRUMENTATION_PROFILER,
+    INSTRUMENTATION_TRACEMALLOC,
     RESULTS_DIR
 )
 
-from data_loader import load_data, get_data_info
+import instrumentation
+from context import AnalysisContext
+from data_cube import DataCube
+from data_loader import load_data
+from dataset_summary import get_dataset_summary
+from aggregate_store import AggregateStore
+from scheduler import Stage, required_columns, run_stages, select_stages
+from figures import render_figures
 from descriptive_analysis import perform_descriptive_analysis
 from temporal_analysis import perform_temporal_analysis
 from fraud_analysis import perform_fraud_analysis
@@ -22,111 +36,235 @@ from anomaly_detection import perform_anomaly_detection
 from visualization import generate_visualizations
 from generate_kpi_dashboard import create_kpi_dashboard
 from temporal_patterns_analysis import analyze_temporal_patterns
-from cycle_analysis import analyze_cycles
+from cycle_analysis import analyze_cycle_profiles, analyze_cycles
 from amount_distribution_analysis import analyze_amount_distribution
-
-# Configuration du logging
-logging.basicConfig(
-    level=LOGGING_LEVEL,
-    format=LOGGING_FORMAT
-)
+from utils import setup_logging
 
 logger = logging.getLogger(__name__)
 
-def format_results_summary(info: pd.Series, temporal_stats: dict, cycle_stats: dict, amount_stats: dict) -> str:
+def format_results_summary(info: Optional[pd.Series], temporal_stats: Optional[dict] = None,
+                           cycle_stats: Optional[dict] = None, amount_stats: Optional[dict] = None,
+                           figures: bool = True) -> str:
     """
-    Formate le résumé des résultats pour l'affichage
+    Formate le résumé des résultats pour l'affichage (une section par
+    résultat fourni : les étapes non exécutées sont omises)
     """
-    return f"""
-Résumé de l'analyse :
-
-1. Statistiques Générales
-------------------------
+    sections = []
+    if info is not None:
+        sections.append(('Statistiques Générales', f"""\
 Nombre total de transactions : {info['total_transactions']:,}
 Taux de fraude global : {info['fraud_rate']:.2f}%
-Montant total des transactions : {info['total_amount']:,.2f} €
-
-2. Patterns Temporels
---------------------
+Montant total des transactions : {info['total_amount']:,.2f} €"""))
+    if temporal_stats is not None:
+        sections.append(('Patterns Temporels', f"""\
 Jour le plus actif : {temporal_stats['Jour le plus actif']:.0f} ({temporal_stats['Nombre max de transactions']:,.0f} transactions)
 Jour avec le plus haut taux de fraude : {temporal_stats['Jour le plus risqué']:.0f} ({temporal_stats['Taux de fraude max']:.2f}%)
-Montant moyen des transactions : {temporal_stats['Montant moyen global']:.2f} €
-
-3. Analyse des Cycles
---------------------
+Montant moyen des transactions : {temporal_stats['Montant moyen global']:.2f} €"""))
+    if cycle_stats is not None:
+        sections.append(('Analyse des Cycles', f"""\
 Distance moyenne entre les pics : {cycle_stats['distance_moyenne_pics']:.1f} jours
 Jour le plus actif : {cycle_stats['jour_plus_actif']}
 Jour le moins actif : {cycle_stats['jour_moins_actif']}
-Variation hebdomadaire : {cycle_stats['variation_hebdomadaire']:.1f}%
-
-4. Distribution des Montants
----------------------------
+Variation hebdomadaire : {cycle_stats['variation_hebdomadaire']:.1f}%"""))
+    if amount_stats is not None:
+        sections.append(('Distribution des Montants', f"""\
 Montant minimum : {amount_stats['minimum']:.2f} €
 Montant maximum : {amount_stats['maximum']:.2f} € ({amount_stats['max_categorie']})
 Montant médian : {amount_stats['mediane']:.2f} €
 {amount_stats['pct_inf_100']:.1f}% des transactions ≤ 100€
-Asymétrie : {amount_stats['skewness']:.2f} (distribution très asymétrique)
+Asymétrie : {amount_stats['skewness']:.2f} (distribution très asymétrique)"""))
 
-Les résultats détaillés ont été sauvegardés dans : {RESULTS_DIR}
-Les visualisations ont été sauvegardées dans : {RESULTS_DIR / 'Figures'}
-"""
+    summary = "\nRésumé de l'analyse :\n\n"
+    for number, (title, body) in enumerate(sections, start=1):
+        summary += f"{number}. {title}\n{'-' * (len(title) + 2)}\n{body}\n\n"
+    summary += f"Les résultats détaillés ont été sauvegardés dans : {RESULTS_DIR}\n"
+    if figures:
+        summary += f"Les visualisations ont été sauvegardées dans : {RESULTS_DIR / 'Figures'}\n"
+    return summary
 
-def main():
+def build_cube(df: pd.DataFrame, deps: Dict[str, Any]) -> DataCube:
+    """
+    Cube de données partagé par les rapports groupés
+    """
+    if INCREMENTAL_AGGREGATES:
+        # Cube de données persisté : seules les nouvelles lignes sont agrégées
+        logger.info("Rafraîchissement incrémental des agrégats")
+        cube = AggregateStore.refresh().cube
+    else:
+        cube = DataCube.from_frame(df)
+    logger.info(f"Informations sur le dataset :\n{pd.Series(get_dataset_summary(cube))}")
+    return cube
+
+def _context(df: pd.DataFrame, deps: Dict[str, Any]) -> AnalysisContext:
+    return AnalysisContext(df, cube=deps.get('cube'))
+
+def run_descriptive(df, deps):
+    return perform_descriptive_analysis(deps['cube'])
+
+def run_temporal(df, deps):
+    return perform_temporal_analysis(deps['cube'])
+
+def run_fraud(df, deps):
+    return perform_fraud_analysis(deps['cube'])
+
+def run_anomalies(df, deps):
+    return perform_anomaly_detection(df)
+
+# Les étapes produisant des figures retournent (résultat, figures à rendre) :
+# les figures sont rendues ensemble à la fin (voir figures.render_figures)
+
+def run_visualizations(df, deps):
+    logger.info("Génération des visualisations de base")
+    figures = []
+    generate_visualizations(df, RESULTS_DIR, deps['cube'], figures=figures)
+    return None, figures
+
+def run_kpi_dashboard(df, deps):
+    logger.info("Génération du dashboard KPI")
+    figures = []
+    create_kpi_dashboard(_context(df, deps), figures=figures)
+    return None, figures
+
+def run_temporal_patterns(df, deps):
+    logger.info("Analyse des patterns temporels")
+    figures = []
+    return analyze_temporal_patterns(_context(df, deps), figures=figures), figures
+
+def run_cycles(df, deps):
+    logger.info("Analyse des cycles")
+    figures = []
+    ctx = _context(df, deps)
+    stats = analyze_cycles(ctx, figures=figures)
+    for dimension in CYCLE_PROFILE_DIMENSIONS:
+        analyze_cycle_profiles(ctx, by=dimension)
+    return stats, figures
+
+def run_amount_distribution(df, deps):
+    logger.info("Analyse de la distribution des montants")
+    figures = []
+    return analyze_amount_distribution(_context(df, deps), figures=figures), figures
+
+# Graphe des étapes : seules les dépendances déclarées imposent un ordre. Les
+# colonnes déclarées déterminent celles chargées par load_data : le cube persisté
+# (INCREMENTAL_AGGREGATES) et les esquisses de montants (AMOUNT_SKETCHES_ENABLED)
+# ne lisent pas le DataFrame ; les anomalies et les visualisations de base
+# (valeurs manquantes) lisent toutes les colonnes
+STAGES = [
+    Stage('cube', build_cube, columns=() if INCREMENTAL_AGGREGATES else None),
+    Stage('descriptive', run_descriptive, ('cube',), ()),
+    Stage('temporal', run_temporal, ('cube',), ()),
+    Stage('fraud', run_fraud, ('cube',), ()),
+    Stage('anomalies', run_anomalies),
+    Stage('visualizations', run_visualizations, ('cube',)),
+    Stage('kpi_dashboard', run_kpi_dashboard, ('cube',), ()),
+    Stage('temporal_patterns', run_temporal_patterns, ('cube',), ()),
+    Stage('cycles', run_cycles, ('cube',), ()),
+    Stage('amount_distribution', run_amount_distribution,
+          columns=() if AMOUNT_SKETCHES_ENABLED else ('amount', 'category', 'fraud'))
+]
+FIGURE_STAGES = ['visualizations', 'kpi_dashboard', 'temporal_patterns', 'cycles', 'amount_distribution']
+
+# Noms de rapports acceptés par --stages en plus des noms d'étapes
+STAGE_ALIASES = {
+    'kpi': ['kpi_dashboard'],
+    'patterns': ['temporal_patterns'],
+    'amounts': ['amount_distribution'],
+    'figures': FIGURE_STAGES
+}
+
+def resolve_stage_names(names: List[str]) -> List[str]:
+    """
+    Noms d'étapes correspondant aux étapes ou rapports demandés
+    """
+    stage_names = [stage.name for stage in STAGES]
+    resolved = []
+    for name in names:
+        if name not in stage_names and name not in STAGE_ALIASES:
+            raise ValueError(f"Étape ou rapport inconnu : {name} "
+                             f"(choix : {', '.join([*stage_names, *STAGE_ALIASES])})")
+        resolved.extend(candidate for candidate in STAGE_ALIASES.get(name, [name]) if candidate not in resolved)
+    return resolved
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Analyse des données bancaires")
+    parser.add_argument('--jobs', '-j', type=int, default=ANALYSIS_JOBS,
+                        help="Nombre de processus pour les étapes indépendantes (0 : tous les cœurs)")
+    parser.add_argument('--figure-workers', type=int, default=FIGURE_WORKERS,
+                        help="Nombre de processus de rendu des figures (0 : tous les cœurs)")
+    parser.add_argument('--preview', action='store_true',
+                        help="Figures en mode aperçu (résolution réduite, sans recadrage)")
+    parser.add_argument('--instrument', action='store_true', default=INSTRUMENTATION_ENABLED,
+                        help="Mesure les étapes, sous-étapes et requêtes SQL (Results/run_report.json)")
+    parser.add_argument('--tracemalloc', action='store_true', default=INSTRUMENTATION_TRACEMALLOC,
+                        help="Avec --instrument : pic d'allocations par étape (tracemalloc, coûteux)")
+    parser.add_argument('--profile', choices=instrumentation.PROFILERS, default=INSTRUMENTATION_PROFILER,
+                        help="Avec --instrument : profil de chaque étape (Results/profiles/)")
+    parser.add_argument('--stages', '-s', nargs='+', metavar='ETAPE',
+                        help="Étapes ou rapports à exécuter, avec les étapes dont ils dépendent "
+                             f"(par défaut toutes) : {', '.join([stage.name for stage in STAGES] + list(STAGE_ALIASES))}")
+    parser.add_argument('--no-figures', action='store_true',
+                        help="Résultats (CSV) uniquement : aucune figure rendue, matplotlib n'est pas importé")
+    args = parser.parse_args(argv)
+    if args.stages:
+        try:
+            args.stages = resolve_stage_names(args.stages)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+def main(argv=None):
     """
     Fonction principale qui orchestre l'analyse
     """
+    args = parse_args(argv)
+    setup_logging()
     start_time = time.time()
     
     logger.info("Début de l'analyse des données bancaires")
+    if args.instrument:
+        instrumentation.enable(args.tracemalloc, args.profile)
     
-    # Chargement des données
-    df = load_data()
-    
-    # Informations de base sur le dataset
-    info = get_data_info()
-    logger.info(f"Informations sur le dataset :\n{pd.Series(info)}")
+    # Étapes demandées et leurs dépendances, colonnes qu'elles lisent
+    stages = select_stages(STAGES, args.stages) if args.stages else STAGES
+    columns = required_columns(stages)
+    if args.stages:
+        logger.info(f"Étapes exécutées : {', '.join(stage.name for stage in stages)}")
     
     try:
-        # Analyse descriptive
-        descriptive_results = perform_descriptive_analysis(df)
-        
-        # Analyse temporelle
-        temporal_results = perform_temporal_analysis(df)
-        
-        # Analyse des fraudes
-        fraud_results = perform_fraud_analysis(df)
-        
-        # Détection d'anomalies
-        anomaly_results = perform_anomaly_detection(df)
-        
-        # Génération des visualisations de base
-        logger.info("Génération des visualisations de base")
-        generate_visualizations(df, RESULTS_DIR)
-        
-        # Génération du dashboard KPI
-        logger.info("Génération du dashboard KPI")
-        create_kpi_dashboard()
-        
-        # Analyse des patterns temporels
-        logger.info("Analyse des patterns temporels")
-        temporal_stats = analyze_temporal_patterns()
-        
-        # Analyse des cycles
-        logger.info("Analyse des cycles")
-        cycle_stats = analyze_cycles()
+        # Chargement des données (unique lecture de la table, partagée par toutes les analyses)
+        with instrumentation.span('load_data', kind='stage'):
+            if columns == []:
+                logger.info("Aucune étape ne lit les transactions : chargement ignoré")
+                df = pd.DataFrame()
+            else:
+                df = load_data(columns=columns)
         
-        # Analyse de la distribution des montants
-        logger.info("Analyse de la distribution des montants")
-        amount_stats = analyze_amount_distribution()
+        results = run_stages(stages, df, jobs=args.jobs)
         
+        # Rendu des figures, chacune dans un processus dédié
+        figure_stages = [name for name in FIGURE_STAGES if name in results]
+        if args.no_figures:
+            logger.info("Figures non rendues (--no-figures)")
+        elif figure_stages:
+            logger.info("Rendu des figures")
+            figure_jobs = [job for name in figure_stages for job in results[name][1]]
+            with instrumentation.span('render_figures', kind='stage'):
+                render_figures(figure_jobs, workers=args.figure_workers, preview=args.preview)
+        results.update({name: results[name][0] for name in figure_stages})
     except Exception as e:
         logger.error(f"Erreur lors de l'analyse : {str(e)}")
         raise
+    finally:
+        # Rapport écrit aussi en cas d'échec, pour localiser l'étape fautive
+        instrumentation.write_report()
     
-    # Afficher le résumé
+    # Afficher le résumé (relu depuis le cache rempli par l'étape 'cube')
+    info = pd.Series(get_dataset_summary(results['cube'])) if 'cube' in results else None
     execution_time = time.time() - start_time
     logger.info(f"Analyse terminée en {execution_time:.2f} secondes")
-    print(format_results_summary(pd.Series(info), temporal_stats, cycle_stats, amount_stats))
+    print(format_results_summary(info, results.get('temporal_patterns'), results.get('cycles'),
+                                 results.get('amount_distribution'),
+                                 figures=bool(figure_stages) and not args.no_figures))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,251 @@
+"""
+Détection en ligne des transactions anormales
+
+Le scoreur maintient, pour chaque catégorie, chaque client et chaque
+commerçant, le nombre de transactions, la moyenne et la somme des carrés des
+écarts des montants (algorithme de Welford, dans sa variante par lots de
+Chan et al.). Un lot de nouvelles transactions est noté en O(taille du lot)
+contre l'historique, avec la même règle que
+anomaly_detection.detect_transaction_anomalies (|z-score| > 3) et les mêmes
+libellés `anomaly_type`, puis intégré aux statistiques.
+
+Les statistiques sont enregistrées dans le cache colonnaire avec le dernier id
+traité : `python online_scorer.py` note uniquement les transactions ajoutées
+depuis l'exécution précédente.
+"""
+
+import logging
+import time
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from config import STREAMING_CHUNK_SIZE
+from data_loader import get_db_connection, iter_rows_after
+from frame_cache import load_frame, read_fingerprint, save_frame
+from utils import save_results, setup_logging
+
+logger = logging.getLogger(__name__)
+
+SCORER_VERSION = 1
+STATS_NAME = 'online_scorer_{level}'
+LEVELS = ['category', 'customer', 'merchant']
+ZSCORE_THRESHOLD = 3
+
+RESULT_COLUMNS = [
+    'step', 'customer', 'age', 'gender', 'merchant', 'category',
+    'amount', 'fraud', 'amount_zscore', 'anomaly_type'
+]
+
+class RunningMoments:
+    """
+    Moments courants des montants (effectif, moyenne, M2) par modalité d'une colonne
+    """
+
+    def __init__(self, keys: pd.Index, count: np.ndarray, mean: np.ndarray, m2: np.ndarray):
+        self.keys = keys
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def empty(cls) -> 'RunningMoments':
+        return cls(pd.Index([], dtype=object), np.zeros(0, dtype=np.int64),
+                   np.zeros(0), np.zeros(0))
+
+    def update(self, keys: pd.Series, amounts: pd.Series) -> None:
+        """
+        Intègre un lot : moments du lot par modalité, combinés à l'historique
+        (seules les modalités présentes dans le lot sont modifiées)
+        """
+        grouped = pd.Series(amounts.to_numpy(dtype=float)).groupby(keys.astype(str).to_numpy())
+        batch_count = grouped.size()
+        batch_mean = grouped.mean()
+        batch_m2 = grouped.var(ddof=0).fillna(0) * batch_count
+
+        positions = self.keys.get_indexer(batch_count.index)
+        known = positions >= 0
+
+        # Modalités déjà vues : combinaison des moments (Chan et al.)
+        pos = positions[known]
+        n_a, n_b = self.count[pos], batch_count.to_numpy()[known]
+        n = n_a + n_b
+        delta = batch_mean.to_numpy()[known] - self.mean[pos]
+        self.mean[pos] += delta * n_b / n
+        self.m2[pos] += batch_m2.to_numpy()[known] + delta ** 2 * n_a * n_b / n
+        self.count[pos] = n
+
+        # Nouvelles modalités : moments du lot
+        if (~known).any():
+            self.keys = self.keys.append(batch_count.index[~known])
+            self.count = np.concatenate([self.count, batch_count.to_numpy()[~known]])
+            self.mean = np.concatenate([self.mean, batch_mean.to_numpy()[~known]])
+            self.m2 = np.concatenate([self.m2, batch_m2.to_numpy()[~known]])
+
+    def lookup(self, keys: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Moyenne et écart-type (ddof=1, comme pandas) de chaque ligne du lot,
+        NaN pour une modalité inconnue ou vue une seule fois
+        """
+        positions = self.keys.get_indexer(keys.astype(str).to_numpy())
+        known = positions >= 0
+        mean = np.full(len(positions), np.nan)
+        std = np.full(len(positions), np.nan)
+        count = self.count[positions[known]]
+        mean[known] = self.mean[positions[known]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std[known] = np.where(count > 1, np.sqrt(self.m2[positions[known]] / (count - 1)), np.nan)
+        return mean, std
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({'key': self.keys.to_numpy(dtype=object), 'count': self.count,
+                             'mean': self.mean, 'm2': self.m2})
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'RunningMoments':
+        return cls(pd.Index(frame['key'].astype(str).to_numpy(dtype=object)),
+                   frame['count'].to_numpy(dtype=np.int64).copy(),
+                   frame['mean'].to_numpy(dtype=float).copy(),
+                   frame['m2'].to_numpy(dtype=float).copy())
+
+class OnlineAnomalyScorer:
+    """
+    Moments courants par catégorie, client et commerçant, et marque de
+    progression (dernier id et dernier step intégrés)
+    """
+
+    def __init__(self, moments: Dict[str, RunningMoments], state: dict):
+        self.moments = moments
+        self.state = state
+
+    @classmethod
+    def empty(cls) -> 'OnlineAnomalyScorer':
+        state = {'version': SCORER_VERSION, 'max_id': 0, 'max_step': None, 'rows': 0}
+        return cls({level: RunningMoments.empty() for level in LEVELS}, state)
+
+    def update(self, batch: pd.DataFrame) -> None:
+        """
+        Intègre un lot de transactions nettoyées aux statistiques
+        """
+        if batch.empty:
+            return
+        for level in LEVELS:
+            self.moments[level].update(batch[level], batch['amount'])
+        self.state['rows'] += len(batch)
+        if 'id' in batch:
+            self.state['max_id'] = max(self.state['max_id'], int(batch['id'].max()))
+        batch_max_step = int(batch['step'].max())
+        self.state['max_step'] = (batch_max_step if self.state['max_step'] is None
+                                  else max(self.state['max_step'], batch_max_step))
+
+    def zscores(self, batch: pd.DataFrame, level: str = 'category') -> np.ndarray:
+        """
+        Z-score du montant de chaque transaction par rapport à l'historique de
+        sa catégorie (ou de son client / commerçant)
+        """
+        mean, std = self.moments[level].lookup(batch[level])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (batch['amount'].to_numpy(dtype=float) - mean) / std
+
+    def score(self, batch: pd.DataFrame, level: str = 'category') -> pd.DataFrame:
+        """
+        Transactions anormales du lot (|z-score| > 3), au format de
+        anomaly_detection.detect_transaction_anomalies ; les z-scores par
+        rapport au client et au commerçant sont ajoutés pour contexte
+        """
+        scored = batch.copy()
+        scored['amount_zscore'] = self.zscores(batch, level)
+        for other in LEVELS:
+            if other != level:
+                scored[f'{other}_zscore'] = self.zscores(batch, other)
+
+        anomalies = scored[abs(scored['amount_zscore']) > ZSCORE_THRESHOLD].copy()
+        anomalies['anomaly_type'] = np.where(
+            anomalies['amount_zscore'] > ZSCORE_THRESHOLD,
+            'montant_élevé',
+            'montant_faible'
+        )
+        context = [f'{other}_zscore' for other in LEVELS if other != level]
+        return anomalies[RESULT_COLUMNS + context].sort_values('amount_zscore', ascending=False)
+
+    def score_and_update(self, batch: pd.DataFrame, level: str = 'category') -> pd.DataFrame:
+        """
+        Note le lot contre l'historique puis l'intègre aux statistiques
+        """
+        anomalies = self.score(batch, level)
+        self.update(batch)
+        return anomalies
+
+    @classmethod
+    def load(cls) -> Optional['OnlineAnomalyScorer']:
+        """
+        Relit les statistiques enregistrées, ou None si elles sont absentes ou incompatibles
+        """
+        state = read_fingerprint(STATS_NAME.format(level=LEVELS[0]))
+        if state is None or state.get('version') != SCORER_VERSION:
+            return None
+        moments = {}
+        for level in LEVELS:
+            frame = load_frame(state, STATS_NAME.format(level=level))
+            if frame is None:
+                return None
+            moments[level] = RunningMoments.from_frame(frame)
+        return cls(moments, state)
+
+    def save(self) -> None:
+        # Le niveau dont l'empreinte est relue par load() est écrit en dernier
+        for level in reversed(LEVELS):
+            save_frame(self.moments[level].to_frame(), self.state, STATS_NAME.format(level=level))
+
+    @classmethod
+    def refresh(cls, chunk_size: int = STREAMING_CHUNK_SIZE) -> Tuple['OnlineAnomalyScorer', pd.DataFrame]:
+        """
+        Note les transactions ajoutées depuis la dernière exécution puis les
+        intègre aux statistiques (construction complète, sans notation, si
+        aucune statistique n'existe ou si des lignes déjà intégrées ont changé)
+
+        Returns:
+            (scoreur mis à jour, transactions anormales parmi les nouvelles lignes)
+        """
+        scorer = cls.load()
+        conn = get_db_connection()
+
+        if scorer is not None:
+            rows, max_step = conn.execute(
+                "SELECT COUNT(*), MAX(step) FROM transactions WHERE id <= ?",
+                (scorer.state['max_id'],)
+            ).fetchone()
+            if rows != scorer.state['rows'] or max_step != scorer.state['max_step']:
+                logger.warning("Des lignes déjà intégrées ont changé : reconstruction complète du scoreur")
+                scorer = None
+        initial_build = scorer is None
+        if initial_build:
+            logger.info("Construction complète des statistiques du scoreur")
+            scorer = cls.empty()
+
+        start = time.perf_counter()
+        last_id = scorer.state['max_id']
+        rows_before = scorer.state['rows']
+        anomalies = []
+        for chunk in iter_rows_after(last_id, chunk_size):
+            if chunk.empty:
+                continue
+            if initial_build:
+                scorer.update(chunk)
+            else:
+                anomalies.append(scorer.score_and_update(chunk))
+
+        new_rows = scorer.state['rows'] - rows_before
+        result = (pd.concat(anomalies).sort_values('amount_zscore', ascending=False)
+                  if anomalies else pd.DataFrame(columns=RESULT_COLUMNS))
+        if new_rows:
+            scorer.save()
+        logger.info(f"{new_rows} nouvelles transactions intégrées (id > {last_id}), "
+                    f"{len(result)} anomalies en {time.perf_counter() - start:.2f} s")
+        return scorer, result
+
+if __name__ == '__main__':
+    setup_logging()
+    _, anomalies = OnlineAnomalyScorer.refresh()
+    if not anomalies.empty:
+        save_results(anomalies, 'anomaly_online_transactions')
@@ -0,0 +1,190 @@
+"""
+Détection des périodicités des séries journalières (FFT)
+
+Toutes les fonctions acceptent une série (tableau 1-D) ou un lot de séries
+de même longueur (tableau 2-D, une série par ligne, par exemple une par
+commerçant) et calculent le résultat de toutes les séries en une seule passe
+vectorisée :
+- autocorrelation : fonction d'autocorrélation complète, par FFT ;
+- periodogram / dominant_periods : spectre de puissance et périodes dominantes ;
+- autocorrelation_period : période lue sur le plus haut pic d'autocorrélation ;
+- weekday_profile / seasonal_indices : moyenne, écart-type et indice
+  saisonnier de chaque jour du cycle (jour de la semaine par défaut).
+
+Les séries doivent être régulières (un point par step, 0 pour un step sans
+transaction : voir series_matrix).
+"""
+
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+
+from config import CYCLE_PERIOD, FIRST_STEP_WEEKDAY
+
+WEEKDAY_NAMES = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+def _as_2d(x: np.ndarray) -> np.ndarray:
+    return np.atleast_2d(np.asarray(x, dtype=float))
+
+def _restore_shape(result: np.ndarray, x: np.ndarray) -> np.ndarray:
+    return result[0] if np.ndim(x) == 1 else result
+
+def series_matrix(stats: pd.DataFrame, by: str, value: str = 'transactions') -> pd.DataFrame:
+    """
+    Met un roll-up par (by, step) sous forme de matrice séries × steps, avec
+    tous les steps entre le premier et le dernier (0 pour un step absent)
+    """
+    matrix = stats[value].unstack('step', fill_value=0)
+    steps = np.arange(matrix.columns.min(), matrix.columns.max() + 1)
+    return matrix.reindex(columns=steps, fill_value=0)
+
+def autocorrelation(x: np.ndarray, max_lag: int = None) -> np.ndarray:
+    """
+    Autocorrélation de chaque série pour les décalages 0 à max_lag (tous par
+    défaut), même estimateur que pandas.plotting.autocorrelation_plot ; NaN
+    pour une série constante
+    """
+    values = _as_2d(x)
+    n = values.shape[1]
+    centered = values - values.mean(axis=1, keepdims=True)
+    # Zéros ajoutés pour obtenir la corrélation linéaire (et non circulaire)
+    size = 1 << int(2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(centered, size, axis=1)
+    acov = np.fft.irfft(spectrum * np.conj(spectrum), size, axis=1)[:, :n]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acf = acov / acov[:, :1]
+    if max_lag is not None:
+        acf = acf[:, :max_lag + 1]
+    return _restore_shape(acf, x)
+
+def periodogram(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Périodogramme de chaque série (moyenne retirée)
+
+    Returns:
+        (périodes en steps des fréquences 1..n/2, puissance de chaque série à
+        ces périodes)
+    """
+    values = _as_2d(x)
+    n = values.shape[1]
+    centered = values - values.mean(axis=1, keepdims=True)
+    power = np.abs(np.fft.rfft(centered, axis=1)[:, 1:]) ** 2 / n
+    periods = n / np.arange(1, power.shape[1] + 1)
+    return periods, _restore_shape(power, x)
+
+def dominant_periods(x: np.ndarray, n_periods: int = 3,
+                     min_cycles: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Périodes les plus marquées de chaque série, parmi celles observées au
+    moins `min_cycles` fois sur la durée de la série
+
+    Returns:
+        (périodes, part de la puissance totale de chacune), tableaux
+        séries × n_periods triés par puissance décroissante
+    """
+    periods, power = periodogram(x)
+    power = _as_2d(power)[:, min_cycles - 1:]
+    periods = periods[min_cycles - 1:]
+    n_periods = min(n_periods, power.shape[1])
+    top = np.argsort(-power, axis=1, kind='stable')[:, :n_periods]
+    total = power.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.take_along_axis(power, top, axis=1) / total
+    result_periods = np.where(total > 0, periods[top], np.nan)
+    return _restore_shape(result_periods, x), _restore_shape(share, x)
+
+def autocorrelation_period(acf: np.ndarray, min_lag: int = 2) -> np.ndarray:
+    """
+    Période de chaque série lue sur son autocorrélation : décalage du plus
+    haut maximum local (entre min_lag et la moitié de la série), NaN sans
+    maximum local. Plus fiable que le périodogramme pour une période qui ne
+    divise pas la longueur de la série (l'énergie du pic se répartit alors
+    entre plusieurs fréquences et une harmonique peut l'emporter).
+    """
+    values = _as_2d(acf)
+    max_lag = values.shape[1] // 2
+    inner = values[:, min_lag:max_lag]
+    before = values[:, min_lag - 1:max_lag - 1]
+    after = values[:, min_lag + 1:max_lag + 1]
+    is_peak = (inner > before) & (inner >= after)
+    candidates = np.where(is_peak, inner, -np.inf)
+    lags = candidates.argmax(axis=1) + min_lag
+    result = np.where(is_peak.any(axis=1), lags, np.nan)
+    return result[0] if np.ndim(acf) == 1 else result
+
+def weekday_positions(steps: np.ndarray, period: int = CYCLE_PERIOD,
+                      offset: int = FIRST_STEP_WEEKDAY) -> np.ndarray:
+    """
+    Position de chaque step dans le cycle (jour de la semaine, 0 = lundi)
+    """
+    return (np.asarray(steps) + offset) % period
+
+def weekday_profile(x: np.ndarray, steps: np.ndarray, period: int = CYCLE_PERIOD,
+                    offset: int = FIRST_STEP_WEEKDAY) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Moyenne et écart-type (ddof=1) de chaque série pour chaque jour du cycle
+
+    Returns:
+        (moyennes, écarts-types), tableaux séries × period
+    """
+    values = _as_2d(x)
+    days = np.eye(period)[weekday_positions(steps, period, offset)]
+    counts = days.sum(axis=0)
+    sums = values @ days
+    squares = (values ** 2) @ days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / counts
+        variance = (squares - sums * mean) / (counts - 1)
+    std = np.sqrt(np.clip(variance, 0, None))
+    return _restore_shape(mean, x), _restore_shape(std, x)
+
+def seasonal_indices(x: np.ndarray, steps: np.ndarray, period: int = CYCLE_PERIOD,
+                     offset: int = FIRST_STEP_WEEKDAY) -> np.ndarray:
+    """
+    Indice saisonnier de chaque jour du cycle : moyenne du jour rapportée à la
+    moyenne des jours (1 = jour moyen)
+    """
+    mean, _ = weekday_profile(x, steps, period, offset)
+    mean = _as_2d(mean)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        indices = mean / mean.mean(axis=1, keepdims=True)
+    return _restore_shape(indices, x)
+
+def day_names(period: int = CYCLE_PERIOD) -> List[str]:
+    return WEEKDAY_NAMES if period == len(WEEKDAY_NAMES) else [f"jour_{day}" for day in range(period)]
+
+def periodicity_profiles(matrix: pd.DataFrame, period: int = CYCLE_PERIOD,
+                         offset: int = FIRST_STEP_WEEKDAY, n_periods: int = 3) -> pd.DataFrame:
+    """
+    Profil de périodicité de chaque série de la matrice (séries × steps) :
+    périodes dominantes et leur part de puissance, période d'autocorrélation,
+    autocorrélation à la période du cycle et indices saisonniers de chaque jour
+
+    Returns:
+        DataFrame indexé comme la matrice, une ligne par série
+    """
+    values = matrix.to_numpy(dtype=float)
+    steps = matrix.columns.to_numpy()
+    periods, shares = dominant_periods(values, n_periods)
+    acf = autocorrelation(values)
+    indices = seasonal_indices(values, steps, period, offset)
+    names = day_names(period)
+
+    profiles = pd.DataFrame(index=matrix.index)
+    profiles['transactions'] = values.sum(axis=1).astype(np.int64)
+    for rank in range(periods.shape[1]):
+        profiles[f'periode_{rank + 1}'] = periods[:, rank].round(2)
+        profiles[f'part_puissance_{rank + 1}'] = shares[:, rank].round(4)
+    profiles['periode_autocorrelation'] = autocorrelation_period(acf)
+    profiles[f'autocorrelation_lag_{period}'] = acf[:, period].round(4) if acf.shape[1] > period else np.nan
+    for day, name in enumerate(names):
+        profiles[f'indice_{name}'] = indices[:, day].round(4)
+
+    # Pas de jour le plus (ou moins) actif pour une série plate ou vide
+    with np.errstate(invalid='ignore'):
+        valid = np.nanmax(indices, axis=1, initial=-np.inf) > np.nanmin(indices, axis=1, initial=np.inf)
+    profiles['jour_plus_actif'] = None
+    profiles['jour_moins_actif'] = None
+    profiles.loc[valid, 'jour_plus_actif'] = np.array(names)[np.nanargmax(indices[valid], axis=1)]
+    profiles.loc[valid, 'jour_moins_actif'] = np.array(names)[np.nanargmin(indices[valid], axis=1)]
+    return profiles
@@ -0,0 +1,219 @@
+"""
+Cache des résultats des requêtes SQL (data_loader.execute_query, async_queries)
+
+Un résultat est identifié par le texte SQL normalisé (commentaires et espaces
+superflus retirés, littéraux conservés), ses paramètres et la version de la
+base : taille et date de modification du fichier, état du WAL, id maximal. Dès
+que la base change, les anciens résultats ne sont plus jamais relus.
+
+Deux niveaux :
+- en mémoire, les QUERY_CACHE_MEMORY_ENTRIES derniers résultats utilisés (LRU) ;
+- sur disque, dans Cache/queries/, au format du cache colonnaire
+  (frame_cache), limité à QUERY_CACHE_MAX_BYTES : les résultats les moins
+  récemment relus sont supprimés en premier.
+
+Les succès et défauts de cache sont comptés et résumés dans le log en fin
+d'exécution.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+import pandas as pd
+
+from config import CACHE_DIR, QUERY_CACHE_MAX_BYTES, QUERY_CACHE_MEMORY_ENTRIES
+from frame_cache import MANIFEST_NAME, load_frame, read_fingerprint, save_frame
+from instrumentation import sql_span
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_VERSION = 1
+QUERY_CACHE_SUBDIR = 'queries'
+
+# Littéraux (conservés tels quels) | suites d'espaces et de commentaires
+_SQL_TOKENS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|((?:\s+|--[^\n]*|/\*.*?\*/)+)", re.S)
+
+def normalize_sql(query: str) -> str:
+    """
+    Texte SQL sans commentaires, espaces regroupés et sans ';' final
+    """
+    normalized = _SQL_TOKENS.sub(lambda m: m.group(1) or ' ', query).strip()
+    return normalized.rstrip(';').rstrip()
+
+def _wal_state(wal_path: Path) -> Tuple[int, str]:
+    """
+    Taille du fichier WAL et numéro de checkpoint + sels de son en-tête
+    (modifiés à chaque réinitialisation du WAL)
+    """
+    try:
+        with open(wal_path, 'rb') as f:
+            header = f.read(32)
+            size = os.fstat(f.fileno()).st_size
+    except FileNotFoundError:
+        return 0, ''
+    return size, header[12:24].hex()
+
+def database_version(conn) -> dict:
+    """
+    Version de la base ouverte par `conn` : fichier, WAL et id maximal
+
+    PRAGMA data_version n'est comparable que pour une même connexion : les
+    validations des autres connexions sont détectées par le WAL, qui grandit
+    à chaque validation et change de sels à chaque réinitialisation (sa date
+    de modification change à chaque ouverture et n'est pas utilisée).
+    """
+    db_path = Path(conn.execute("PRAGMA database_list").fetchone()[2])
+    db_stat = os.stat(db_path)
+    wal_size, wal_header = _wal_state(Path(f"{db_path}-wal"))
+    max_id = conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0]
+    return {
+        'db_path': str(db_path),
+        'db_size': db_stat.st_size,
+        'db_mtime_ns': db_stat.st_mtime_ns,
+        'wal_size': wal_size,
+        'wal_header': wal_header,
+        'max_id': max_id
+    }
+
+def cache_key(query: str, params: Optional[Sequence], version: dict) -> str:
+    payload = json.dumps([normalize_sql(query), list(params or []), version], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+def _directory_size(path: Path) -> int:
+    return sum(entry.stat().st_size for entry in path.iterdir() if entry.is_file())
+
+class QueryCache:
+    """
+    Cache à deux niveaux (mémoire LRU, disque borné) des résultats de requêtes
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MEMORY_ENTRIES,
+                 max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = CACHE_DIR / QUERY_CACHE_SUBDIR
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _name(self, key: str) -> str:
+        return f"{QUERY_CACHE_SUBDIR}/{key}"
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Résultat en cache (copie), ou None
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key].copy()
+
+        fingerprint = {'version': QUERY_CACHE_VERSION}
+        if read_fingerprint(self._name(key)) == fingerprint:
+            df = load_frame(fingerprint, self._name(key))
+            if df is not None:
+                # La date du manifeste sert d'ordre LRU pour l'éviction
+                os.utime(self.directory / key / MANIFEST_NAME)
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, df)
+                return df.copy()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key: str, df: pd.DataFrame) -> None:
+        self._memory[key] = df
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """
+        Enregistre un résultat en mémoire et sur disque
+        """
+        with self._lock:
+            self._remember(key, df.copy())
+        if self.max_bytes <= 0 or df.columns.has_duplicates:
+            return
+        try:
+            save_frame(df, {'version': QUERY_CACHE_VERSION}, self._name(key))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Résultat non mis en cache sur disque: {str(e)}")
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        """
+        Supprime les résultats les moins récemment utilisés au-delà de max_bytes
+        """
+        entries = []
+        for path in self.directory.iterdir():
+            manifest = path / MANIFEST_NAME
+            if path.is_dir() and manifest.exists():
+                entries.append((manifest.stat().st_mtime_ns, _directory_size(path), path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.debug(f"Résultat {path.name} retiré du cache des requêtes")
+
+    def clear(self) -> None:
+        """
+        Vide les deux niveaux du cache
+        """
+        with self._lock:
+            self._memory.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def log_stats(self) -> None:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        if lookups:
+            logger.info(f"Cache des requêtes : {self.memory_hits + self.disk_hits}/{lookups} succès "
+                        f"({self.memory_hits} en mémoire, {self.disk_hits} sur disque), "
+                        f"{self.misses} requêtes exécutées")
+
+_query_cache: Optional[QueryCache] = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> QueryCache:
+    """
+    Cache des requêtes du processus, créé au premier appel
+    """
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache()
+            atexit.register(_query_cache.log_stats)
+        return _query_cache
+
+def cached_query(query: str, conn, params: Optional[Sequence] = None) -> pd.DataFrame:
+    """
+    Résultat de la requête, relu depuis le cache tant que la base n'a pas changé
+    """
+    with sql_span(query) as span:
+        cache = get_query_cache()
+        key = cache_key(query, params, database_version(conn))
+        df = cache.get(key)
+        if df is not None:
+            logger.debug(f"Requête {key} relue depuis le cache")
+            span.set(rows=len(df), cache='hit')
+            return df
+        df = pd.read_sql_query(query, conn, params=params)
+        span.set(rows=len(df), cache='miss')
+        cache.put(key, df)
+        return df
@@ -0,0 +1,243 @@
+"""
+Ordonnanceur des étapes d'analyse
+
+Les étapes déclarent les étapes dont elles dépendent ; celles dont les
+dépendances sont satisfaites sont exécutées en parallèle dans un pool de
+processus. Le DataFrame des transactions est placé une seule fois en mémoire
+partagée (une zone par colonne, encodée comme dans le cache colonnaire) :
+chaque processus le reconstruit sans copie des colonnes numériques au lieu de
+le recevoir sérialisé avec chaque tâche.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from frame_cache import decode_column, encode_column
+
+logger = logging.getLogger(__name__)
+
+class Stage(NamedTuple):
+    """
+    Étape d'analyse : `func(df, deps)` reçoit le DataFrame des transactions et
+    le dictionnaire des résultats des étapes listées dans `depends_on` ;
+    `columns` liste les colonnes du DataFrame qu'elle lit (None : toutes)
+    """
+    name: str
+    func: Callable[[pd.DataFrame, Dict[str, Any]], Any]
+    depends_on: Tuple[str, ...] = ()
+    columns: Optional[Tuple[str, ...]] = None
+
+class SharedFrame:
+    """
+    DataFrame placé en mémoire partagée, une zone par colonne
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._blocks: List[shared_memory.SharedMemory] = []
+        columns = []
+        for col in df.columns:
+            entry, values = encode_column(df[col])
+            entry['shm'], entry['shape'], entry['array_dtype'] = self._share(values)
+            columns.append(entry)
+
+        index = None
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            index = dict(zip(('shm', 'shape', 'array_dtype'), self._share(df.index.to_numpy())))
+
+        # Description sérialisable transmise aux processus du pool
+        self.handle = {'rows': len(df), 'columns': columns, 'index': index}
+        size_mb = sum(block.size for block in self._blocks) / 1024 ** 2
+        logger.info(f"DataFrame placé en mémoire partagée ({len(self._blocks)} zones, {size_mb:.1f} Mo)")
+
+    def _share(self, values: np.ndarray) -> Tuple[str, tuple, str]:
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        self._blocks.append(block)
+        return block.name, values.shape, values.dtype.str
+
+    @staticmethod
+    def attach(handle: dict) -> Tuple[pd.DataFrame, List[shared_memory.SharedMemory]]:
+        """
+        Reconstruit le DataFrame depuis la mémoire partagée (dans un processus du pool)
+
+        Returns:
+            (DataFrame, zones ouvertes à garder en vie tant que le DataFrame est utilisé)
+        """
+        blocks = []
+
+        def view(shm_name: str, shape: tuple, array_dtype: str) -> np.ndarray:
+            block = shared_memory.SharedMemory(name=shm_name)
+            blocks.append(block)
+            values = np.ndarray(tuple(shape), dtype=np.dtype(array_dtype), buffer=block.buf)
+            # Les données sont partagées entre les processus : lecture seule
+            values.flags.writeable = False
+            return values
+
+        data = {entry['name']: decode_column(entry, view(entry['shm'], entry['shape'], entry['array_dtype']))
+                for entry in handle['columns']}
+        index = handle['index']
+        index = view(index['shm'], index['shape'], index['array_dtype']) if index is not None else None
+        return pd.DataFrame(data, index=index, copy=False), blocks
+
+    def close(self) -> None:
+        """
+        Libère les zones de mémoire partagée
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self) -> 'SharedFrame':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+# État des processus du pool (initialisé une fois par processus)
+_worker_frame = None
+_worker_blocks = None
+
+def _init_worker(handle: dict, instrumentation_settings: Optional[dict] = None) -> None:
+    global _worker_frame, _worker_blocks
+    instrumentation.init_worker(instrumentation_settings)
+    _worker_frame, _worker_blocks = SharedFrame.attach(handle)
+
+def _run_stage(stage: Stage, df: pd.DataFrame, deps: Dict[str, Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    with instrumentation.span(stage.name, kind='stage'):
+        result = stage.func(df, deps)
+    return result, time.perf_counter() - start
+
+def _run_in_worker(stage: Stage, deps: Dict[str, Any]) -> Tuple[Any, float, List[dict]]:
+    result, seconds = _run_stage(stage, _worker_frame, deps)
+    # Intervalles mesurés dans ce processus, rattachés par le processus principal
+    return result, seconds, instrumentation.drain()
+
+def resolve_jobs(jobs: int) -> int:
+    """
+    Nombre de processus effectif (0 ou moins : tous les cœurs disponibles)
+    """
+    if jobs > 0:
+        return jobs
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _check_graph(stages: List[Stage]) -> None:
+    """
+    Vérifie que les dépendances existent et ne forment pas de cycle
+    """
+    names = {stage.name for stage in stages}
+    if len(names) != len(stages):
+        raise ValueError("Noms d'étapes en double")
+    for stage in stages:
+        unknown = set(stage.depends_on) - names
+        if unknown:
+            raise ValueError(f"Étape {stage.name}: dépendances inconnues {sorted(unknown)}")
+
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if set(stage.depends_on) <= done]
+        if not ready:
+            raise ValueError(f"Dépendances circulaires entre {[stage.name for stage in remaining]}")
+        done.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage.name not in done]
+
+def select_stages(stages: List[Stage], names: List[str]) -> List[Stage]:
+    """
+    Étapes demandées et toutes celles dont elles dépendent, dans l'ordre de `stages`
+    """
+    by_name = {stage.name: stage for stage in stages}
+    unknown = set(names) - by_name.keys()
+    if unknown:
+        raise ValueError(f"Étapes inconnues {sorted(unknown)}")
+
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(by_name[name].depends_on)
+    return [stage for stage in stages if stage.name in selected]
+
+def required_columns(stages: List[Stage]) -> Optional[List[str]]:
+    """
+    Colonnes du DataFrame lues par au moins une des étapes (None : toutes)
+    """
+    columns = []
+    for stage in stages:
+        if stage.columns is None:
+            return None
+        columns.extend(col for col in stage.columns if col not in columns)
+    return columns
+
+def run_stages(stages: List[Stage], df: pd.DataFrame, jobs: int = 1) -> Dict[str, Any]:
+    """
+    Exécute les étapes dans l'ordre imposé par leurs dépendances
+
+    Avec `jobs` = 1, les étapes sont exécutées l'une après l'autre dans le
+    processus courant ; sinon les étapes prêtes sont réparties sur `jobs`
+    processus partageant le DataFrame en mémoire partagée.
+
+    Returns:
+        Dict {nom de l'étape: résultat}
+    """
+    _check_graph(stages)
+    jobs = resolve_jobs(jobs)
+    timings = {}
+    results = {}
+    start = time.perf_counter()
+
+    if jobs == 1:
+        pending = list(stages)
+        while pending:
+            stage = next(stage for stage in pending if set(stage.depends_on) <= results.keys())
+            pending.remove(stage)
+            logger.info(f"Étape {stage.name} démarrée")
+            results[stage.name], timings[stage.name] = _run_stage(
+                stage, df, {dep: results[dep] for dep in stage.depends_on})
+            logger.info(f"Étape {stage.name} terminée en {timings[stage.name]:.2f} s")
+    else:
+        logger.info(f"Exécution de {len(stages)} étapes sur {jobs} processus")
+        with SharedFrame(df) as shared, ProcessPoolExecutor(
+                max_workers=jobs, initializer=_init_worker,
+                initargs=(shared.handle, instrumentation.settings())) as pool:
+            pending = list(stages)
+            running = {}
+            while pending or running:
+                for stage in [stage for stage in pending if set(stage.depends_on) <= results.keys()]:
+                    pending.remove(stage)
+                    logger.info(f"Étape {stage.name} démarrée")
+                    future = pool.submit(_run_in_worker, stage, {dep: results[dep] for dep in stage.depends_on})
+                    running[future] = stage
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    try:
+                        results[stage.name], timings[stage.name], records = future.result()
+                    except Exception:
+                        logger.error(f"Échec de l'étape {stage.name}")
+                        for other in running:
+                            other.cancel()
+                        raise
+                    instrumentation.adopt(records)
+                    logger.info(f"Étape {stage.name} terminée en {timings[stage.name]:.2f} s")
+
+    total = time.perf_counter() - start
+    summary = '\n'.join(f"  {name:<25} {seconds:8.2f} s"
+                        for name, seconds in sorted(timings.items(), key=lambda item: -item[1]))
+    logger.info(f"Durée des étapes ({jobs} processus, {total:.2f} s au total, "
+                f"{sum(timings.values()):.2f} s cumulées) :\n{summary}")
+    return results
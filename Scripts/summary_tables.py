@@ -0,0 +1,192 @@
+"""
+Tables de synthèse matérialisées dans SQLite, tenues à jour par triggers
+
+Chaque table agrège la table `transactions` selon une clé (step, catégorie,
+commerçant, client, âge et genre) : nombre de transactions, somme et somme
+des carrés des montants en centimes, nombre de fraudes. Un trigger AFTER
+INSERT met à jour la ligne de la clé à chaque insertion, si bien que les
+rapports lus dans ces tables ne dépendent plus de la taille de la table.
+
+Seules les insertions sont suivies : après une modification ou une
+suppression de transactions, les tables doivent être reconstruites.
+
+Usage :
+    python summary_tables.py [--db chemin.db] [--rebuild | --drop | --status]
+"""
+
+import argparse
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Union
+import numpy as np
+import pandas as pd
+
+from config import DB_PATH
+from data_cube import DataCube, MEASURES
+from data_loader import get_db_connection
+from dataset_summary import make_summary
+from utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# {table: colonnes de la clé}
+SUMMARY_TABLES: Dict[str, List[str]] = {
+    'daily_stats': ['step'],
+    'category_stats': ['category'],
+    'merchant_stats': ['merchant'],
+    'customer_stats': ['customer'],
+    'demographic_stats': ['age', 'gender']
+}
+
+KEY_TYPES = {'step': 'INTEGER'}
+
+# Montant d'une transaction en centimes (arrondi comme dans le cube de données)
+CENTS = "CAST(ROUND({prefix}amount * 100) AS INTEGER)"
+
+def table_statement(table: str, keys: List[str]) -> str:
+    columns = ',\n        '.join(f"{key} {KEY_TYPES.get(key, 'TEXT')} NOT NULL" for key in keys)
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        {columns},
+        transactions INTEGER NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        amount_sq_cents INTEGER NOT NULL,
+        fraud_count INTEGER NOT NULL,
+        PRIMARY KEY ({', '.join(keys)})
+    ) WITHOUT ROWID
+    """
+
+def trigger_statement(table: str, keys: List[str]) -> str:
+    cents = CENTS.format(prefix='NEW.')
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_insert
+    AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO {table} ({', '.join(keys)}, transactions, amount_cents, amount_sq_cents, fraud_count)
+        VALUES ({', '.join(f'NEW.{key}' for key in keys)}, 1, {cents}, {cents} * {cents}, NEW.fraud)
+        ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+            transactions = transactions + 1,
+            amount_cents = amount_cents + excluded.amount_cents,
+            amount_sq_cents = amount_sq_cents + excluded.amount_sq_cents,
+            fraud_count = fraud_count + excluded.fraud_count;
+    END
+    """
+
+def rebuild_statement(table: str, keys: List[str]) -> str:
+    cents = CENTS.format(prefix='')
+    return f"""
+    INSERT INTO {table} ({', '.join(keys)}, transactions, amount_cents, amount_sq_cents, fraud_count)
+    SELECT {', '.join(keys)}, COUNT(*), SUM({cents}), SUM({cents} * {cents}), SUM(fraud)
+    FROM transactions
+    GROUP BY {', '.join(keys)}
+    """
+
+def is_installed(conn: sqlite3.Connection) -> bool:
+    """
+    Indique si toutes les tables de synthèse et leurs triggers existent
+    """
+    names = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+    )}
+    return all(table in names and f"trg_{table}_insert" in names for table in SUMMARY_TABLES)
+
+def drop_triggers(conn: sqlite3.Connection) -> None:
+    """
+    Supprime les triggers (les tables sont conservées, par exemple le temps d'un chargement en masse)
+    """
+    for table in SUMMARY_TABLES:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_insert")
+
+def drop(conn: sqlite3.Connection) -> None:
+    """
+    Supprime les tables de synthèse et leurs triggers
+    """
+    drop_triggers(conn)
+    for table in SUMMARY_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.commit()
+    logger.info("Tables de synthèse supprimées")
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """
+    (Re)construit les tables de synthèse depuis la table transactions et
+    installe les triggers, dans une seule transaction
+    """
+    start = time.perf_counter()
+    with conn:
+        for table, keys in SUMMARY_TABLES.items():
+            conn.execute(table_statement(table, keys))
+            conn.execute(f"DELETE FROM {table}")
+            conn.execute(rebuild_statement(table, keys))
+            conn.execute(trigger_statement(table, keys))
+    logger.info(f"Tables de synthèse reconstruites en {time.perf_counter() - start:.2f} s")
+
+class SummaryTables:
+    """
+    Lecture des tables de synthèse, avec la même interface que le cube de
+    données pour les rapports : rollup() et data_info()
+    """
+
+    def __init__(self, conn: sqlite3.Connection = None):
+        self.conn = conn if conn is not None else get_db_connection()
+
+    def _cells(self, table: str) -> pd.DataFrame:
+        keys = SUMMARY_TABLES[table]
+        return pd.read_sql_query(f"SELECT {', '.join(keys + MEASURES)} FROM {table}", self.conn)
+
+    def rollup(self, by: Union[str, List[str]]) -> pd.DataFrame:
+        """
+        Agrégats par clé, au format de DataCube.rollup
+
+        Seules les clés contenues dans celles d'une table de synthèse sont
+        disponibles (step, category, merchant, customer, age et/ou gender).
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        table = next((table for table, keys in SUMMARY_TABLES.items() if set(by) <= set(keys)), None)
+        if table is None:
+            raise KeyError(f"Aucune table de synthèse pour la clé {by}")
+        return DataCube(self._cells(table), np.array([], dtype=object)).rollup(by)
+
+    def data_info(self) -> dict:
+        """
+        Résumé du dataset (mêmes clés que dataset_summary.get_dataset_summary)
+        """
+        total, amount_cents, frauds, min_step, max_step = self.conn.execute(
+            "SELECT SUM(transactions), SUM(amount_cents), SUM(fraud_count), MIN(step), MAX(step) FROM daily_stats"
+        ).fetchone()
+        distinct = {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ('customer_stats', 'merchant_stats', 'category_stats')}
+        return make_summary(total or 0, distinct['customer_stats'], distinct['merchant_stats'],
+                            distinct['category_stats'], amount_cents, frauds, min_step, max_step)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tables de synthèse tenues à jour par triggers")
+    parser.add_argument('--db', type=Path, default=DB_PATH, help="Base SQLite")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--rebuild', action='store_true',
+                        help="Reconstruit les tables et installe les triggers (action par défaut)")
+    action.add_argument('--drop', action='store_true', help="Supprime les tables et les triggers")
+    action.add_argument('--status', action='store_true', help="Affiche l'état des tables")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.drop:
+            drop(conn)
+        elif args.status:
+            if not is_installed(conn):
+                print("Tables de synthèse non installées")
+                return
+            for table in SUMMARY_TABLES:
+                rows, transactions = conn.execute(f"SELECT COUNT(*), SUM(transactions) FROM {table}").fetchone()
+                print(f"{table:<20} {rows:>8,} lignes  {transactions or 0:>12,} transactions")
+        else:
+            rebuild(conn)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    setup_logging()
+    main()
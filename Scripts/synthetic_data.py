@@ -0,0 +1,397 @@
+"""
+Générateur de transactions synthétiques au format BankSim
+
+Les transactions respectent le schéma de SQLite/structure.sql et les
+marges du jeu BankSim d'origine (voir les exports de Scripts/*.csv) :
+environ 4 100 clients pour 600 000 lignes, 50 commerçants rattachés chacun à
+une catégorie, les 15 catégories avec leurs volumes, les codes d'âge et de
+genre (âge 'U' pour les entreprises 'E'), des montants log-normaux par
+catégorie et un taux de fraude d'environ 1,2 % concentré dans les catégories
+où il apparaît (montants frauduleux plus élevés).
+
+La population (clients, commerçants) est tirée une fois ; les lignes sont
+ensuite produites par blocs de SYNTHETIC_BLOCK_ROWS, entièrement vectorisés
+avec NumPy, chaque bloc ayant son propre générateur dérivé de la graine et
+de son numéro : le résultat est identique pour une même graine et un même
+nombre de lignes, quel que soit le nombre de processus. Les steps sont
+croissants le long de la table, comme dans BankSim.
+
+Deux sorties :
+- une base SQLite (blocs générés en parallèle, écrits par un seul processus,
+  index créés à la fin comme dans ingest.py) ;
+- un dossier colonnaire au format du cache colonnaire (frame_cache : un
+  fichier .npy par colonne et un manifeste), écrit en parallèle directement
+  dans les fichiers mappés en mémoire et relu par read_columnar().
+
+Usage :
+    python synthetic_data.py --rows 600000 (--db chemin.db | --columnar dossier)
+                             [--seed N] [--workers N] [--replace]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+import numpy as np
+import pandas as pd
+
+from config import (
+    INGEST_PRAGMAS, SYNTHETIC_AMOUNT_SIGMA, SYNTHETIC_BLOCK_ROWS,
+    SYNTHETIC_SEED, SYNTHETIC_STEPS, SYNTHETIC_WORKERS
+)
+from frame_cache import FORMAT_VERSION, MANIFEST_NAME, decode_column
+from ingest import INSERT_QUERY, RUNTIME_PRAGMAS, apply_pragmas, read_schema
+from utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+GENERATOR_VERSION = 1
+
+# Marges du jeu BankSim d'origine (594 643 transactions, 4 112 clients)
+CUSTOMERS_PER_ROW = 4112 / 594643
+N_MERCHANTS = 50
+ZIP_CODE = '28007'
+
+# (catégorie, transactions, taux de fraude, montant moyen normal, montant
+# moyen frauduleux, montant maximal), d'après fraud_by_category.csv et
+# amount_by_category.csv
+CATEGORY_PROFILES = [
+    ('es_leisure', 499, 0.9499, 73.23, 300.29, 592.03),
+    ('es_travel', 728, 0.7940, 669.03, 2660.8, 8329.96),
+    ('es_sportsandtoys', 4002, 0.4953, 88.5, 345.37, 1258.33),
+    ('es_hotelservices', 1744, 0.3142, 106.55, 421.82, 1429.04),
+    ('es_otherservices', 912, 0.2500, 75.69, 316.47, 964.3),
+    ('es_home', 1986, 0.1521, 113.34, 457.48, 1540.23),
+    ('es_health', 16133, 0.1051, 103.74, 407.03, 1972.81),
+    ('es_tech', 2370, 0.0667, 99.92, 415.27, 1305.35),
+    ('es_wellnessandbeauty', 15086, 0.0476, 57.32, 229.42, 750.51),
+    ('es_hyper', 6098, 0.0459, 40.04, 169.26, 488.02),
+    ('es_barsandrestaurants', 6373, 0.0188, 41.15, 164.09, 695.63),
+    ('es_fashion', 6454, 0.0180, 62.35, 247.01, 773.61),
+    ('es_contents', 885, 0.0, 44.55, 0.0, 185.13),
+    ('es_food', 26254, 0.0, 37.07, 0.0, 154.91),
+    ('es_transportation', 505119, 0.0, 26.96, 0.0, 118.07)
+]
+# Âges BankSim : '0' à '6' par tranches, 'U' (inconnu) pour les entreprises
+AGE_WEIGHTS = {'0': 2452, '1': 58131, '2': 187310, '3': 147131, '4': 109025, '5': 62642, '6': 26774}
+AGE_CODES = list(AGE_WEIGHTS) + ['U']
+GENDER_WEIGHTS = {'F': 324565, 'M': 268385, 'E': 1178, 'U': 515}
+GENDER_CODES = list(GENDER_WEIGHTS)
+
+# Colonnes produites, dans l'ordre du DataFrame nettoyé (data_loader.load_data)
+COLUMN_DTYPES = {
+    'step': np.int64, 'customer': np.int32, 'age': np.int8, 'gender': np.int8,
+    'merchant': np.int8, 'category': np.int8, 'amount': np.float64, 'fraud': np.int64
+}
+
+class Population(NamedTuple):
+    """
+    Clients et commerçants tirés pour une graine et un nombre de lignes
+    """
+    customers: np.ndarray          # identifiants 'C...'
+    customer_age: np.ndarray       # indice dans AGE_CODES
+    customer_gender: np.ndarray    # indice dans GENDER_CODES
+    customer_cdf: np.ndarray       # activité cumulée (tirage des clients)
+    merchants: np.ndarray          # identifiants 'M...', triés par catégorie
+    merchant_cdf: np.ndarray       # catégorie + part cumulée dans la catégorie
+    categories: np.ndarray
+    category_cdf: np.ndarray
+    fraud_rate: np.ndarray
+    normal_mean: np.ndarray
+    fraud_mean: np.ndarray
+    max_amount: np.ndarray
+
+def _weights(values) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    return values / values.sum()
+
+def _identifiers(rng: np.random.Generator, prefix: str, n: int) -> np.ndarray:
+    numbers = rng.choice(9 * 10 ** 8, size=n, replace=False) + 10 ** 8
+    return np.char.add(prefix, numbers.astype(str)).astype(object)
+
+def build_population(rows: int, seed: int = SYNTHETIC_SEED) -> Population:
+    """
+    Tire les clients (âge, genre, activité) et les commerçants (catégorie,
+    part de leur catégorie)
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+    profiles = pd.DataFrame(CATEGORY_PROFILES, columns=['category', 'transactions', 'fraud_rate',
+                                                        'normal_mean', 'fraud_mean', 'max_amount'])
+    n_categories = len(profiles)
+
+    n_customers = max(1, round(rows * CUSTOMERS_PER_ROW))
+    customers = _identifiers(rng, 'C', n_customers)
+    gender = rng.choice(len(GENDER_CODES), size=n_customers, p=_weights(list(GENDER_WEIGHTS.values())))
+    age = rng.choice(len(AGE_WEIGHTS), size=n_customers, p=_weights(list(AGE_WEIGHTS.values())))
+    age[gender == GENDER_CODES.index('E')] = AGE_CODES.index('U')
+    activity = rng.gamma(2.0, 1.0, size=n_customers)
+
+    # Au moins un commerçant par catégorie, les autres répartis selon le volume
+    extra = rng.choice(n_categories, size=N_MERCHANTS - n_categories,
+                       p=_weights(np.sqrt(profiles['transactions'])))
+    merchant_category = np.sort(np.r_[np.arange(n_categories), extra])
+    rank = np.arange(N_MERCHANTS) - np.searchsorted(merchant_category, merchant_category)
+    share = 1 / (rank + 1)
+    share_sum = np.bincount(merchant_category, weights=share)
+    within = np.cumsum(share) - np.r_[0, np.cumsum(share_sum)][merchant_category]
+
+    return Population(
+        customers=customers,
+        customer_age=age.astype(np.int8),
+        customer_gender=gender.astype(np.int8),
+        customer_cdf=np.cumsum(activity) / activity.sum(),
+        merchants=_identifiers(rng, 'M', N_MERCHANTS),
+        merchant_cdf=merchant_category + within / share_sum[merchant_category],
+        categories=profiles['category'].to_numpy(dtype=object),
+        category_cdf=np.cumsum(_weights(profiles['transactions'])),
+        fraud_rate=profiles['fraud_rate'].to_numpy(),
+        normal_mean=profiles['normal_mean'].to_numpy(),
+        fraud_mean=profiles['fraud_mean'].to_numpy(),
+        max_amount=profiles['max_amount'].to_numpy()
+    )
+
+def generate_block(population: Population, start: int, stop: int, total_rows: int,
+                   seed: int = SYNTHETIC_SEED, steps: int = SYNTHETIC_STEPS,
+                   block_rows: int = SYNTHETIC_BLOCK_ROWS,
+                   sigma: float = SYNTHETIC_AMOUNT_SIGMA) -> Dict[str, np.ndarray]:
+    """
+    Lignes start à stop (exclu) : codes des colonnes textuelles (indices dans
+    la population), step, montant et fraude
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(1, start // block_rows)))
+    n = stop - start
+    last = np.nextafter(1.0, 0)
+
+    customer = np.minimum(np.searchsorted(population.customer_cdf, rng.random(n), side='right'),
+                          len(population.customers) - 1)
+    category = np.minimum(np.searchsorted(population.category_cdf, rng.random(n), side='right'),
+                          len(population.categories) - 1)
+    # Commerçant tiré dans sa catégorie : cdf décalée du numéro de catégorie
+    merchant = np.searchsorted(population.merchant_cdf, category + rng.random(n) * last, side='right')
+    fraud = rng.random(n) < population.fraud_rate[category]
+
+    mean = np.where(fraud, population.fraud_mean[category], population.normal_mean[category])
+    amount = np.exp(np.log(mean) - sigma ** 2 / 2 + sigma * rng.standard_normal(n))
+    amount = np.round(np.minimum(amount, population.max_amount[category]), 2)
+
+    return {
+        'step': np.arange(start, stop, dtype=np.int64) * steps // total_rows,
+        'customer': customer.astype(np.int32),
+        'age': population.customer_age[customer],
+        'gender': population.customer_gender[customer],
+        'merchant': merchant.astype(np.int8),
+        'category': category.astype(np.int8),
+        'amount': amount,
+        'fraud': fraud.astype(np.int64)
+    }
+
+def _blocks(rows: int, block_rows: int):
+    return [(start, min(start + block_rows, rows)) for start in range(0, rows, block_rows)]
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    context = (multiprocessing.get_context('fork')
+               if 'fork' in multiprocessing.get_all_start_methods() else None)
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context)
+
+def _column_entries(population: Population) -> list:
+    """
+    Description des colonnes au format du manifeste de frame_cache
+    """
+    labels = {
+        'customer': population.customers, 'age': np.array(AGE_CODES, dtype=object),
+        'gender': np.array(GENDER_CODES, dtype=object), 'merchant': population.merchants,
+        'category': population.categories
+    }
+    entries = []
+    for position, (name, dtype) in enumerate(COLUMN_DTYPES.items()):
+        entry = {'name': name, 'file': f"{position:03d}.npy"}
+        if name in labels:
+            # 'age' reste textuel après clean_data, les autres sont catégorielles
+            entry.update({'dtype': 'object' if name == 'age' else 'category',
+                          'encoding': 'dictionary' if name == 'age' else 'categorical',
+                          'ordered': False, 'categories': [str(value) for value in labels[name]]})
+        else:
+            entry.update({'dtype': np.dtype(dtype).name, 'encoding': 'plain'})
+        entries.append(entry)
+    return entries
+
+def _fill_columnar(directory: Path, entries: list, population: Population, start: int, stop: int,
+                   total_rows: int, seed: int, steps: int, block_rows: int) -> None:
+    block = generate_block(population, start, stop, total_rows, seed, steps, block_rows)
+    for entry in entries:
+        column = np.load(directory / entry['file'], mmap_mode='r+')
+        column[start:stop] = block[entry['name']]
+        column.flush()
+
+def write_columnar(directory: Path, rows: int, seed: int = SYNTHETIC_SEED, workers: int = SYNTHETIC_WORKERS,
+                   steps: int = SYNTHETIC_STEPS, block_rows: int = SYNTHETIC_BLOCK_ROWS) -> dict:
+    """
+    Écrit `rows` transactions dans un dossier colonnaire (format frame_cache)
+
+    Returns:
+        Statistiques de génération (lignes, durée, débit)
+    """
+    start_time = time.perf_counter()
+    population = build_population(rows, seed)
+    entries = _column_entries(population)
+
+    tmp_dir = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for entry in entries:
+        dtype = COLUMN_DTYPES[entry['name']]
+        if entry['encoding'] != 'plain':
+            dtype = np.int32 if len(entry['categories']) >= np.iinfo(np.int8).max else np.int8
+        np.lib.format.open_memmap(tmp_dir / entry['file'], mode='w+', dtype=dtype, shape=(rows,)).flush()
+
+    blocks = _blocks(rows, block_rows)
+    if workers == 1 or len(blocks) == 1:
+        for start, stop in blocks:
+            _fill_columnar(tmp_dir, entries, population, start, stop, rows, seed, steps, block_rows)
+    else:
+        with _executor(workers) as executor:
+            futures = [executor.submit(_fill_columnar, tmp_dir, entries, population, start, stop,
+                                       rows, seed, steps, block_rows) for start, stop in blocks]
+            for future in futures:
+                future.result()
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'fingerprint': {'synthetic': {'version': GENERATOR_VERSION, 'rows': rows, 'seed': seed, 'steps': steps}},
+        'rows': rows,
+        'columns': entries,
+        'index_file': None
+    }
+    with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    tmp_dir.rename(directory)
+    return _report(rows, time.perf_counter() - start_time, directory)
+
+def read_columnar(directory: Path) -> pd.DataFrame:
+    """
+    Relit un dossier colonnaire écrit par write_columnar (colonnes mappées en mémoire)
+    """
+    with open(directory / MANIFEST_NAME, encoding='utf-8') as f:
+        manifest = json.load(f)
+    return pd.DataFrame({entry['name']: decode_column(entry, np.load(directory / entry['file'], mmap_mode='r'))
+                         for entry in manifest['columns']}, copy=False)
+
+def _sqlite_rows(population: Population, block: Dict[str, np.ndarray]):
+    """
+    Lignes d'un bloc dans l'ordre des colonnes de INSERT_QUERY
+    """
+    n = len(block['step'])
+    zip_codes = [ZIP_CODE] * n
+    return zip(
+        block['step'].tolist(),
+        population.customers[block['customer']].tolist(),
+        np.array(AGE_CODES, dtype=object)[block['age']].tolist(),
+        np.array(GENDER_CODES, dtype=object)[block['gender']].tolist(),
+        zip_codes,
+        population.merchants[block['merchant']].tolist(),
+        zip_codes,
+        population.categories[block['category']].tolist(),
+        block['amount'].tolist(),
+        block['fraud'].tolist()
+    )
+
+def write_sqlite(db_path: Path, rows: int, seed: int = SYNTHETIC_SEED, workers: int = SYNTHETIC_WORKERS,
+                 steps: int = SYNTHETIC_STEPS, block_rows: int = SYNTHETIC_BLOCK_ROWS,
+                 replace: bool = False) -> dict:
+    """
+    Écrit `rows` transactions dans la table transactions d'une base SQLite
+
+    Les blocs sont générés en parallèle et insérés dans l'ordre par le
+    processus principal ; les index de structure.sql sont créés à la fin.
+
+    Returns:
+        Statistiques de génération (lignes, durée, débit)
+    """
+    start_time = time.perf_counter()
+    population = build_population(rows, seed)
+    table_statements, index_statements = read_schema()
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        apply_pragmas(conn, INGEST_PRAGMAS)
+        if replace:
+            conn.execute("DROP TABLE IF EXISTS transactions")
+        for stmt in table_statements:
+            conn.execute(stmt)
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM transactions)").fetchone()[0]:
+            raise ValueError(f"La table transactions de {db_path} n'est pas vide (utiliser --replace)")
+        for name in index_statements:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+        def insert(block):
+            conn.execute("BEGIN")
+            conn.executemany(INSERT_QUERY, _sqlite_rows(population, block))
+            conn.execute("COMMIT")
+
+        blocks = _blocks(rows, block_rows)
+        if workers == 1 or len(blocks) == 1:
+            for start, stop in blocks:
+                insert(generate_block(population, start, stop, rows, seed, steps, block_rows))
+        else:
+            with _executor(workers) as executor:
+                futures = [executor.submit(generate_block, population, start, stop, rows, seed, steps, block_rows)
+                           for start, stop in blocks]
+                for future in futures:
+                    insert(future.result())
+
+        index_start = time.perf_counter()
+        for stmt in index_statements.values():
+            conn.execute(stmt)
+        index_time = time.perf_counter() - index_start
+        apply_pragmas(conn, RUNTIME_PRAGMAS)
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return _report(rows, time.perf_counter() - start_time, db_path, index_time)
+
+def _report(rows: int, seconds: float, target: Path, index_time: float = 0.0) -> dict:
+    write_time = seconds - index_time
+    stats = {
+        'rows': rows,
+        'seconds': seconds,
+        'index_seconds': index_time,
+        'rows_per_second': rows / write_time if write_time > 0 else float('inf')
+    }
+    logger.info(f"{rows:,} transactions synthétiques écrites dans {target} en {write_time:.2f} s "
+                f"({stats['rows_per_second']:,.0f} lignes/s)"
+                + (f", index en {index_time:.2f} s" if index_time else ""))
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération de transactions synthétiques au format BankSim")
+    parser.add_argument('--rows', type=int, required=True, help="Nombre de transactions")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--db', type=Path, help="Base SQLite à remplir")
+    output.add_argument('--columnar', type=Path, help="Dossier colonnaire (format frame_cache)")
+    parser.add_argument('--seed', type=int, default=SYNTHETIC_SEED, help="Graine (sortie déterministe)")
+    parser.add_argument('--workers', type=int, default=SYNTHETIC_WORKERS,
+                        help="Processus de génération (0 : tous les cœurs)")
+    parser.add_argument('--steps', type=int, default=SYNTHETIC_STEPS, help="Nombre de steps simulés")
+    parser.add_argument('--replace', action='store_true', help="Remplace la table transactions existante")
+    args = parser.parse_args()
+
+    if args.db:
+        write_sqlite(args.db, args.rows, args.seed, args.workers, args.steps, replace=args.replace)
+    else:
+        write_columnar(args.columnar, args.rows, args.seed, args.workers, args.steps)
+
+if __name__ == '__main__':
+    setup_logging()
+    main()
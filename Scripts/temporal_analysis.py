@@ -4,27 +4,32 @@ Analyses temporelles des transactions
 
 import pandas as pd
 import numpy as np
-from typing import Dict
+from typing import Dict, Union
 import logging
-from utils import calculate_fraud_rate, save_results
+from utils import calculate_fraud_rate, format_group_stats, save_results
+from data_cube import DataCube, as_cube
 
 logger = logging.getLogger(__name__)
 
-def perform_temporal_analysis(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+def perform_temporal_analysis(data: Union[pd.DataFrame, DataCube]) -> Dict[str, pd.DataFrame]:
     """
     Réalise l'ensemble des analyses temporelles
     
+    Les analyses sont calculées sur le cube de données, construit à partir
+    du DataFrame des transactions s'il n'est pas fourni directement.
+    
     Returns:
         Dict contenant les différents DataFrames d'analyse
     """
     logger.info("Début de l'analyse temporelle")
+    cube = as_cube(data)
     results = {}
     
     # Analyse par step (jour)
-    results['daily_analysis'] = analyze_daily_patterns(df)
+    results['daily_analysis'] = analyze_daily_patterns(cube)
     
     # Analyse des tendances de fraude
-    results['fraud_temporal'] = analyze_fraud_patterns(df)
+    results['fraud_temporal'] = analyze_fraud_patterns(cube)
     
     # Sauvegarde des résultats
     for name, result_df in results.items():
@@ -33,18 +38,11 @@ def perform_temporal_analysis(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     logger.info("Analyse temporelle terminée")
     return results
 
-def analyze_daily_patterns(df: pd.DataFrame) -> pd.DataFrame:
+def analyze_daily_patterns(cube: DataCube) -> pd.DataFrame:
     """
     Analyse des patterns quotidiens
     """
-    daily_stats = df.groupby('step').agg({
-        'amount': ['count', 'sum', 'mean'],
-        'fraud': ['sum', 'mean']
-    }).round(2)
-    
-    daily_stats.columns = ['transaction_count', 'total_amount', 'avg_amount',
-                          'fraud_count', 'fraud_rate']
-    daily_stats['fraud_rate'] = (daily_stats['fraud_rate'] * 100).round(2)
+    daily_stats = format_group_stats(cube.rollup('step'))
     
     # Calcul des moyennes mobiles pour identifier les tendances
     window_size = 7  # fenêtre d'une semaine
@@ -53,19 +51,22 @@ def analyze_daily_patterns(df: pd.DataFrame) -> pd.DataFrame:
     
     return daily_stats
 
-def analyze_fraud_patterns(df: pd.DataFrame) -> pd.DataFrame:
+def analyze_fraud_patterns(cube: DataCube) -> pd.DataFrame:
     """
     Analyse des patterns de fraude dans le temps
     """
-    # Séparation des transactions frauduleuses et normales
-    fraud_df = df[df['fraud'] == 1]
-    normal_df = df[df['fraud'] == 0]
+    daily = cube.rollup('step')
+    
+    # Séparation des transactions frauduleuses et normales (jours sans
+    # transaction du type concerné absents, comme avec un groupby par type)
+    fraud_counts = daily['fraud_count']
+    normal_counts = daily['transactions'] - daily['fraud_count']
     
     # Analyse comparative des distributions temporelles
     fraud_temporal = pd.DataFrame({
-        'total_transactions': df.groupby('step').size(),
-        'fraud_transactions': fraud_df.groupby('step').size(),
-        'normal_transactions': normal_df.groupby('step').size()
+        'total_transactions': daily['transactions'],
+        'fraud_transactions': fraud_counts[fraud_counts > 0],
+        'normal_transactions': normal_counts[normal_counts > 0]
     }).fillna(0)
     
     # Calcul des proportions
@@ -77,16 +78,16 @@ def analyze_fraud_patterns(df: pd.DataFrame) -> pd.DataFrame:
     
     return fraud_temporal
 
-def identify_risk_periods(df: pd.DataFrame, window_size: int = 7) -> pd.DataFrame:
+def identify_risk_periods(data: Union[pd.DataFrame, DataCube], window_size: int = 7) -> pd.DataFrame:
     """
     Identifie les périodes à haut risque de fraude
     """
     # Calcul du taux de fraude moyen sur une fenêtre glissante
-    risk_analysis = df.groupby('step').agg({
-        'fraud': ['count', 'sum']
+    daily = as_cube(data).rollup('step')
+    risk_analysis = pd.DataFrame({
+        'total_transactions': daily['transactions'],
+        'fraud_transactions': daily['fraud_count']
     })
-    
-    risk_analysis.columns = ['total_transactions', 'fraud_transactions']
     risk_analysis['fraud_rate'] = (risk_analysis['fraud_transactions'] / 
                                  risk_analysis['total_transactions'] * 100).round(2)
     
@@ -2,41 +2,66 @@
 Analyse des patterns temporels des transactions
 """
 
-import sqlite3
-from pathlib import Path
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from typing import List
+from context import AnalysisContext, report_source
+from figures import FigureJob, render_figures
+from instrumentation import traced
 
 # Configuration
-DB_PATH = Path(__file__).parent.parent / 'SQLite' / 'bankdata.db'
-RESULTS_DIR = Path(__file__).parent.parent / 'Results'
-FIGURES_DIR = RESULTS_DIR / 'Figures'
-FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+from config import FIGURES_DIR, RESULTS_DIR
 
-def get_temporal_stats():
+@traced
+def get_temporal_stats(ctx: AnalysisContext = None):
     """Récupère les statistiques temporelles"""
-    query = """
-    SELECT 
-        step,
-        COUNT(*) as nb_transactions,
-        ROUND(AVG(amount), 2) as montant_moyen,
-        ROUND(SUM(amount), 2) as volume_total,
-        SUM(fraud) as nb_fraudes,
-        ROUND(AVG(fraud) * 100, 2) as taux_fraude
-    FROM transactions
-    GROUP BY step
-    ORDER BY step;
-    """
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query(query, conn)
+    daily = report_source(ctx).rollup('step').reset_index()
+    return pd.DataFrame({
+        'step': daily['step'],
+        'nb_transactions': daily['transactions'],
+        'montant_moyen': daily['amount_mean'].round(2),
+        'volume_total': daily['amount_sum'].round(2),
+        'nb_fraudes': daily['fraud_count'],
+        'taux_fraude': (daily['fraud_mean'] * 100).round(2)
+    })
 
-def analyze_temporal_patterns():
-    """Analyse et visualise les patterns temporels"""
+def analyze_temporal_patterns(ctx: AnalysisContext = None, figures: List[FigureJob] = None):
+    """
+    Analyse et visualise les patterns temporels
+    
+    Si une liste `figures` est fournie, la figure y est ajoutée pour être
+    rendue plus tard avec les autres ; sinon elle est rendue immédiatement.
+    """
     # Récupération des données
-    temporal_stats = get_temporal_stats()
+    temporal_stats = get_temporal_stats(ctx)
+    
+    # Figure (rendue dans un processus dédié)
+    job = FigureJob('temporal_patterns_analysis', plot_temporal_patterns_analysis, temporal_stats,
+                    FIGURES_DIR / 'temporal_patterns_analysis.png', dpi=300, bbox_inches='tight')
+    if figures is not None:
+        figures.append(job)
+    else:
+        render_figures([job])
+    
+    # Calcul et affichage des statistiques
+    stats = {
+        'Montant moyen global': temporal_stats['montant_moyen'].mean(),
+        'Jour le plus actif': temporal_stats.loc[temporal_stats['nb_transactions'].idxmax(), 'step'],
+        'Nombre max de transactions': temporal_stats['nb_transactions'].max(),
+        'Jour le plus risqué': temporal_stats.loc[temporal_stats['taux_fraude'].idxmax(), 'step'],
+        'Taux de fraude max': temporal_stats['taux_fraude'].max()
+    }
     
+    # Sauvegarde des statistiques
+    pd.Series(stats).to_csv(RESULTS_DIR / 'temporal_stats.csv')
+    
+    return stats
+
+def plot_temporal_patterns_analysis(temporal_stats: pd.DataFrame):
+    """Trace l'évolution et la distribution des statistiques quotidiennes"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Configuration de la figure
     plt.style.use('default')
     sns.set_theme(style="whitegrid")
@@ -126,26 +151,12 @@ def analyze_temporal_patterns():
     plt.suptitle('Analyse des Patterns Temporels', fontsize=16, y=0.95)
     plt.tight_layout()
     
-    # Sauvegarde
-    plt.savefig(FIGURES_DIR / 'temporal_patterns_analysis.png', 
-                dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    # Calcul et affichage des statistiques
-    stats = {
-        'Montant moyen global': temporal_stats['montant_moyen'].mean(),
-        'Jour le plus actif': temporal_stats.loc[temporal_stats['nb_transactions'].idxmax(), 'step'],
-        'Nombre max de transactions': temporal_stats['nb_transactions'].max(),
-        'Jour le plus risqué': temporal_stats.loc[temporal_stats['taux_fraude'].idxmax(), 'step'],
-        'Taux de fraude max': temporal_stats['taux_fraude'].max()
-    }
-    
-    # Sauvegarde des statistiques
-    pd.Series(stats).to_csv(RESULTS_DIR / 'temporal_stats.csv')
-    
-    return stats
+    return fig
 
 if __name__ == '__main__':
+    from utils import setup_logging
+
+    setup_logging()
     stats = analyze_temporal_patterns()
     print("\nStatistiques temporelles :")
     for key, value in stats.items():
@@ -6,20 +6,34 @@ import pandas as pd
 import numpy as np
 from typing import Union, List, Dict
 import logging
+import sys
 from datetime import datetime
-from config import RESULTS_DIR
-
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(RESULTS_DIR / 'analysis.log'),
-        logging.StreamHandler()
-    ]
-)
+from config import LOGGING_FORMAT, LOGGING_LEVEL, RESULTS_DIR, ensure_directories
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 logger = logging.getLogger(__name__)
 
+def setup_logging(level: int = LOGGING_LEVEL) -> None:
+    """
+    Configure le logging (console et Results/analysis.log)
+
+    Appelée par les points d'entrée (main, scripts lancés seuls) et non à
+    l'import : importer un module ne crée ni dossier ni fichier de log.
+    """
+    ensure_directories()
+    logging.basicConfig(
+        level=level,
+        format=LOGGING_FORMAT,
+        handlers=[
+            logging.FileHandler(RESULTS_DIR / 'analysis.log'),
+            logging.StreamHandler()
+        ]
+    )
+
 def calculate_fraud_rate(data: pd.DataFrame, group_by: Union[str, List[str]]) -> pd.DataFrame:
     """
     Calcule le taux de fraude par groupe spécifié
@@ -39,10 +53,36 @@ def calculate_fraud_rate(data: pd.DataFrame, group_by: Union[str, List[str]]) ->
     fraud_rate['fraud_rate'] = (fraud_rate['frauds'] / fraud_rate['total'] * 100).round(2)
     return fraud_rate
 
+def format_group_stats(stats: pd.DataFrame) -> pd.DataFrame:
+    """
+    Met en forme un roll-up du cube (DataCube.rollup) comme les rapports
+    groupés historiques : nombre, volume et montant moyen arrondis, taux de
+    fraude moyen arrondi à 2 décimales puis exprimé en pourcentage
+    """
+    report = pd.DataFrame({
+        'transaction_count': stats['transactions'],
+        'total_amount': stats['amount_sum'].round(2),
+        'avg_amount': stats['amount_mean'].round(2),
+        'fraud_count': stats['fraud_count'],
+        'fraud_rate': stats['fraud_mean'].round(2)
+    })
+    report['fraud_rate'] = (report['fraud_rate'] * 100).round(2)
+    return report
+
+def with_amount(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Retourne le DataFrame avec la colonne 'amount' en euros (float64),
+    reconstruite depuis 'amount_cents' pour un DataFrame au schéma compact
+    """
+    if 'amount' in df.columns or 'amount_cents' not in df.columns:
+        return df
+    return df.assign(amount=df['amount_cents'] / 100)
+
 def save_results(df: pd.DataFrame, name: str, index: bool = False) -> None:
     """
     Sauvegarde les résultats dans un fichier CSV
     """
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
     output_path = RESULTS_DIR / f"{name}_{datetime.now().strftime('%Y%m%d')}.csv"
     df.to_csv(output_path, index=index)
     logger.info(f"Résultats sauvegardés dans {output_path}")
@@ -52,3 +92,40 @@ def format_amount(amount: float) -> str:
     Formate les montants pour l'affichage
     """
     return f"{amount:,.2f} €"
+
+def get_peak_rss_mb() -> float:
+    """
+    Retourne le pic de mémoire résidente (RSS) du processus en Mo,
+    ou NaN si la mesure n'est pas disponible sur la plateforme
+    """
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS et en kilo-octets sous Linux
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def status_mb(field: str) -> float:
+    """
+    Valeur (en Mo) d'un champ de /proc/self/status (VmRSS, VmHWM), NaN hors Linux
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+def reset_peak_rss() -> bool:
+    """
+    Remet le pic de mémoire résidente (VmHWM) au niveau courant (Linux)
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
@@ -6,8 +6,11 @@ import logging
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from typing import List
+from data_cube import DataCube, as_cube
+from figures import FigureJob, render_figures
+from instrumentation import traced
+from utils import with_amount
 
 logger = logging.getLogger(__name__)
 
@@ -15,25 +18,35 @@ def setup_visualization_style():
     """
     Configure le style des visualisations
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.style.use('seaborn')
     sns.set_palette("husl")
     plt.rcParams['figure.figsize'] = (12, 6)
     plt.rcParams['figure.dpi'] = 100
 
-def plot_dataset_info(df: pd.DataFrame, save_dir: Path):
+@traced
+def dataset_info_data(cube: DataCube) -> dict:
     """
-    Visualise les informations générales du dataset
+    Statistiques générales affichées par plot_dataset_info
     """
-    plt.figure(figsize=(10, 6))
-    
-    # Calculer les statistiques
-    info = {
-        'Total Transactions': len(df),
-        'Clients Uniques': df['customer'].nunique(),
-        'Commerçants': df['merchant'].nunique(),
-        'Catégories': df['category'].nunique(),
-        'Transactions Frauduleuses': df['fraud'].sum()
+    return {
+        'Total Transactions': cube.total_transactions,
+        'Clients Uniques': len(cube.customers),
+        'Commerçants': len(cube.rollup('merchant')),
+        'Catégories': len(cube.rollup('category')),
+        'Transactions Frauduleuses': cube.total_frauds
     }
+
+def plot_dataset_info(info: dict):
+    """
+    Visualise les informations générales du dataset
+    """
+    import matplotlib.pyplot as plt
+
+    setup_visualization_style()
+    fig = plt.figure(figsize=(10, 6))
     
     # Créer le graphique
     plt.bar(info.keys(), info.values())
@@ -41,18 +54,25 @@ def plot_dataset_info(df: pd.DataFrame, save_dir: Path):
     plt.title('Statistiques Générales du Dataset')
     plt.tight_layout()
     
-    # Sauvegarder
-    plt.savefig(save_dir / 'dataset_info.png')
-    plt.close()
+    return fig
 
-def plot_missing_values(df: pd.DataFrame, save_dir: Path):
+@traced
+def missing_values_data(df: pd.DataFrame) -> pd.Series:
     """
-    Visualise les valeurs manquantes par colonne
+    Pourcentage de valeurs manquantes par colonne
     """
-    plt.figure(figsize=(10, 6))
-    
-    # Calculer le pourcentage de valeurs manquantes
     missing = (df.isnull().sum() / len(df)) * 100
+    # Schéma compact : les montants sont affichés sous leur nom d'origine
+    return missing.rename({'amount_cents': 'amount'})
+
+def plot_missing_values(missing: pd.Series):
+    """
+    Visualise les valeurs manquantes par colonne
+    """
+    import matplotlib.pyplot as plt
+
+    setup_visualization_style()
+    fig = plt.figure(figsize=(10, 6))
     
     # Créer le graphique
     plt.bar(missing.index, missing.values)
@@ -61,62 +81,70 @@ def plot_missing_values(df: pd.DataFrame, save_dir: Path):
     plt.ylabel('Pourcentage (%)')
     plt.tight_layout()
     
-    # Sauvegarder
-    plt.savefig(save_dir / 'missing_values.png')
-    plt.close()
+    return fig
 
-def plot_amount_distribution(df: pd.DataFrame, save_dir: Path):
+def plot_amount_distribution(amounts: pd.DataFrame):
     """
-    Visualise la distribution des montants
+    Visualise la distribution des montants (colonnes amount et category)
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    setup_visualization_style()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
     
     # Distribution globale
-    sns.histplot(data=df, x='amount', bins=50, ax=ax1)
+    sns.histplot(data=amounts, x='amount', bins=50, ax=ax1)
     ax1.set_title('Distribution des Montants de Transaction')
     ax1.set_xlabel('Montant (€)')
     
     # Boxplot par catégorie
-    sns.boxplot(x='category', y='amount', data=df, ax=ax2)
+    sns.boxplot(x='category', y='amount', data=amounts, ax=ax2)
     ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
     ax2.set_title('Distribution des Montants par Catégorie')
     
     plt.tight_layout()
-    plt.savefig(save_dir / 'amount_distribution.png')
-    plt.close()
+    return fig
 
-def plot_category_analysis(df: pd.DataFrame, save_dir: Path):
+def plot_category_analysis(category_stats: pd.DataFrame):
     """
-    Analyse détaillée par catégorie
+    Analyse détaillée par catégorie (roll-up du cube par catégorie)
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    setup_visualization_style()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+    category_stats = category_stats.copy()
+    category_stats.index = category_stats.index.astype(str)
     
     # Nombre de transactions par catégorie
-    category_counts = df['category'].value_counts()
+    category_counts = category_stats['transactions'].sort_values(ascending=False)
     sns.barplot(x=category_counts.index, y=category_counts.values, ax=ax1)
     ax1.set_xticklabels(ax1.get_xticklabels(), rotation=45, ha='right')
     ax1.set_title('Nombre de Transactions par Catégorie')
     
     # Taux de fraude par catégorie
-    fraud_by_category = df.groupby('category')['fraud'].agg(['count', 'sum'])
-    fraud_by_category['rate'] = (fraud_by_category['sum'] / fraud_by_category['count']) * 100
+    fraud_by_category = pd.DataFrame({'rate': category_stats['fraud_mean'] * 100})
     
     sns.barplot(x=fraud_by_category.index, y='rate', data=fraud_by_category, ax=ax2)
     ax2.set_xticklabels(ax2.get_xticklabels(), rotation=45, ha='right')
     ax2.set_title('Taux de Fraude par Catégorie (%)')
     
     plt.tight_layout()
-    plt.savefig(save_dir / 'category_analysis.png')
-    plt.close()
+    return fig
 
-def plot_temporal_patterns(df: pd.DataFrame, save_dir: Path):
+def plot_temporal_patterns(daily_stats: pd.DataFrame):
     """
-    Analyse des patterns temporels
+    Analyse des patterns temporels (roll-up du cube par step)
     """
+    import matplotlib.pyplot as plt
+
+    setup_visualization_style()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
     
     # Évolution du nombre de transactions
-    daily_counts = df.groupby('step').size()
+    daily_counts = daily_stats['transactions']
     rolling_mean = daily_counts.rolling(window=7).mean()
     
     ax1.plot(daily_counts.index, daily_counts.values, alpha=0.5, label='Transactions quotidiennes')
@@ -127,8 +155,7 @@ def plot_temporal_patterns(df: pd.DataFrame, save_dir: Path):
     ax1.legend()
     
     # Taux de fraude quotidien
-    daily_fraud = df.groupby('step')['fraud'].agg(['count', 'sum'])
-    daily_fraud['rate'] = (daily_fraud['sum'] / daily_fraud['count']) * 100
+    daily_fraud = pd.DataFrame({'rate': daily_stats['fraud_mean'] * 100})
     
     ax2.plot(daily_fraud.index, daily_fraud['rate'])
     ax2.set_title('Évolution du Taux de Fraude Quotidien')
@@ -136,62 +163,85 @@ def plot_temporal_patterns(df: pd.DataFrame, save_dir: Path):
     ax2.set_ylabel('Taux de fraude (%)')
     
     plt.tight_layout()
-    plt.savefig(save_dir / 'temporal_patterns.png')
-    plt.close()
+    return fig
+
+@traced
+def customer_analysis_data(cube: DataCube) -> dict:
+    """
+    Agrégats par âge et genre affichés par plot_customer_analysis
+    """
+    age_stats = cube.rollup('age')
+    gender_stats = cube.rollup('gender')
+    demo_stats = cube.rollup(['age', 'gender'])
+    demo_fraud = pd.DataFrame({
+        'total': demo_stats['transactions'],
+        'fraud': demo_stats['fraud_count'],
+        'rate': demo_stats['fraud_mean'] * 100
+    }).reset_index()
+    demo_fraud[['age', 'gender']] = demo_fraud[['age', 'gender']].astype(str)
+    return {
+        'age_counts': pd.Series(age_stats['transactions'].to_numpy(), index=age_stats.index.astype(str)),
+        'gender_counts': pd.Series(gender_stats['transactions'].to_numpy(),
+                                   index=gender_stats.index.astype(str)).sort_values(ascending=False),
+        'age_amount': pd.Series(age_stats['amount_mean'].to_numpy(), index=age_stats.index.astype(str)),
+        'demo_fraud': demo_fraud
+    }
 
-def plot_customer_analysis(df: pd.DataFrame, save_dir: Path):
+def plot_customer_analysis(data: dict):
     """
     Analyse des clients
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    setup_visualization_style()
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
     
     # Distribution par âge
-    sns.histplot(data=df, x='age', bins=30, ax=ax1)
+    age_counts = data['age_counts']
+    sns.histplot(x=age_counts.index, weights=age_counts.values, bins=30, ax=ax1)
     ax1.set_title('Distribution des Âges des Clients')
     
     # Distribution par genre
-    gender_counts = df['gender'].value_counts()
+    gender_counts = data['gender_counts']
     ax2.pie(gender_counts.values, labels=gender_counts.index, autopct='%1.1f%%')
     ax2.set_title('Répartition par Genre')
     
     # Montant moyen par âge
-    age_amount = df.groupby('age')['amount'].mean()
+    age_amount = data['age_amount']
     ax3.plot(age_amount.index, age_amount.values)
     ax3.set_title('Montant Moyen des Transactions par Âge')
     ax3.set_xlabel('Âge')
     ax3.set_ylabel('Montant moyen (€)')
     
     # Taux de fraude par démographie
-    demo_fraud = df.groupby(['age', 'gender']).agg({
-        'fraud': ['count', 'sum']
-    })
-    demo_fraud.columns = ['total', 'fraud']
-    demo_fraud['rate'] = (demo_fraud['fraud'] / demo_fraud['total']) * 100
-    demo_fraud = demo_fraud.reset_index()
-    
-    sns.scatterplot(data=demo_fraud, x='age', y='rate', hue='gender', 
+    sns.scatterplot(data=data['demo_fraud'], x='age', y='rate', hue='gender', 
                    size='total', sizes=(50, 400), alpha=0.6, ax=ax4)
     ax4.set_title('Taux de Fraude par Âge et Genre')
     ax4.set_xlabel('Âge')
     ax4.set_ylabel('Taux de fraude (%)')
     
     plt.tight_layout()
-    plt.savefig(save_dir / 'customer_analysis.png')
-    plt.close()
+    return fig
 
-def plot_merchant_analysis(df: pd.DataFrame, save_dir: Path):
+def plot_merchant_analysis(merchant_stats: pd.DataFrame):
     """
-    Analyse des commerçants
+    Analyse des commerçants (roll-up du cube par commerçant)
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    setup_visualization_style()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
     
     # Top 10 des commerçants par volume
-    merchant_volume = df.groupby('merchant').agg({
-        'amount': 'sum',
-        'fraud': ['count', 'sum']
+    merchant_volume = pd.DataFrame({
+        'volume': merchant_stats['amount_sum'],
+        'transactions': merchant_stats['transactions'],
+        'fraudes': merchant_stats['fraud_count'],
+        'taux_fraude': merchant_stats['fraud_mean'] * 100
     })
-    merchant_volume.columns = ['volume', 'transactions', 'fraudes']
-    merchant_volume['taux_fraude'] = (merchant_volume['fraudes'] / merchant_volume['transactions']) * 100
+    merchant_volume.index = merchant_volume.index.astype(str)
     
     top_merchants = merchant_volume.nlargest(10, 'volume')
     sns.barplot(x=top_merchants.index, y='volume', data=top_merchants, ax=ax1)
@@ -207,12 +257,43 @@ def plot_merchant_analysis(df: pd.DataFrame, save_dir: Path):
     ax2.set_ylabel('Taux de fraude (%)')
     
     plt.tight_layout()
-    plt.savefig(save_dir / 'merchant_analysis.png')
-    plt.close()
+    return fig
+
+@traced
+def visualization_jobs(df: pd.DataFrame, figures_dir: Path, cube: DataCube = None) -> List[FigureJob]:
+    """
+    Décrit les figures de base : agrégats à afficher et fichiers de sortie
+    
+    Les figures agrégées sont calculées à partir du cube de données,
+    construit depuis `df` s'il n'est pas fourni.
+    """
+    cube = cube if cube is not None else as_cube(df)
+    amounts = with_amount(df)[['amount', 'category']].reset_index(drop=True)
+    return [
+        FigureJob('dataset_info', plot_dataset_info, dataset_info_data(cube),
+                  figures_dir / 'dataset_info.png'),
+        FigureJob('missing_values', plot_missing_values, missing_values_data(df),
+                  figures_dir / 'missing_values.png'),
+        FigureJob('amount_distribution', plot_amount_distribution, amounts,
+                  figures_dir / 'amount_distribution.png'),
+        FigureJob('category_analysis', plot_category_analysis, cube.rollup('category'),
+                  figures_dir / 'category_analysis.png'),
+        FigureJob('temporal_patterns', plot_temporal_patterns, cube.rollup('step'),
+                  figures_dir / 'temporal_patterns.png'),
+        FigureJob('customer_analysis', plot_customer_analysis, customer_analysis_data(cube),
+                  figures_dir / 'customer_analysis.png'),
+        FigureJob('merchant_analysis', plot_merchant_analysis, cube.rollup('merchant'),
+                  figures_dir / 'merchant_analysis.png')
+    ]
 
-def generate_visualizations(df: pd.DataFrame, save_dir: Path):
+def generate_visualizations(df: pd.DataFrame, save_dir: Path, cube: DataCube = None,
+                            figures: List[FigureJob] = None):
     """
     Génère toutes les visualisations
+    
+    Si une liste `figures` est fournie, les figures y sont ajoutées pour être
+    rendues plus tard avec les autres (figures.render_figures) ; sinon elles
+    sont rendues immédiatement.
     """
     logger.info("Génération des visualisations")
     
@@ -220,16 +301,10 @@ def generate_visualizations(df: pd.DataFrame, save_dir: Path):
     figures_dir = save_dir / 'Figures'
     figures_dir.mkdir(exist_ok=True)
     
-    # Configuration du style
-    setup_visualization_style()
-    
-    # Générer toutes les visualisations
-    plot_dataset_info(df, figures_dir)
-    plot_missing_values(df, figures_dir)
-    plot_amount_distribution(df, figures_dir)
-    plot_category_analysis(df, figures_dir)
-    plot_temporal_patterns(df, figures_dir)
-    plot_customer_analysis(df, figures_dir)
-    plot_merchant_analysis(df, figures_dir)
+    jobs = visualization_jobs(df, figures_dir, cube)
+    if figures is not None:
+        figures.extend(jobs)
+        return
     
+    render_figures(jobs)
     logger.info(f"Visualisations sauvegardées dans {figures_dir}")